@@ -0,0 +1,187 @@
+import asyncio
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+import requests
+
+from ensembl_api import normalize_rsid
+from utilities import get_rate_limiter
+
+# ------------------------------------------------------------------
+# dbSNP (NCBI E-utilities): Bulk-Abfrage von RefSNPs
+# ------------------------------------------------------------------
+# esummary (db=snp) accepts a comma separated id list, so up to 200
+# RefSNPs cost one request. Chunks are fetched concurrently with asyncio
+# behind the shared "ncbi" limiter (3 requests/second, 10 with an API key)
+# and every record is normalized into the Ensembl variant shape
+# (name, MAF, minor_allele, populations=[{population, allele, frequency}]),
+# so the variant store and the genotype engine can use it unchanged.
+
+DBSNP_ESUMMARY_URL = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/esummary.fcgi"
+DBSNP_MAX_IDS_PER_POST = 200
+NCBI_API_KEY = os.getenv("NCBI_API_KEY", "")
+NCBI_REQUESTS_PER_SECOND = 10 if NCBI_API_KEY else 3
+# Offline stand-in: path to a saved esummary response, e.g.
+# DBSNP_FIXTURE=modules/fixtures/dbsnp_esummary.json (rs1801133, rs4680, rs429358)
+DBSNP_FIXTURE = os.getenv("DBSNP_FIXTURE", "")
+DBSNP_SAMPLE_FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "modules", "fixtures",
+                                    "dbsnp_esummary.json")
+
+# dbSNP study names -> population names as used by Ensembl
+STUDY_POPULATIONS = {
+    "1000Genomes": "1000GENOMES:phase_3:ALL",
+    "ALFA": "ALFA:ALL",
+    "gnomAD": "gnomADg:ALL",
+    "GnomAD": "gnomADg:ALL",
+    "TOPMED": "TOPMED:ALL",
+}
+
+
+def _parse_global_maf(entry: Dict[str, Any]):
+    """{'study': '1000Genomes', 'freq': 'A=0.2456/1230'} -> ('1000Genomes', 'A', 0.2456)."""
+    try:
+        allele, rest = entry["freq"].split("=", 1)
+        return entry.get("study", ""), allele, float(rest.split("/", 1)[0])
+    except (KeyError, ValueError, AttributeError):
+        return None
+
+
+def normalize_dbsnp_record(summary: Dict[str, Any]) -> Dict[str, Any]:
+    """Converts one esummary document into an Ensembl-shaped variant record."""
+    rs_id = f"rs{summary.get('snp_id') or summary.get('uid')}"
+    spdi = (summary.get("spdi") or "").split(",")[0].split(":")
+    ref = spdi[2] if len(spdi) == 4 else ""
+    alts = sorted({s.split(":")[3] for s in (summary.get("spdi") or "").split(",") if s.count(":") == 3})
+    alleles = [ref] + [a for a in alts if a != ref] if ref else alts
+
+    populations = []
+    maf, minor_allele = None, None
+    for entry in summary.get("global_mafs") or []:
+        parsed = _parse_global_maf(entry)
+        if parsed is None:
+            continue
+        study, allele, freq = parsed
+        population = STUDY_POPULATIONS.get(study, f"dbSNP:{study}")
+        populations.append({"population": population, "allele": allele, "frequency": freq})
+        # Biallelic: the other allele is the complement
+        others = [a for a in alleles if a != allele]
+        if len(alleles) == 2 and len(others) == 1:
+            populations.append({"population": population, "allele": others[0], "frequency": round(1 - freq, 6)})
+        if maf is None or study == "1000Genomes":
+            maf, minor_allele = freq, allele
+
+    record = {
+        "name": rs_id,
+        "source": "dbSNP",
+        "MAF": maf,
+        "minor_allele": minor_allele,
+        "var_class": summary.get("snp_class"),
+        "most_severe_consequence": (summary.get("fxn_class") or "").split(",")[0] or None,
+        "populations": populations,
+    }
+    chrpos = summary.get("chrpos") or ""
+    if ":" in chrpos and alleles:
+        chrom, pos = chrpos.split(":", 1)
+        record["mappings"] = [{
+            "seq_region_name": chrom,
+            "start": int(pos) if pos.isdigit() else pos,
+            "allele_string": "/".join(alleles),
+            "assembly_name": "GRCh38",
+        }]
+    return record
+
+
+class DbSnpVariantClient:
+    """
+    Async dbSNP client with the same interface as EnsemblVariantClient
+    (get_variants / get_variant), usable as alternative source of the variant store.
+    """
+
+    def __init__(self, chunk_size: int = DBSNP_MAX_IDS_PER_POST, max_concurrency: int = 3,
+                 timeout: int = 30, max_retries: int = 3, retry_delay: float = 2.0,
+                 api_key: str = NCBI_API_KEY, fixture_path: str = DBSNP_FIXTURE):
+        self.chunk_size = min(chunk_size, DBSNP_MAX_IDS_PER_POST)
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.api_key = api_key
+        self.rate_limiter = get_rate_limiter("ncbi", NCBI_REQUESTS_PER_SECOND)
+        self.fixture = None
+        if fixture_path:
+            with open(fixture_path, "r", encoding="utf-8") as f:
+                self.fixture = json.load(f).get("result", {})
+
+    def _post_chunk(self, uids: List[str]) -> Dict[str, Any]:
+        """One esummary POST with retries; returns the 'result' dict ({} on final failure)."""
+        if self.fixture is not None:
+            return {uid: self.fixture[uid] for uid in uids if uid in self.fixture}
+        data = {"db": "snp", "id": ",".join(uids), "retmode": "json"}
+        if self.api_key:
+            data["api_key"] = self.api_key
+        for attempt in range(self.max_retries + 1):
+            self.rate_limiter.acquire()
+            try:
+                r = requests.post(DBSNP_ESUMMARY_URL, data=data, timeout=self.timeout)
+            except requests.exceptions.RequestException:
+                time.sleep(self.retry_delay * (attempt + 1))
+                continue
+            if r.status_code == 429:
+                self.rate_limiter.penalize(float(r.headers.get("Retry-After", self.retry_delay)))
+                continue
+            if r.status_code >= 500:
+                time.sleep(self.retry_delay * (attempt + 1))
+                continue
+            if r.status_code != 200:
+                return {}
+            try:
+                return r.json().get("result", {})
+            except ValueError:
+                return {}
+        return {}
+
+    async def fetch_variants(self, rs_ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """Async bulk lookup: {rsID: Ensembl-shaped record}; unknown IDs are missing."""
+        ids = list(dict.fromkeys(normalize_rsid(r) for r in rs_ids if str(r).strip()))
+        uids = [rs[2:] for rs in ids if rs[2:].isdigit()]
+        if not uids:
+            return {}
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def run(chunk):
+            async with semaphore:
+                return await asyncio.to_thread(self._post_chunk, chunk)
+
+        chunks = [uids[i:i + self.chunk_size] for i in range(0, len(uids), self.chunk_size)]
+        responses = await asyncio.gather(*(run(c) for c in chunks))
+
+        wanted = set(ids)
+        results = {}
+        for resp in responses:
+            for uid, summary in resp.items():
+                if not isinstance(summary, dict) or "error" in summary:
+                    continue
+                record = normalize_dbsnp_record(summary)
+                # Merged RefSNPs come back under the current ID; keep the requested one as key
+                rs_key = f"rs{uid}" if f"rs{uid}" in wanted else record["name"]
+                results[rs_key] = record
+        return results
+
+    def get_variants(self, rs_ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """Synchronous wrapper (also safe when called from a thread with a running event loop)."""
+        rs_ids = list(rs_ids)
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(self.fetch_variants(rs_ids))
+        result = {}
+        worker = threading.Thread(target=lambda: result.update(asyncio.run(self.fetch_variants(rs_ids))))
+        worker.start()
+        worker.join()
+        return result
+
+    def get_variant(self, rs_id: str) -> Optional[Dict[str, Any]]:
+        return self.get_variants([rs_id]).get(normalize_rsid(rs_id))
@@ -0,0 +1,97 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional
+
+import requests
+
+from utilities import get_rate_limiter
+
+# ------------------------------------------------------------------
+# Ensembl REST: Bulk-Abfrage von Varianten
+# ------------------------------------------------------------------
+# POST /variation/homo_sapiens accepts up to 200 IDs per request, so a
+# paper with 50 rsIDs costs one request instead of 50. Larger sets are
+# chunked and the chunks run concurrently behind the shared limiter
+# (Ensembl allows 15 requests/second).
+
+ENSEMBL_SERVER = "https://rest.ensembl.org"
+ENSEMBL_MAX_IDS_PER_POST = 200
+ENSEMBL_REQUESTS_PER_SECOND = 15
+
+
+def normalize_rsid(rs_id: str) -> str:
+    """'1234' / 'RS1234' / ' rs1234 ' -> 'rs1234'."""
+    rs_id = str(rs_id).strip().lower()
+    return rs_id if rs_id.startswith("rs") else f"rs{rs_id}"
+
+
+class EnsemblVariantClient:
+    def __init__(self, server: str = ENSEMBL_SERVER, chunk_size: int = ENSEMBL_MAX_IDS_PER_POST,
+                 max_workers: int = 4, timeout: int = 30, max_retries: int = 3, retry_delay: float = 2.0):
+        self.server = server
+        self.chunk_size = min(chunk_size, ENSEMBL_MAX_IDS_PER_POST)
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.rate_limiter = get_rate_limiter("ensembl", ENSEMBL_REQUESTS_PER_SECOND)
+        self.session = requests.Session()
+        self.session.headers.update({"Content-Type": "application/json", "Accept": "application/json"})
+
+    def _post_chunk(self, ids: List[str], genotypes: bool = False) -> Dict[str, Any]:
+        """One POST with retries (loop, no recursion); returns {} on final failure."""
+        url = f"{self.server}/variation/homo_sapiens"
+        params = {"pops": 1, "population_genotypes": 1} if genotypes else {"pops": 1}
+        for attempt in range(self.max_retries + 1):
+            self.rate_limiter.acquire()
+            try:
+                r = self.session.post(url, params=params, json={"ids": ids}, timeout=self.timeout)
+            except requests.exceptions.RequestException:
+                time.sleep(self.retry_delay * (attempt + 1))
+                continue
+            if r.status_code == 429:
+                self.rate_limiter.penalize(float(r.headers.get("Retry-After", self.retry_delay)))
+                continue
+            if r.status_code >= 500:
+                time.sleep(self.retry_delay * (attempt + 1))
+                continue
+            if r.status_code != 200:
+                return {}
+            try:
+                return r.json()
+            except ValueError:
+                return {}
+        return {}
+
+    def get_variants(self, rs_ids: Iterable[str], genotypes: bool = False) -> Dict[str, Dict[str, Any]]:
+        """
+        Fetches variant records incl. population frequencies (pops=1) for many rsIDs.
+        With genotypes=True the observed genotype counts per population are included
+        as well ('population_genotypes': population, genotype, count).
+        Returns {rsID: Ensembl record}; unknown IDs are missing from the dict.
+        """
+        ids = list(dict.fromkeys(normalize_rsid(r) for r in rs_ids if str(r).strip()))
+        if not ids:
+            return {}
+        chunks = [ids[i:i + self.chunk_size] for i in range(0, len(ids), self.chunk_size)]
+        if len(chunks) == 1:
+            responses = [self._post_chunk(chunks[0], genotypes)]
+        else:
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(chunks))) as pool:
+                responses = list(pool.map(lambda c: self._post_chunk(c, genotypes), chunks))
+
+        wanted = set(ids)
+        results = {}
+        for resp in responses:
+            for key, record in resp.items():
+                if not isinstance(record, dict):
+                    continue
+                # Ensembl keys by the requested ID; merged/synonym IDs come back under the input name
+                rs_key = normalize_rsid(key)
+                if rs_key not in wanted:
+                    rs_key = normalize_rsid(record.get("name", key))
+                results[rs_key] = record
+        return results
+
+    def get_variant(self, rs_id: str) -> Optional[Dict[str, Any]]:
+        return self.get_variants([rs_id]).get(normalize_rsid(rs_id))
@@ -3,7 +3,6 @@ import requests
 import xml.etree.ElementTree as ET
 import pandas as pd
 import re
-import datetime
 import sys
 import concurrent.futures
 import os
@@ -13,6 +12,7 @@ import time
 import json
 import pdfplumber
 import io
+import html
 
 from typing import Dict, Any, Optional
 from dotenv import load_dotenv
@@ -25,11 +25,31 @@ import openpyxl
 # Neuer Import für die Übersetzung mit google_trans_new
 from google_trans_new import google_translator
 
+from modules.entity_scanner import primary_gene, pair_genotypes_with_rsids
+from modules.ingestion import get_ingestion_worker, STATUS_DONE
+from utilities import file_sha256
+from modules.variant_store import get_dbsnp_variant_store, get_variant_store
+from modules.report_renderer import SummaryWorkbookWriter, get_report_template, report_values, unique_sheet_title
+from modules.export_pipeline import Stage, StagedPipeline, pipeline_warning
+from modules.export_spool import get_session_spool
+from modules.contradiction_engine import ContradictionEngine
+from modules.paperqa_contradictions import analyze_with_contracrow, paperqa_installed
+from modules.paperqa_corpus import PAPERQA_PAPER_DIR, corpus_directories, get_paper_corpus
+from modules.ai_content_detector import AIContentDetector, score_documents
+from modules.chat_retrieval import format_context, get_session_chat_index
+from modules.chat_memory import DISPLAY_WINDOW, get_session_memory, openai_summarizer
+from modules.genotype_frequency import (
+    AlleleFrequencyMatrix, genotype_frequencies, genotype_report_rows, hwe_statistics, normalize_genotype
+)
+from ensembl_api import EnsemblVariantClient, normalize_rsid
+
 # ------------------------------------------------------------------
 # Umgebungsvariablen laden (für OPENAI_API_KEY, falls vorhanden)
 # ------------------------------------------------------------------
 load_dotenv()
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+# Parallel papers in the LLM stage of the Multi-PDF export (bounded by the OpenAI rate limit)
+EXPORT_LLM_CONCURRENCY = int(os.getenv("EXPORT_LLM_CONCURRENCY", "4"))
 
 # ------------------------------------------------------------------
 # Streamlit-Konfiguration
@@ -96,7 +116,9 @@ def translate_text_openai(text, source_language, target_language, api_key):
         translation = clean_html_except_br(translation)
         return translation
     except Exception as e:
-        st.warning("Translation error: " + str(e))
+        # Inside the export pipeline (worker thread) the warning is shown later by the main thread
+        if not pipeline_warning("Translation error: " + str(e)):
+            st.warning("Translation error: " + str(e))
         return text
 
 class CoreAPI:
@@ -426,11 +448,65 @@ class SemanticScholarSearch:
 # 8) Weitere Module + Seiten
 # ------------------------------------------------------------------
 def module_paperqa2():
+    """
+    Questions against a paper directory with paper-qa: persisted tantivy index
+    (parsed and embedded once), a warm Docs object per corpus shared by all
+    sessions, evidence gathering and a streamed answer (see modules/paperqa_corpus.py).
+    """
     st.subheader("PaperQA2 Module")
-    st.write("This is the PaperQA2 module. You can add more settings and functions here.")
+    if not paperqa_installed:
+        st.error("paper-qa is not available (modules/paper-qa and its dependencies).")
+        return
+    api_key = st.session_state.get("api_key", "")
+    # Only the server-configured paper directory (PAPERQA_PAPER_DIR) and its subfolders
+    directories = corpus_directories()
+    if not directories:
+        st.warning(f"The configured paper directory '{PAPERQA_PAPER_DIR}' does not exist (set PAPERQA_PAPER_DIR).")
+        return
+    paper_dir = st.selectbox("Paper collection (PDF, TXT, HTML, MD):", directories, key="paperqa2_dir")
+    model = st.selectbox("Model:", ["gpt-3.5-turbo", "gpt-3.5-turbo-16k", "gpt-4"], key="paperqa2_model")
+    # Building the index embeds every paper: only with a key
+    if not api_key:
+        st.warning("Please enter an OpenAI API key first.")
+        return
+
+    try:
+        with st.spinner("Opening the paper index (new papers are parsed and embedded once)..."):
+            corpus = get_paper_corpus(paper_dir, model, api_key)
+        if st.button("Re-sync index with directory"):
+            with st.spinner("Indexing new and removed papers..."):
+                n_files = corpus.sync(build=True)
+            st.success(f"Index contains {n_files} papers.")
+    except Exception as e:
+        st.error(f"PaperQA2 index error: {e}")
+        return
+    st.caption(f"{corpus.paper_count} papers currently loaded in memory for this corpus.")
+
     question = st.text_input("Please enter your question:")
     if st.button("Submit question"):
-        st.write("Answer: This is a dummy answer to the question:", question)
+        if not question.strip():
+            st.warning("Please enter a question.")
+            return
+        status_text = st.empty()
+        answer_box = st.empty()
+        streamed = []
+
+        def on_token(token):
+            streamed.append(token)
+            answer_box.markdown("".join(streamed))
+
+        try:
+            session = corpus.ask(question, on_progress=status_text.info, on_token=on_token)
+        except Exception as e:
+            status_text.empty()
+            st.error(f"PaperQA2 error: {e}")
+            return
+        status_text.empty()
+        answer_box.markdown(session.formatted_answer or session.answer)
+        if session.contexts:
+            with st.expander("Evidence"):
+                for c in session.contexts:
+                    st.markdown(f"**{c.text.name}** (score {c.score}): {c.context}")
 
 def page_home():
     st.title("Welcome to the Main Menu")
@@ -487,15 +563,14 @@ class PaperAnalyzer:
     def __init__(self, model="gpt-3.5-turbo"):
         self.model = model
     
+    def extract_pages_from_pdf(self, pdf_file):
+        """Extracts the raw text of every page via PyPDF2 (empty string for pages without text)."""
+        reader = PyPDF2.PdfReader(pdf_file)
+        return [page.extract_text() or "" for page in reader.pages]
+
     def extract_text_from_pdf(self, pdf_file):
         """Extracts raw text via PyPDF2."""
-        reader = PyPDF2.PdfReader(pdf_file)
-        text = ""
-        for page in reader.pages:
-            page_text = page.extract_text()
-            if page_text:
-                text += page_text + "\n"
-        return text
+        return "".join(p + "\n" for p in self.extract_pages_from_pdf(pdf_file) if p)
     
     def analyze_with_openai(self, text, prompt_template, api_key):
         """Helper function to call OpenAI via ChatCompletion."""
@@ -551,36 +626,25 @@ class PaperAnalyzer:
 class AlleleFrequencyFinder:
     """Class for retrieving and displaying allele frequencies from various sources (Ensembl primarily)."""
     def __init__(self):
-        self.ensembl_server = "https://rest.ensembl.org"
-        self.max_retries = 3
-        self.retry_delay = 2  # seconds between retries
-
-    def get_allele_frequencies(self, rs_id: str, retry_count: int = 0) -> Optional[Dict[str, Any]]:
-        """Fetches allele frequencies from Ensembl."""
-        if not rs_id.startswith("rs"):
-            rs_id = f"rs{rs_id}"
-        endpoint = f"/variation/human/{rs_id}?pops=1"
-        url = f"{self.ensembl_server}{endpoint}"
-        try:
-            response = requests.get(url, headers={"Content-Type": "application/json"}, timeout=10)
-            response.raise_for_status()
-            return response.json()
-        except requests.exceptions.HTTPError:
-            if response.status_code == 500 and retry_count < self.max_retries:
-                time.sleep(self.retry_delay)
-                return self.get_allele_frequencies(rs_id, retry_count + 1)
-            elif response.status_code == 404:
-                return None
-            else:
-                return None
-        except requests.exceptions.RequestException:
-            if retry_count < self.max_retries:
-                time.sleep(self.retry_delay)
-                return self.get_allele_frequencies(rs_id, retry_count + 1)
-            return None
+        self.variants = get_variant_store()
+        self.alternative = get_dbsnp_variant_store()
+
+    def get_allele_frequencies(self, rs_id: str) -> Optional[Dict[str, Any]]:
+        """Fetches allele frequencies (local store first, then Ensembl)."""
+        return self.variants.get(rs_id)
+
+    def get_allele_frequencies_bulk(self, rs_ids) -> Dict[str, Dict[str, Any]]:
+        """Fetches allele frequencies for many rsIDs at once (one POST per 200 uncached IDs); misses are tried in dbSNP."""
+        rs_ids = list(rs_ids)
+        results = self.variants.get_many(rs_ids)
+        missing = [rs for rs in dict.fromkeys(normalize_rsid(r) for r in rs_ids) if rs not in results]
+        if missing:
+            results.update(self.alternative.get_many(missing))
+        return results
     
     def try_alternative_source(self, rs_id: str) -> Optional[Dict[str, Any]]:
-        return None
+        """dbSNP (NCBI) as fallback when Ensembl has no record (cached like the Ensembl data)."""
+        return self.alternative.get(rs_id)
     
     def build_freq_info_text(self, data: Dict[str, Any]) -> str:
         """Generates a short text about allele frequencies in ENGLISH for the Excel."""
@@ -700,109 +764,31 @@ Give me a number from 0 to 100 (relevance), taking both codewords and genes into
 # ------------------------------------------------------------------
 # Function for analyzing commonalities & contradictions
 # ------------------------------------------------------------------
-def analyze_papers_for_commonalities_and_contradictions(pdf_texts: Dict[str, str], api_key: str, model: str, method_choice: str = "Standard"):
-    import openai
-    openai.api_key = api_key
-
-    # 1) Extract claims per paper
-    all_claims = {}
-    for fname, txt in pdf_texts.items():
-        prompt_claims = f"""
-Lies den folgenden Ausschnitt eines wissenschaftlichen Papers (maximal 2000 Tokens).
-Extrahiere bitte die wichtigsten 3-5 "Aussagen" (Claims), die das Paper aufstellt.
-Nutze als Ausgabe ein kompaktes JSON-Format, z.B:
-[
-  {{"claim": "Aussage 1"}},
-  {{"claim": "Aussage 2"}}
-]
-Text: {txt[:6000]}
-"""
-        try:
-            resp_claims = openai.ChatCompletion.create(
-                model=model,
-                messages=[{"role": "user", "content": prompt_claims}],
-                temperature=0.3,
-                max_tokens=700
-            )
-            raw = resp_claims.choices[0].message.content.strip()
-            try:
-                claims_list = json.loads(raw)
-            except Exception:
-                claims_list = [{"claim": raw}]
-            if not isinstance(claims_list, list):
-                claims_list = [claims_list]
-            all_claims[fname] = claims_list
-        except Exception as e:
-            st.error(f"Error extracting claims in {fname}: {e}")
-            all_claims[fname] = []
-
-    merged_claims = []
-    for fname, cllist in all_claims.items():
-        for cobj in cllist:
-            ctext = cobj.get("claim", "(leer)")
-            merged_claims.append({
-                "paper": fname,
-                "claim": ctext
-            })
-    big_input_str = json.dumps(merged_claims, ensure_ascii=False, indent=2)
-
-    # 2) Identify commonalities + contradictions
-    if method_choice == "ContraCrow":
-        final_prompt = f"""
-Nutze die ContraCrow-Methodik, um die folgenden Claims (Aussagen) aus mehreren wissenschaftlichen PDF-Papers zu analysieren. 
-Die ContraCrow-Methodik fokussiert sich darauf, systematisch Gemeinsamkeiten und klare Widersprüche zu identifizieren.
-Bitte identifiziere:
-1) Die zentralen gemeinsamen Aussagen, die in den Papers auftreten.
-2) Klare Widersprüche zwischen den Aussagen der verschiedenen Papers.
-
-Antworte ausschließlich in folgendem JSON-Format (ohne zusätzliche Erklärungen):
-{{
-  "commonalities": [
-    "Gemeinsamkeit 1",
-    "Gemeinsamkeit 2"
-  ],
-  "contradictions": [
-    {{"paperA": "...", "claimA": "...", "paperB": "...", "claimB": "...", "reason": "..." }},
-    ...
-  ]
-}}
-
-Hier die Claims:
-{big_input_str}
-"""
-    else:
-        final_prompt = f"""
-Hier sind verschiedene Claims (Aussagen) aus mehreren wissenschaftlichen PDF-Papers im JSON-Format.
-Bitte identifiziere:
-1) Gemeinsamkeiten zwischen den Papers (Wo überschneiden oder ergänzen sich die Aussagen?)
-2) Mögliche Widersprüche (Welche Aussagen widersprechen sich klar?)
-
-Antworte NUR in folgendem JSON-Format (ohne weitere Erklärungen):
-{{
-  "commonalities": [
-    "Gemeinsamkeit 1",
-    "Gemeinsamkeit 2"
-  ],
-  "contradictions": [
-    {{"paperA": "...", "claimA": "...", "paperB": "...", "claimB": "...", "reason": "..."}}
-  ]
-}}
-
-Hier die Claims:
-{big_input_str}
-"""
-
+def analyze_papers_for_commonalities_and_contradictions(pdf_texts: Dict[str, str], api_key: str, model: str,
+                                                        method_choice: str = "Standard",
+                                                        pdf_bytes: Optional[Dict[str, bytes]] = None):
+    """
+    Commonalities & contradictions across papers as JSON string.
+    Standard: claims are extracted per paper (cached), clustered by similarity and only
+    similar claims from different papers are compared (see modules/contradiction_engine.py).
+    ContraCrow: every claim is checked against a paperqa Docs index of all papers with
+    paper-qa's contracrow configuration (see modules/paperqa_contradictions.py).
+    """
+    engine = ContradictionEngine(api_key=api_key, model=model)
     try:
-        resp_final = openai.ChatCompletion.create(
-            model=model,
-            messages=[{"role": "user", "content": final_prompt}],
-            temperature=0.0,
-            max_tokens=1500
-        )
-        raw2 = resp_final.choices[0].message.content.strip()
-        return raw2
+        if method_choice == "ContraCrow" and paperqa_installed:
+            claims = engine.extract_all_claims(pdf_texts)
+            papers = pdf_bytes or {name: txt.encode("utf-8") for name, txt in pdf_texts.items()}
+            result = analyze_with_contracrow(papers, claims, model=model, api_key=api_key)
+        else:
+            if method_choice == "ContraCrow":
+                st.warning("paper-qa is not available - falling back to the claim-cluster analysis.")
+            result = engine.analyze(pdf_texts, method_choice=method_choice)
     except Exception as e:
         return f"Fehler bei Gemeinsamkeiten/Widersprüche: {e}"
+    for err in engine.errors:
+        st.error(err)
+    return json.dumps(result, ensure_ascii=False, indent=2)
 
 # ------------------------------------------------------------------
 # Page: Analyze Paper (inkl. PaperQA Multi-Paper Analyzer)
@@ -846,6 +832,28 @@ def page_analyze_paper():
     analyzer = PaperAnalyzer(model=model)
     api_key = st.session_state["api_key"]
     
+    # Uploads are pre-processed in the background as soon as they arrive ({content hash: file name})
+    ingestion_worker = get_ingestion_worker()
+    upload_hashes = ingestion_worker.submit_all(uploaded_files)
+    # Also the corpus of the sidebar chatbot
+    st.session_state["upload_hashes"] = upload_hashes
+    if upload_hashes:
+        with st.expander("Upload processing status", expanded=False):
+            st.dataframe(pd.DataFrame(ingestion_worker.status_rows(upload_hashes)))
+            st.button("Refresh status")
+    
+    def ingested(fpdf):
+        """Waits for the background job of an uploaded file (None if it failed)."""
+        job = ingestion_worker.wait(file_sha256(fpdf))
+        if job is None or job.status != STATUS_DONE:
+            st.warning(f"Background processing failed for {fpdf.name}: {job.error if job else 'unknown'}")
+            return None
+        return job
+    
+    def ingested_text(fpdf) -> str:
+        job = ingested(fpdf)
+        return job.text if job else ""
+    
     if "paper_texts" not in st.session_state:
         st.session_state["paper_texts"] = {}
     
@@ -991,7 +999,7 @@ Only output this JSON, no further explanation:
             if st.button("Start Compare-Analysis"):
                 paper_map = {}
                 for fpdf in uploaded_files:
-                    txt = analyzer.extract_text_from_pdf(fpdf)
+                    txt = ingested_text(fpdf)
                     if txt.strip():
                         paper_map[fpdf.name] = txt
                     else:
@@ -1053,7 +1061,7 @@ Only output this JSON, no further explanation:
                         text_data = ""
                         if action != "Tabellen & Grafiken":
                             with st.spinner(f"Extracting text from {fpdf.name}..."):
-                                text_data = analyzer.extract_text_from_pdf(fpdf)
+                                text_data = ingested_text(fpdf)
                                 if not text_data.strip():
                                     st.error(f"No text extracted from {fpdf.name}.")
                                     continue
@@ -1197,7 +1205,7 @@ Only output this JSON, no further explanation:
                     if "paper_texts" not in st.session_state or not st.session_state["paper_texts"]:
                         st.session_state["paper_texts"] = {}
                         for upf in uploaded_files:
-                            t_ = analyzer.extract_text_from_pdf(upf)
+                            t_ = ingested_text(upf)
                             if t_.strip():
                                 st.session_state["paper_texts"][upf.name] = t_
                     paper_texts = st.session_state["paper_texts"]
@@ -1209,7 +1217,8 @@ Only output this JSON, no further explanation:
                             pdf_texts=paper_texts,
                             api_key=api_key,
                             model=model,
-                            method_choice="ContraCrow" if analysis_method == "ContraCrow" else "Standard"
+                            method_choice="ContraCrow" if analysis_method == "ContraCrow" else "Standard",
+                            pdf_bytes={upf.name: upf.getvalue() for upf in uploaded_files if upf.name in paper_texts}
                         )
                         st.subheader("Result (JSON)")
                         st.code(result_json_str, language="json")
@@ -1245,70 +1254,36 @@ Only output this JSON, no further explanation:
     st.write("## All Analyses & Excel Export (Multi-PDF)")
     user_relevance_score = st.text_input("Manual Relevance Score (1-10)?")
 
-    if "excel_downloads" not in st.session_state:
-        st.session_state["excel_downloads"] = []
+    export_format = st.radio(
+        "Export format",
+        ["One workbook (one sheet per paper)", "ZIP (one workbook per paper)"],
+        horizontal=True
+    )
+
+    if "excel_reports" not in st.session_state:
+        st.session_state["excel_reports"] = []
 
     # ------------------------------------------------------------------
     # NEW: GenotypeFinder (we use a separate class to compute genotype frequencies)
     # ------------------------------------------------------------------
     class GenotypeFinder:
         def __init__(self):
-            self.ensembl_server = "https://rest.ensembl.org"
+            self.variants = get_variant_store()
         
         def get_variant_info(self, rs_id):
-            """Fetches detailed info about a variation from Ensembl."""
-            if not rs_id.startswith("rs"):
-                rs_id = f"rs{rs_id}"
-            ext = f"/variation/human/{rs_id}?pops=1"
-            url = f"{self.ensembl_server}{ext}"
-            try:
-                r = requests.get(url, headers={"Content-Type": "application/json"}, timeout=10)
-                r.raise_for_status()
-                return r.json()
-            except Exception:
-                return None
+            """Fetches detailed info about a variation (local store first, then Ensembl)."""
+            return self.variants.get(rs_id)
         
         def calculate_genotype_frequency(self, data, genotype):
             """
             Calculates genotype frequency based on allele frequencies and Hardy-Weinberg.
             data: JSON data from the Ensembl API
             genotype: genotype string (e.g., 'AA','AG','GG')
-            Returns: Dict of population => genotype frequency
+            Returns: Dict of population => genotype frequency (1000GENOMES populations only)
             """
-            if not data or 'populations' not in data:
-                return {}
             if len(genotype) != 2:
                 return {}
-            
-            allele1, allele2 = genotype[0], genotype[1]
-            results = {}
-            
-            # We'll only look at 1000GENOMES populations to keep it consistent
-            for population in data['populations']:
-                pop_name = population.get('population', 'Unknown')
-                if '1000GENOMES' not in pop_name:
-                    continue
-                
-                # Gather allele frequencies
-                allele_freqs = {}
-                for pop2 in data['populations']:
-                    if pop2.get('population') == pop_name:
-                        a = pop2.get('allele', '')
-                        f = pop2.get('frequency', 0)
-                        allele_freqs[a] = f
-                
-                if allele1 not in allele_freqs or allele2 not in allele_freqs:
-                    continue
-                
-                # HW assumption
-                if allele1 == allele2:
-                    genotype_freq = allele_freqs[allele1] ** 2
-                else:
-                    genotype_freq = 2 * allele_freqs[allele1] * allele_freqs[allele2]
-                
-                results[pop_name] = genotype_freq
-            
-            return results
+            return genotype_frequencies(data, genotype)
     
     def build_genotype_freq_text(freq_dict: Dict[str, float]) -> str:
         """Convert genotype frequency dict into an English multiline text."""
@@ -1329,7 +1304,16 @@ Only output this JSON, no further explanation:
     # ------------------------------------------------------------------
     if uploaded_files and api_key:
         if st.button("Do all analyses & save to Excel (Multi)"):
-            st.session_state["excel_downloads"].clear()
+            st.session_state["excel_reports"].clear()
+            st.session_state["excel_export_path"] = None
+            st.session_state["excel_summary_path"] = None
+            export_spool = get_session_spool(st.session_state)
+            export_spool.clear()
+            try:
+                report_template = get_report_template()
+            except FileNotFoundError as e:
+                st.error(str(e))
+                return
             with st.spinner("Analyzing all uploaded PDFs (for Excel)..."):
                 analyzer = PaperAnalyzer(model=model)
                 
@@ -1337,7 +1321,7 @@ Only output this JSON, no further explanation:
                     if not st.session_state["relevant_papers_compare"]:
                         paper_map_auto = {}
                         for fpdf in uploaded_files:
-                            txt = analyzer.extract_text_from_pdf(fpdf)
+                            txt = ingested_text(fpdf)
                             if txt.strip():
                                 paper_map_auto[fpdf.name] = txt
                         if not paper_map_auto:
@@ -1355,58 +1339,31 @@ Only output this JSON, no further explanation:
                     selected_files_for_excel = uploaded_files
 
                 gf = GenotypeFinder()
-
-                for fpdf in selected_files_for_excel:
-                    text = analyzer.extract_text_from_pdf(fpdf)
-                    if not text.strip():
-                        st.error(f"No text extracted from {fpdf.name} (possibly no OCR). Skipping...")
-                        continue
-                    
+                aff = AlleleFrequencyFinder()
+                main_theme_for_excel = st.session_state.get("theme_compare", "N/A")
+                if not compare_mode and theme_mode == "Manually":
+                    main_theme_for_excel = user_defined_theme or "N/A"
+
+                # --- Stage 1: parse (background ingestion job: text, entities, PDF metadata)
+                def stage_parse(fpdf):
+                    job = ingestion_worker.wait(file_sha256(fpdf))
+                    if job is None or job.status != STATUS_DONE:
+                        raise RuntimeError(f"Background processing failed: {job.error if job else 'unknown'}")
+                    if not job.text.strip():
+                        raise RuntimeError("No text extracted (possibly no OCR)")
+                    return {"job": job, "text": job.text}
+
+                # --- Stage 2: LLM analyses + translations to English
+                def stage_llm(paper):
+                    text = paper["text"]
                     summary_de = analyzer.summarize(text, api_key)
                     key_findings_result = analyzer.extract_key_findings(text, api_key)
-                    
-                    main_theme_for_excel = st.session_state.get("theme_compare", "N/A")
-                    if not compare_mode and theme_mode == "Manually":
-                        main_theme_for_excel = user_defined_theme or "N/A"
-                    
                     if not topic:
-                        relevance_result = "(No topic => no relevance rating)"
+                        paper["relevance"] = "(No topic => no relevance rating)"
                     else:
-                        relevance_result = analyzer.evaluate_relevance(text, topic, api_key)
-                    
-                    methods_result = analyzer.identify_methods(text, api_key)
-                    
-                    # Attempt to find a gene or variant in the text (very basic example)
-                    pattern_obvious = re.compile(r"in the\s+([A-Za-z0-9_-]+)\s+gene", re.IGNORECASE)
-                    match_text = re.search(pattern_obvious, text)
-                    gene_via_text = match_text.group(1) if match_text else None
-                    
-                    rs_pat = r"(rs\d+)"
-                    found_rs_match = re.search(rs_pat, text)
-                    rs_num = found_rs_match.group(1) if found_rs_match else None
-                    
-                    genotype_regex = r"\b([ACGT]{2,3})\b"
-                    lines = text.split("\n")
-                    found_pairs = []
-                    for line in lines:
-                        matches = re.findall(genotype_regex, line)
-                        if matches:
-                            for m in matches:
-                                found_pairs.append((m, line.strip()))
-                    unique_geno_pairs = []
-                    for gp in found_pairs:
-                        if gp not in unique_geno_pairs:
-                            unique_geno_pairs.append(gp)
-                    
-                    aff = AlleleFrequencyFinder()
-                    allele_freq_info = "No rsID found"
-                    if rs_num:
-                        data_allele = aff.get_allele_frequencies(rs_num)
-                        if not data_allele:
-                            data_allele = aff.try_alternative_source(rs_num)
-                        if data_allele:
-                            allele_freq_info = aff.build_freq_info_text(data_allele)
-                    
+                        paper["relevance"] = analyzer.evaluate_relevance(text, topic, api_key)
+                    paper["methods"] = analyzer.identify_methods(text, api_key)
+
                     ergebnisse, schlussfolgerungen = split_summary(summary_de)
                     cohort_data = parse_cohort_info(summary_de)
                     study_size = cohort_data.get("study_size", "")
@@ -1415,89 +1372,156 @@ Only output this JSON, no further explanation:
                         cohort_info = (study_size + (", " + origin if origin else "")).strip(", ")
                     else:
                         cohort_info = ""
-                    
-                    pub_year_match = re.search(r"\b(20[0-9]{2})\b", text)
-                    year_for_excel = pub_year_match.group(1) if pub_year_match else "n/a"
 
-                    pmid_pattern = re.compile(r"\bPMID:\s*(\d+)\b", re.IGNORECASE)
-                    pmid_match = pmid_pattern.search(text)
-                    pmid_found = pmid_match.group(1) if pmid_match else "n/a"
-
-                    doi_final = "n/a"
-                    link_pubmed = ""
-                    if pmid_found != "n/a":
+                    paper["ergebnisse_en"] = translate_text_openai(ergebnisse, "German", "English", api_key) if ergebnisse else ""
+                    paper["schlussfolgerungen_en"] = translate_text_openai(schlussfolgerungen, "German", "English", api_key) if schlussfolgerungen else ""
+                    paper["cohort_info_en"] = translate_text_openai(cohort_info, "German", "English", api_key) if cohort_info else ""
+                    paper["key_findings_en"] = translate_text_openai(key_findings_result, "German", "English", api_key) if key_findings_result else ""
+                    return paper
+
+                # --- Stage 3: variant lookup (all rsIDs of a paper in one bulk request)
+                def stage_variants(paper):
+                    entities = paper["job"].entities
+                    paper["gene"] = primary_gene(entities)
+                    paper["all_rs"] = entities["rsids"]
+                    paper["geno_rs_pairs"] = pair_genotypes_with_rsids(entities, limit=3)
+                    paper["variant_data"] = aff.get_allele_frequencies_bulk(paper["all_rs"]) if paper["all_rs"] else {}
+                    not_found = [rs for rs in paper["all_rs"] if rs not in paper["variant_data"]]
+                    if not_found:
+                        pipeline_warning(f"No frequency data for {', '.join(not_found)}")
+                    rs_num = paper["all_rs"][0] if paper["all_rs"] else None
+                    data_allele = paper["variant_data"].get(rs_num) if rs_num else None
+                    paper["allele_freq_info"] = aff.build_freq_info_text(data_allele) if data_allele else "No rsID found"
+                    return paper
+
+                # --- Stage 4: identifiers (offline from the PDF, PubMed only as fallback)
+                def stage_identifiers(paper):
+                    text = paper["text"]
+                    pdf_meta = paper["job"].metadata
+                    year_for_excel = pdf_meta["year"]
+                    if not year_for_excel:
+                        pub_year_match = re.search(r"\b(20[0-9]{2})\b", text)
+                        # The PDF creation date only if the text has no year at all
+                        year_for_excel = (pub_year_match.group(1) if pub_year_match
+                                          else pdf_meta.get("creation_year") or "n/a")
+
+                    pmid_found = pdf_meta["pmid"]
+                    if not pmid_found:
+                        pmid_pattern = re.compile(r"\bPMID:\s*(\d+)\b", re.IGNORECASE)
+                        pmid_match = pmid_pattern.search(text)
+                        pmid_found = pmid_match.group(1) if pmid_match else "n/a"
+
+                    doi_final = pdf_meta["doi"] or "n/a"
+                    link_pubmed = f"https://pubmed.ncbi.nlm.nih.gov/{pmid_found}/" if pmid_found != "n/a" else ""
+                    if doi_final == "n/a" and pmid_found != "n/a":
+                        # Network fallback only if the PDF carries no DOI
                         doi_final, link_pubmed = fetch_pubmed_doi_and_link(pmid_found)
-
-                    # Translate to English for Excel
-                    ergebnisse_en = translate_text_openai(ergebnisse, "German", "English", api_key) if ergebnisse else ""
-                    schlussfolgerungen_en = translate_text_openai(schlussfolgerungen, "German", "English", api_key) if schlussfolgerungen else ""
-                    cohort_info_en = translate_text_openai(cohort_info, "German", "English", api_key) if cohort_info else ""
-                    key_findings_result_en = translate_text_openai(key_findings_result, "German", "English", api_key) if key_findings_result else ""
-
-                    try:
-                        wb = openpyxl.load_workbook("vorlage_paperqa2.xlsx")
-                    except FileNotFoundError:
-                        st.error("Template 'vorlage_paperqa2.xlsx' was not found!")
-                        return
-                    ws = wb.active
-
-                    # Fill the main theme & date
-                    ws["D2"].value = main_theme_for_excel
-                    ws["J2"].value = datetime.datetime.now().strftime("%Y-%m-%d")
-
-                    # Fill gene / rsNumber
-                    ws["D5"].value = gene_via_text if gene_via_text else ""
-                    ws["D6"].value = rs_num if rs_num else ""
-                    
-                    # Up to 3 genotype hits
-                    for i in range(3):
-                        row_i = 10 + i
-                        if i < len(unique_geno_pairs):
-                            genotype_str = unique_geno_pairs[i][0]
-                            ws[f"D{row_i}"].value = genotype_str
-                            if rs_num:
-                                data_gf = gf.get_variant_info(rs_num)
-                                gfreq = gf.calculate_genotype_frequency(data_gf, genotype_str)
-                                gf_text = build_genotype_freq_text(gfreq)
-                                ws[f"E{row_i}"].value = gf_text
-                            else:
-                                ws[f"E{row_i}"].value = "No rsID => no genotype frequency"
+                        if doi_final == "n/a":
+                            pipeline_warning(f"No DOI found for PMID {pmid_found}")
+                    paper.update(year=year_for_excel, pmid=pmid_found, doi=doi_final,
+                                 link_pubmed=link_pubmed, title=pdf_meta["title"])
+                    return paper
+
+                # --- Stage 5: render (cell values only; the workbook is written once for all papers)
+                def stage_render(paper):
+                    # Up to 3 genotype hits (each with the rsID from the same sentence)
+                    genotype_cells = []
+                    for genotype_str, geno_rs in paper["geno_rs_pairs"][:3]:
+                        if geno_rs:
+                            gfreq = gf.calculate_genotype_frequency(paper["variant_data"].get(geno_rs), genotype_str)
+                            genotype_cells.append((genotype_str, build_genotype_freq_text(gfreq)))
                         else:
-                            ws[f"D{row_i}"] = ""
-                            ws[f"E{row_i}"] = ""
-
-                    # Publication year, cohort, key findings
-                    ws["C20"].value = year_for_excel
-                    ws["D20"].value = cohort_info_en
-                    ws["E20"].value = key_findings_result_en
-
-                    # Fill separated summary results (English)
-                    ws["G21"].value = ergebnisse_en
-                    ws["G22"].value = schlussfolgerungen_en
-
-                    # Fill PMID, link, and DOI
-                    ws["J21"].value = pmid_found if pmid_found != "n/a" else ""
-                    ws["J22"].value = link_pubmed if link_pubmed else ""
-                    ws["I22"].value = doi_final if doi_final != "n/a" else ""
-
-                    output_buffer = io.BytesIO()
-                    wb.save(output_buffer)
-                    output_buffer.seek(0)
-                    
-                    xlsx_name = f"analysis_{fpdf.name.replace('.pdf','')}.xlsx"
-                    st.session_state["excel_downloads"].append({
-                        "label": f"Download Excel for {fpdf.name}",
-                        "data": output_buffer.getvalue(),
-                        "file_name": xlsx_name
-                    })
-
-    if "excel_downloads" in st.session_state and st.session_state["excel_downloads"]:
+                            genotype_cells.append((genotype_str, "No rsID => no genotype frequency"))
+                    return report_values(
+                        theme=main_theme_for_excel,
+                        gene=paper["gene"],
+                        rsids=paper["all_rs"],
+                        genotypes=genotype_cells,
+                        year=paper["year"],
+                        cohort=paper["cohort_info_en"],
+                        key_findings=paper["key_findings_en"],
+                        title=paper["title"],
+                        results=paper["ergebnisse_en"],
+                        conclusions=paper["schlussfolgerungen_en"],
+                        pmid=paper["pmid"],
+                        pubmed_link=paper["link_pubmed"],
+                        doi=paper["doi"]
+                    )
+
+                pipeline = StagedPipeline([
+                    Stage("parse", stage_parse, workers=2),
+                    Stage("llm", stage_llm, workers=EXPORT_LLM_CONCURRENCY),
+                    Stage("variants", stage_variants, workers=2),
+                    Stage("identifiers", stage_identifiers, workers=2),
+                    Stage("render", stage_render, workers=1),
+                ])
+                export_progress = st.progress(0)
+                export_status = st.empty()
+                finished = []
+                # Consolidated workbook: one row per paper, appended as soon as the paper is done
+                summary_writer = SummaryWorkbookWriter(export_spool.file_path("analysis_summary.xlsx"))
+
+                def on_paper_done(item):
+                    finished.append(item)
+                    summary_writer.add_row(item.name, item.value if item.ok else None, error=item.error)
+                    export_progress.progress(len(finished) / len(selected_files_for_excel))
+                    export_status.text(f"{len(finished)}/{len(selected_files_for_excel)} papers processed (last: {item.name})")
+                    # Warnings collected in the worker threads are shown here, in the script thread
+                    for warning in item.warnings:
+                        st.warning(f"{item.name}: {warning}")
+                    if not item.ok:
+                        st.error(f"{item.name}: {item.error} (stage '{item.failed_stage}'). Skipping...")
+
+                try:
+                    results = pipeline.run([(f.name, f) for f in selected_files_for_excel], on_result=on_paper_done)
+                finally:
+                    st.session_state["excel_summary_path"] = summary_writer.close()
+                st.session_state["excel_reports"] = [(item.name, item.value) for item in results if item.ok]
+
+                # Files go to the session's spool directory; the session state keeps only the path
+                if st.session_state["excel_reports"] and export_format.startswith("ZIP"):
+                    used_names = set()
+                    xlsx_paths = [export_spool.file_path(f"analysis_{unique_sheet_title(name, used_names)}.xlsx")
+                                  for name, _ in st.session_state["excel_reports"]]
+                    # One template parse, one workbook refilled and saved per paper
+                    report_template.render_each([values for _, values in st.session_state["excel_reports"]],
+                                                xlsx_paths)
+                    st.session_state["excel_export_path"] = export_spool.bundle_zip(xlsx_paths, "analysis_all_papers.zip")
+                elif st.session_state["excel_reports"]:
+                    # One template parse, one workbook, one sheet per paper
+                    workbook_path = export_spool.file_path("analysis_all_papers.xlsx")
+                    report_template.render_many(st.session_state["excel_reports"], output=workbook_path)
+                    st.session_state["excel_export_path"] = workbook_path
+
+    export_path = st.session_state.get("excel_export_path")
+    if st.session_state["excel_reports"] and export_path and os.path.exists(export_path):
         st.write("## Generated Excel Downloads:")
-        for dl in st.session_state["excel_downloads"]:
+        is_zip = export_path.endswith(".zip")
+        with open(export_path, "rb") as export_file:
+            st.download_button(
+                label=(f"Download ZIP ({len(st.session_state['excel_reports'])} workbooks)" if is_zip
+                       else f"Download Excel (all {len(st.session_state['excel_reports'])} papers, one sheet each)"),
+                data=export_file,
+                file_name=os.path.basename(export_path),
+                mime="application/zip" if is_zip else "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+            )
+        summary_path = st.session_state.get("excel_summary_path")
+        if summary_path and os.path.exists(summary_path):
+            with open(summary_path, "rb") as summary_file:
+                st.download_button(
+                    label="Download summary (one row per paper)",
+                    data=summary_file,
+                    file_name=os.path.basename(summary_path),
+                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+                )
+        report_names = [name for name, _ in st.session_state["excel_reports"]]
+        single_name = st.selectbox("Single Excel for one paper:", report_names)
+        if st.button("Prepare single Excel"):
+            single_values = dict(st.session_state["excel_reports"])[single_name]
             st.download_button(
-                label=dl["label"],
-                data=dl["data"],
-                file_name=dl["file_name"],
+                label=f"Download Excel for {single_name}",
+                data=get_report_template().render(single_values),
+                file_name=f"analysis_{single_name.replace('.pdf','')}.xlsx",
                 mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
             )
 
@@ -1630,146 +1654,6 @@ Only output this JSON, no further explanation:
                     except Exception as e:
                         st.warning("GPT output could not be parsed as valid JSON.")
 
-# ------------------------------------------------------------------
-# NEUE KLASSE & FUNKTION FÜR KI-INHALTSERKENNUNG (AIContentDetector)
-# ------------------------------------------------------------------
-class AIContentDetector:
-    def __init__(self, api_key=None, api_provider=None):
-        self.api_key = api_key
-        self.api_provider = api_provider
-        self.detection_methods = {
-            "pattern_analysis": self.analyze_patterns,
-            "consistency_check": self.check_consistency,
-            "citation_verification": self.verify_citations,
-            "api_detection": self.detect_with_api
-        }
-    
-    def analyze_patterns(self, text):
-        """Untersucht typische KI-Schreibmuster"""
-        # Einige einfache Heuristiken/Regex
-        patterns = {
-            "wiederholende_phrasen": r'(\b\w+\s+\w+\b)(?=.*\1)',  # Beispiel: wiederholte Wortgruppen
-            "gleichmäßiger_ton": r'(jedoch|allerdings|dennoch|daher|folglich|somit)',  # Signalwörter
-            "generische_übergänge": r'\b(zunächst|anschließend|abschließend|zusammenfassend)\b'
-        }
-        
-        scores = {}
-        for name, pattern in patterns.items():
-            matches = re.findall(pattern, text, re.IGNORECASE)
-            # Frequenz pro 100 Wörter
-            density = len(matches) / (len(text.split()) / 100 + 1e-8)
-            # Eine einfache Skalierung  (kein echter wissenschaftl. Ansatz)
-            scores[name] = min(100, density * 5)
-        
-        return sum(scores.values()) / len(scores) if scores else 0
-    
-    def check_consistency(self, text):
-        """Prüft auf konsistente Schreibweise und Ton"""
-        paragraphs = text.split('\n\n')
-        if len(paragraphs) < 3:
-            return 50  # Zu wenig Text für eine sinnvolle Analyse
-        
-        # Satzlängenvariation
-        sentences = re.split(r'[.!?]+', text)
-        lengths = [len(s.split()) for s in sentences if s.strip()]
-        if not lengths:
-            return 50
-        
-        avg_length = sum(lengths) / len(lengths)
-        variation = sum(abs(l - avg_length) for l in lengths) / len(lengths)
-        
-        # Niedrige Variation => KI-typisch (Heuristik)
-        consistency_score = 100 - min(100, variation * 10)
-        return consistency_score
-    
-    def verify_citations(self, text):
-        """Überprüft Zitate auf Plausibilität (sehr einfach)"""
-        citation_pattern = r'\(([^)]+\d{4}[^)]*)\)'
-        citations = re.findall(citation_pattern, text)
-        
-        if not citations:
-            return 60  # Keine Zitate gefunden => neutraler Wert
-        
-        # Einfache Heuristik: sind viele Zitate im gleichen Format?
-        formats = {}
-        for citation in citations:
-            format_key = re.sub(r'[A-Za-z\s]', 'X', citation)
-            format_key = re.sub(r'\d', '9', format_key)
-            formats[format_key] = formats.get(format_key, 0) + 1
-        
-        uniformity = max(formats.values()) / len(citations) * 100
-        return uniformity
-    
-    def detect_with_api(self, text):
-        """Verwendet externe APIs (Originality.ai oder Scribbr)"""
-        if not self.api_key:
-            return 50  # Keine API => Mittelwert
-        
-        # Originality.ai
-        if self.api_provider == "originality":
-            try:
-                response = requests.post(
-                    "https://api.originality.ai/api/v1/scan/ai",
-                    headers={"X-OAI-API-KEY": self.api_key},
-                    json={"content": text}
-                )
-                if response.status_code == 200:
-                    result = response.json()
-                    # 'score.ai' => 0-1
-                    return result.get("score", {}).get("ai", 0.5) * 100
-            except Exception as e:
-                print(f"Originality.ai API-Fehler: {e}")
-        
-        # Scribbr (Beispiel, es gibt keine offizielle Public-API-Doku)
-        elif self.api_provider == "scribbr":
-            try:
-                response = requests.post(
-                    "https://api.scribbr.com/v1/ai-detection",  # fiktiver Endpunkt
-                    headers={"Authorization": f"Bearer {self.api_key}"},
-                    json={"text": text}
-                )
-                if response.status_code == 200:
-                    result = response.json()
-                    # Annahme: "ai_probability" => 0-100
-                    return result.get("ai_probability", 50)
-            except Exception as e:
-                print(f"Scribbr API-Fehler: {e}")
-        
-        # Fallback
-        return 50
-    
-    def analyze_text(self, text):
-        """Führt eine komplette Analyse durch."""
-        scores = {}
-        for method_name, method_func in self.detection_methods.items():
-            scores[method_name] = method_func(text)
-        
-        # Gewichtung
-        weights = {
-            "pattern_analysis": 0.20,
-            "consistency_check": 0.20,
-            "citation_verification": 0.10,
-            "api_detection": 0.50
-        }
-        
-        weighted_score = sum(scores[m] * weights[m] for m in scores)
-        return {
-            "gesamtbewertung": round(weighted_score, 2),
-            "einzelbewertungen": {m: round(scores[m], 2) for m in scores},
-            "interpretation": self.interpret_score(weighted_score)
-        }
-    
-    def interpret_score(self, score):
-        """Interpretation der KI-Wahrscheinlichkeit"""
-        if score < 30:
-            return "Wahrscheinlich von Menschen geschrieben"
-        elif score < 60:
-            return "Unklare Herkunft, könnte teilweise KI-unterstützt sein"
-        elif score < 85:
-            return "Wahrscheinlich KI-unterstützt oder überarbeitet"
-        else:
-            return "Sehr wahrscheinlich vollständig KI-generiert"
-
 # ------------------------------------------------------------------
 # NEUES MODULE/PAGE: KI-Inhaltserkennung via AIContentDetector
 # ------------------------------------------------------------------
@@ -1784,7 +1668,10 @@ def page_ai_content_detection():
     provider_option = st.selectbox("API-Anbieter", ["Kein API-Einsatz", "originality", "scribbr"], index=0)
     
     # Eingabemethode
-    input_mode = st.radio("Eingabemethode für den Text:", ["Direkte Eingabe", "Textdatei hochladen"])
+    input_mode = st.radio("Eingabemethode für den Text:", ["Direkte Eingabe", "Textdatei hochladen", "Mehrere Dateien (Batch)"])
+    if input_mode == "Mehrere Dateien (Batch)":
+        page_ai_content_detection_batch()
+        return
     
     text_data = ""
     if input_mode == "Direkte Eingabe":
@@ -1829,6 +1716,66 @@ def page_ai_content_detection():
         else:
             st.write("**Hinweis:** Keine externe API genutzt, nur lokale Heuristiken.")
 
+def page_ai_content_detection_batch():
+    """Batch-Modus: viele Dateien (inkl. PDF), Bewertung pro Absatz, Heatmap und Tabelle."""
+    batch_files = st.file_uploader(
+        "Dateien wählen (.pdf, .txt, .md)", type=["pdf", "txt", "md"], accept_multiple_files=True
+    )
+    if not batch_files:
+        return
+    if st.button("Batch-Analyse starten"):
+        analyzer = PaperAnalyzer()
+        documents = {}
+        for f in batch_files:
+            try:
+                if f.name.lower().endswith(".pdf"):
+                    documents[f.name] = analyzer.extract_text_from_pdf(f)
+                else:
+                    documents[f.name] = f.getvalue().decode("utf-8", errors="ignore")
+            except Exception as e:
+                st.error(f"Fehler beim Lesen von {f.name}: {e}")
+        documents = {name: text for name, text in documents.items() if text.strip()}
+        if not documents:
+            st.warning("Kein auswertbarer Text gefunden.")
+            return
+
+        progress_bar = st.progress(0)
+        progress_text = st.empty()
+
+        def on_progress(done, total):
+            progress_bar.progress(done / total)
+            progress_text.text(f"{done}/{total} Absätze bewertet")
+
+        document_rows, paragraph_rows = score_documents(documents, progress=on_progress)
+        st.session_state["ai_batch_result"] = (pd.DataFrame(document_rows), pd.DataFrame(paragraph_rows))
+
+    if "ai_batch_result" not in st.session_state:
+        return
+    df_docs, df_paragraphs = st.session_state["ai_batch_result"]
+    st.subheader("Ergebnis pro Dokument")
+    st.dataframe(df_docs.sort_values("KI-Score (Absätze, gewichtet)", ascending=False))
+
+    if not df_paragraphs.empty:
+        import altair as alt
+        st.subheader("Heatmap: KI-Score pro Absatz")
+        heatmap = alt.Chart(df_paragraphs).mark_rect().encode(
+            x=alt.X("Absatz:O", title="Absatz"),
+            y=alt.Y("Dokument:N", title=None),
+            color=alt.Color("KI-Score:Q", scale=alt.Scale(domain=[0, 100], scheme="redyellowgreen", reverse=True)),
+            tooltip=["Dokument", "Absatz", "Wörter", "KI-Score", "Textanfang"]
+        ).properties(height=max(120, 22 * df_docs.shape[0]))
+        st.altair_chart(heatmap, use_container_width=True)
+
+    xlsx_buffer = io.BytesIO()
+    with pd.ExcelWriter(xlsx_buffer, engine="xlsxwriter") as writer:
+        df_docs.to_excel(writer, sheet_name="Dokumente", index=False)
+        df_paragraphs.to_excel(writer, sheet_name="Absätze", index=False)
+    st.download_button("Tabelle herunterladen (XLSX)", data=xlsx_buffer.getvalue(),
+                       file_name="ki_erkennung_batch.xlsx",
+                       mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+    st.download_button("Absätze herunterladen (CSV)", data=df_paragraphs.to_csv(index=False).encode("utf-8"),
+                       file_name="ki_erkennung_absaetze.csv", mime="text/csv")
+
 # ------------------------------------------------------------------
 # Seite: Genotype Frequency Finder
 # ------------------------------------------------------------------
@@ -1840,44 +1787,13 @@ def page_genotype_finder():
 
     class GenotypeFinder:
         def __init__(self):
-            self.ensembl_server = "https://rest.ensembl.org"
+            self.variants = get_variant_store()
 
         def get_variant_info(self, rs_id):
-            if not rs_id.startswith("rs"):
-                rs_id = f"rs{rs_id}"
-            ext = f"/variation/human/{rs_id}?pops=1"
-            url = f"{self.ensembl_server}{ext}"
-            try:
-                r = requests.get(url, headers={"Content-Type": "application/json"}, timeout=10)
-                r.raise_for_status()
-                return r.json()
-            except:
-                return None
+            return self.variants.get(rs_id)
         
         def calculate_genotype_frequency(self, data, genotype):
-            if not data or 'populations' not in data:
-                return {}
-            if len(genotype) < 2:
-                return {}
-            allele1, allele2 = genotype[0], genotype[1]
-            results = {}
-            for pop in data['populations']:
-                pop_name = pop.get('population', '')
-                if '1000GENOMES' not in pop_name:
-                    continue
-                allele_freq_map = {}
-                for pop2 in data['populations']:
-                    if pop2.get('population') == pop_name:
-                        a_ = pop2.get('allele')
-                        f_ = pop2.get('frequency')
-                        allele_freq_map[a_] = f_
-                if allele1 in allele_freq_map and allele2 in allele_freq_map:
-                    if allele1 == allele2:
-                        freq_g = allele_freq_map[allele1] ** 2
-                    else:
-                        freq_g = 2 * allele_freq_map[allele1] * allele_freq_map[allele2]
-                    results[pop_name] = freq_g
-            return results
+            return genotype_frequencies(data, genotype)
     
     def build_genotype_freq_text(freq_dict: Dict[str, float]) -> str:
         if not freq_dict:
@@ -1892,9 +1808,15 @@ def page_genotype_finder():
             lines.append(f"{pop}: {val:.4f}")
         return "\n".join(lines)
 
+    mode = st.radio("Mode", ["Single variant", "Batch (CSV/XLSX)"], horizontal=True)
+    if mode == "Batch (CSV/XLSX)":
+        page_genotype_finder_batch()
+        return
+
     st.write("Look up genotype frequencies for a given rsID (from Ensembl).")
     rs_input = st.text_input("Enter an rsID (e.g., 'rs1234'):", "")
     genotype_input = st.text_input("Enter a genotype (e.g., 'AA','AC','CC','AG', etc.):", "")
+    show_hwe = st.checkbox("Show all genotypes + HWE test (observed vs. expected)")
 
     if st.button("Check Frequencies"):
         if not rs_input.strip():
@@ -1910,6 +1832,87 @@ def page_genotype_finder():
         st.subheader("Result:")
         st.write(freq_text)
 
+        if show_hwe:
+            afm = AlleleFrequencyMatrix(data)
+            labels, table = afm.genotype_table()
+            st.subheader("All genotypes (HWE expectation)")
+            st.dataframe(pd.DataFrame(table, index=afm.populations, columns=labels))
+            # Observed genotype counts per population are only delivered with population_genotypes=1
+            data_gt = EnsemblVariantClient().get_variants([rs_input.strip()], genotypes=True)
+            hwe = hwe_statistics(next(iter(data_gt.values()), None))
+            if hwe:
+                st.subheader("Observed vs. expected (chi-square, k(k-1)/2 df)")
+                st.dataframe(pd.DataFrame(hwe).T)
+            else:
+                st.info("No observed genotype counts available for this variant.")
+
+def page_genotype_finder_batch(chunk_size: int = 1000):
+    """Batch mode: genotype frequencies for an uploaded list of rsID/genotype pairs."""
+    st.write("Upload a CSV or XLSX with one rsID and one genotype per row (columns 'rsID' and 'Genotype'; "
+             "otherwise the first two columns are used).")
+    batch_file = st.file_uploader("Variant list", type=["csv", "xlsx"])
+    if batch_file is None:
+        return
+    try:
+        if batch_file.name.lower().endswith(".csv"):
+            df_in = pd.read_csv(batch_file, dtype=str, sep=None, engine="python")
+        else:
+            df_in = pd.read_excel(batch_file, dtype=str)
+    except Exception as e:
+        st.error(f"Error reading file: {e}")
+        return
+    if df_in.shape[1] < 2:
+        st.error("The file needs at least two columns (rsID, genotype).")
+        return
+
+    cols_lower = {c.lower().replace(" ", ""): c for c in df_in.columns}
+    rs_col = cols_lower.get("rsid") or cols_lower.get("rs") or df_in.columns[0]
+    gt_col = cols_lower.get("genotype") or cols_lower.get("gt") or df_in.columns[1]
+    df_in = df_in[[rs_col, gt_col]].dropna()
+    pairs = list(zip(
+        (normalize_rsid(r) for r in df_in[rs_col]),
+        (normalize_genotype(g) for g in df_in[gt_col])
+    ))
+    if not pairs:
+        st.info("The file contains no rows with both an rsID and a genotype.")
+        return
+    unique_rs = list(dict.fromkeys(rs for rs, _ in pairs))
+    st.write(f"{len(pairs)} rows, {len(unique_rs)} distinct rsIDs.")
+
+    batch_key = (batch_file.name, len(pairs), hash(tuple(pairs)))
+    if st.button("Compute frequencies (batch)"):
+        st.session_state["genotype_batch_result"] = (batch_key, _compute_genotype_batch(pairs, unique_rs, chunk_size))
+    result = st.session_state.get("genotype_batch_result")
+    if not result or result[0] != batch_key:
+        return
+
+    df_out = result[1]
+    st.write(f"{len(df_out)} rows, {int((df_out['Status'] == 'ok').sum())} with frequency data.")
+    st.dataframe(df_out)
+
+    xlsx_buffer = io.BytesIO()
+    df_out.to_excel(xlsx_buffer, index=False)
+    st.download_button("Download result (CSV)", data=df_out.to_csv(index=False).encode("utf-8"),
+                       file_name="genotype_frequencies.csv", mime="text/csv")
+    st.download_button("Download result (XLSX)", data=xlsx_buffer.getvalue(),
+                       file_name="genotype_frequencies.xlsx",
+                       mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+
+
+def _compute_genotype_batch(pairs, unique_rs, chunk_size: int) -> pd.DataFrame:
+    """Resolves all rsIDs chunkwise via the variant store (with progress) and builds the result table."""
+    store = get_variant_store()
+    records = {}
+    progress = st.progress(0)
+    status_text = st.empty()
+    for start in range(0, len(unique_rs), chunk_size):
+        chunk = unique_rs[start:start + chunk_size]
+        records.update(store.get_many(chunk))
+        done = min(start + chunk_size, len(unique_rs))
+        progress.progress(done / len(unique_rs))
+        status_text.text(f"Resolved {done}/{len(unique_rs)} rsIDs ({len(records)} found)")
+    return pd.DataFrame(genotype_report_rows(records, pairs))
+
 # ------------------------------------------------------------------
 # Sidebar Navigation & Chatbot
 # ------------------------------------------------------------------
@@ -1933,30 +1936,50 @@ def sidebar_module_navigation():
         st.session_state["current_page"] = "Home"
     return pages.get(st.session_state["current_page"], page_home)
 
+def chat_corpus() -> Dict[str, str]:
+    """All papers of this session: uploaded PDFs (background ingestion) and analyzed texts."""
+    documents = {}
+    ingestion_worker = get_ingestion_worker()
+    for file_hash, name in st.session_state.get("upload_hashes", {}).items():
+        job = ingestion_worker.get(file_hash)
+        if job is not None and job.status == STATUS_DONE and job.text.strip():
+            # Same file name, different content: keep both
+            documents[name if name not in documents else f"{name} ({file_hash[:8]})"] = job.text
+    for name, text in st.session_state.get("paper_texts", {}).items():
+        documents.setdefault(name, text)
+    if st.session_state.get("paper_text", "").strip() and not documents:
+        documents["Analyzed paper"] = st.session_state["paper_text"]
+    return documents
+
 def answer_chat(question: str) -> str:
-    """Simple example: uses Paper text (if available) from st.session_state + GPT."""
+    """Answers from the top-k relevant chunks of all papers of the session (retrieval index) + GPT."""
     api_key = st.session_state.get("api_key", "")
-    paper_text = st.session_state.get("paper_text", "")
     if not api_key:
         return f"(No API-Key) Echo: {question}"
-    if not paper_text.strip():
+    # History (running summary + last turns) without the question that was just appended
+    memory = get_session_memory(st.session_state, "chat_memory")
+    history = memory.prompt_messages(openai_summarizer(api_key), exclude_last=1)
+    try:
+        chat_index = get_session_chat_index(st.session_state)
+        chat_index.sync(chat_corpus(), api_key)
+        chunks = chat_index.search(question, api_key)
+    except Exception as e:
+        return f"OpenAI error: {e}"
+    if not chunks:
         sys_msg = "You are a helpful assistant for general questions."
     else:
         sys_msg = (
-            "You are a helpful assistant, and here is a paper as context:\n\n"
-            + paper_text[:12000] + "\n\n"
-            "Please use it to answer questions as expertly as possible."
+            "You are a helpful assistant. Answer from the following excerpts of scientific papers "
+            "(each labelled with its paper) as expertly as possible and name the papers you rely on:\n\n"
+            + format_context(chunks)
         )
-    openai.api_key = api_key
     try:
         response = openai.ChatCompletion.create(
             model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": sys_msg},
-                {"role": "user", "content": question}
-            ],
+            messages=[{"role": "system", "content": sys_msg}] + history + [{"role": "user", "content": question}],
             temperature=0.3,
-            max_tokens=400
+            max_tokens=400,
+            api_key=api_key
         )
         return response.choices[0].message.content
     except Exception as e:
@@ -1974,14 +1997,13 @@ def main():
     
     with col_right:
         st.subheader("Chatbot")
-        if "chat_history" not in st.session_state:
-            st.session_state["chat_history"] = []
+        memory = get_session_memory(st.session_state, "chat_memory")
         user_input = st.text_input("Your question here", key="chatbot_right_input")
         if st.button("Send (Chat)", key="chatbot_right_send"):
             if user_input.strip():
-                st.session_state["chat_history"].append(("user", user_input))
+                memory.add("user", user_input)
                 bot_answer = answer_chat(user_input)
-                st.session_state["chat_history"].append(("bot", bot_answer))
+                memory.add("assistant", bot_answer)
         
         st.markdown(
             """
@@ -2016,19 +2038,20 @@ def main():
             """,
             unsafe_allow_html=True
         )
-        st.markdown('<div class="scrollable-chat" id="chat-container">', unsafe_allow_html=True)
-        for role, msg_text in st.session_state["chat_history"]:
-            if role == "user":
-                st.markdown(
-                    f'<div class="message user-message"><strong>You:</strong> {msg_text}</div>',
-                    unsafe_allow_html=True
-                )
+        # Only the newest messages are rendered (one HTML block), older ones on request
+        window = st.session_state.setdefault("chat_window", DISPLAY_WINDOW)
+        if len(memory.messages) > window and st.button("Show older messages", key="chat_show_older"):
+            window = st.session_state["chat_window"] = window + DISPLAY_WINDOW
+        bubbles = []
+        for msg in memory.window(window):
+            if msg["role"] == "user":
+                bubbles.append(f'<div class="message user-message"><strong>You:</strong> {html.escape(msg["content"])}</div>')
             else:
-                st.markdown(
-                    f'<div class="message assistant-message"><strong>Bot:</strong> {msg_text}</div>',
-                    unsafe_allow_html=True
-                )
-        st.markdown('</div>', unsafe_allow_html=True)
+                bubbles.append(f'<div class="message assistant-message"><strong>Bot:</strong> {html.escape(msg["content"])}</div>')
+        st.markdown(
+            '<div class="scrollable-chat" id="chat-container">' + "".join(bubbles) + '</div>',
+            unsafe_allow_html=True
+        )
         
         # Auto-scroll JS
         st.markdown(
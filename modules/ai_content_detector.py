@@ -0,0 +1,266 @@
+import importlib.util
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import requests
+
+from modules.text_statistics import compute_text_statistics
+
+# ------------------------------------------------------------------
+# KI-Inhaltserkennung (AIContentDetector) + Batch-Auswertung
+# ------------------------------------------------------------------
+DETECTION_WEIGHTS = {
+    "pattern_analysis": 0.20,
+    "consistency_check": 0.20,
+    "citation_verification": 0.10,
+    "perplexity": 0.40,
+    "api_detection": 0.50
+}
+# Lokale Methoden (ohne API-Aufruf), z.B. für die Absatz-Auswertung
+HEURISTIC_METHODS = ("pattern_analysis", "consistency_check", "citation_verification")
+# Absatzweise Bewertung: consistency_check braucht mehrere Absätze und ist hier ohne Aussage
+PARAGRAPH_METHODS = ("pattern_analysis", "citation_verification")
+API_TIMEOUT = 30  # Sekunden
+MIN_PARAGRAPH_WORDS = 40
+MAX_PARAGRAPH_WORDS = 250
+# Nur prüfen, ob torch/transformers vorhanden sind; geladen wird erst im Perplexity-Zweig,
+# damit die Worker-Prozesse der Absatz-Auswertung torch nicht importieren
+transformers_installed = all(importlib.util.find_spec(m) is not None for m in ("torch", "transformers"))
+
+
+class AIContentDetector:
+    def __init__(self, api_key=None, api_provider=None, use_perplexity=True):
+        self.api_key = api_key
+        self.api_provider = api_provider
+        self.detection_methods = {
+            "pattern_analysis": self.analyze_patterns,
+            "consistency_check": self.check_consistency,
+            "citation_verification": self.verify_citations,
+            "api_detection": self.detect_with_api
+        }
+        # Lokales Sprachmodell nur, wenn transformers/torch installiert sind
+        if use_perplexity and transformers_installed:
+            self.detection_methods["perplexity"] = self.detect_with_perplexity
+        self.weights = dict(DETECTION_WEIGHTS)
+    
+    def analyze_patterns(self, text):
+        """Untersucht typische KI-Schreibmuster"""
+        # Ein Tokenisierungsdurchlauf (lineare Laufzeit), siehe modules/text_statistics.py
+        stats = compute_text_statistics(text)
+        counts = {
+            "wiederholende_phrasen": stats.repeated_bigrams,  # wiederholte Wortgruppen
+            "gleichmäßiger_ton": stats.signal_counts["gleichmäßiger_ton"],  # Signalwörter
+            "generische_übergänge": stats.signal_counts["generische_übergänge"]
+        }
+        
+        scores = {}
+        for name, count in counts.items():
+            # Frequenz pro 100 Wörter
+            density = count / (stats.word_count / 100 + 1e-8)
+            # Eine einfache Skalierung  (kein echter wissenschaftl. Ansatz)
+            scores[name] = min(100, density * 5)
+        
+        return sum(scores.values()) / len(scores) if scores else 0
+    
+    def check_consistency(self, text):
+        """Prüft auf konsistente Schreibweise und Ton"""
+        stats = compute_text_statistics(text)
+        if stats.paragraph_count < 3:
+            return 50  # Zu wenig Text für eine sinnvolle Analyse
+        
+        # Satzlängenvariation (mittlere absolute Abweichung)
+        lengths = stats.sentence_lengths
+        if not lengths.size:
+            return 50
+        
+        variation = float(np.abs(lengths - lengths.mean()).mean())
+        
+        # Niedrige Variation => KI-typisch (Heuristik)
+        consistency_score = 100 - min(100, variation * 10)
+        return consistency_score
+    
+    def verify_citations(self, text):
+        """Überprüft Zitate auf Plausibilität (sehr einfach)"""
+        stats = compute_text_statistics(text)
+        if not stats.citation_count:
+            return 60  # Keine Zitate gefunden => neutraler Wert
+        
+        # Einfache Heuristik: sind viele Zitate im gleichen Format?
+        uniformity = max(stats.citation_formats.values()) / stats.citation_count * 100
+        return uniformity
+    
+    def detect_with_perplexity(self, text):
+        """Perplexity & Burstiness eines lokalen Causal-LM (absatzweise, gewichtet nach Wortzahl)"""
+        paragraphs = split_paragraphs(text) or [text]
+        try:
+            from modules.perplexity_detector import perplexity_scores
+            scores = perplexity_scores(paragraphs)
+        except Exception as e:
+            print(f"Perplexity-Modell nicht verfügbar: {e}")
+            return None
+        words = np.array([len(p.split()) for p in paragraphs], dtype=float)
+        return float((np.array(scores) * words).sum() / max(words.sum(), 1.0))
+    
+    def detect_with_api(self, text):
+        """Verwendet externe APIs (Originality.ai oder Scribbr)"""
+        if not self.api_key:
+            return 50  # Keine API => Mittelwert
+        
+        # Originality.ai
+        if self.api_provider == "originality":
+            try:
+                response = requests.post(
+                    "https://api.originality.ai/api/v1/scan/ai",
+                    headers={"X-OAI-API-KEY": self.api_key},
+                    json={"content": text},
+                    timeout=API_TIMEOUT
+                )
+                if response.status_code == 200:
+                    result = response.json()
+                    # 'score.ai' => 0-1
+                    return result.get("score", {}).get("ai", 0.5) * 100
+            except Exception as e:
+                print(f"Originality.ai API-Fehler: {e}")
+        
+        # Scribbr (Beispiel, es gibt keine offizielle Public-API-Doku)
+        elif self.api_provider == "scribbr":
+            try:
+                response = requests.post(
+                    "https://api.scribbr.com/v1/ai-detection",  # fiktiver Endpunkt
+                    headers={"Authorization": f"Bearer {self.api_key}"},
+                    json={"text": text},
+                    timeout=API_TIMEOUT
+                )
+                if response.status_code == 200:
+                    result = response.json()
+                    # Annahme: "ai_probability" => 0-100
+                    return result.get("ai_probability", 50)
+            except Exception as e:
+                print(f"Scribbr API-Fehler: {e}")
+        
+        # Fallback
+        return 50
+    
+    def analyze_text(self, text, methods: Optional[Sequence[str]] = None):
+        """Führt eine komplette Analyse durch (optional nur mit den angegebenen Methoden)."""
+        scores = {}
+        for method_name, method_func in self.detection_methods.items():
+            if methods is None or method_name in methods:
+                score = method_func(text)
+                if score is not None:
+                    scores[method_name] = score
+        
+        # Gewichtung (auf die verwendeten Methoden normiert)
+        weights = {m: self.weights[m] for m in scores}
+        total_weight = sum(weights.values()) or 1.0
+        
+        weighted_score = sum(scores[m] * weights[m] for m in scores) / total_weight
+        return {
+            "gesamtbewertung": round(weighted_score, 2),
+            "einzelbewertungen": {m: round(scores[m], 2) for m in scores},
+            "interpretation": self.interpret_score(weighted_score)
+        }
+    
+    def interpret_score(self, score):
+        """Interpretation der KI-Wahrscheinlichkeit"""
+        if score < 30:
+            return "Wahrscheinlich von Menschen geschrieben"
+        elif score < 60:
+            return "Unklare Herkunft, könnte teilweise KI-unterstützt sein"
+        elif score < 85:
+            return "Wahrscheinlich KI-unterstützt oder überarbeitet"
+        else:
+            return "Sehr wahrscheinlich vollständig KI-generiert"
+
+
+# ------------------------------------------------------------------
+# Batch: viele Dokumente, Bewertung pro Absatz im Prozess-Pool
+# ------------------------------------------------------------------
+def split_paragraphs(text: str, min_words: int = MIN_PARAGRAPH_WORDS,
+                     max_words: int = MAX_PARAGRAPH_WORDS) -> List[str]:
+    """
+    Splits a document at blank lines; short pieces are merged with the following
+    ones and overly long ones (e.g. PDF text without blank lines) are cut into
+    blocks of max_words words.
+    """
+    paragraphs = []
+    buffer: List[str] = []
+    for block in text.split("\n\n"):
+        words = block.split()
+        if not words:
+            continue
+        buffer.extend(words)
+        while len(buffer) >= max_words:
+            paragraphs.append(" ".join(buffer[:max_words]))
+            buffer = buffer[max_words:]
+        if len(buffer) >= min_words:
+            paragraphs.append(" ".join(buffer))
+            buffer = []
+    if buffer:
+        if paragraphs and len(buffer) < min_words:
+            paragraphs[-1] += " " + " ".join(buffer)
+        else:
+            paragraphs.append(" ".join(buffer))
+    return paragraphs
+
+
+def score_paragraph(paragraph: str) -> float:
+    """Heuristic AI score of one paragraph (runs in a worker process)."""
+    return AIContentDetector(use_perplexity=False).analyze_text(paragraph, methods=PARAGRAPH_METHODS)["gesamtbewertung"]
+
+
+def score_documents(documents: Dict[str, str], max_workers: Optional[int] = None,
+                    progress=None, use_perplexity: bool = True) -> Tuple[List[Dict], List[Dict]]:
+    """
+    Scores all paragraphs of all documents in a process pool; if available, the
+    local perplexity model is added in one batched run in this process.
+    Returns (document rows, paragraph rows); the document score is the
+    word-weighted mean of its paragraph scores, next to the heuristic score
+    of the whole document. progress(done, total) is called from the calling thread.
+    """
+    jobs = [(name, i, p) for name, text in documents.items() for i, p in enumerate(split_paragraphs(text), start=1)]
+    max_workers = max_workers or min(8, os.cpu_count() or 1)
+    scores: List[float] = []
+    if jobs:
+        # spawn: no fork of the (multi-threaded) Streamlit server process
+        with ProcessPoolExecutor(max_workers=max_workers, mp_context=get_context("spawn")) as pool:
+            chunksize = max(1, len(jobs) // (max_workers * 8))
+            for score in pool.map(score_paragraph, [p for _, _, p in jobs], chunksize=chunksize):
+                scores.append(score)
+                if progress is not None:
+                    progress(len(scores), len(jobs))
+        if use_perplexity and transformers_installed:
+            try:
+                from modules.perplexity_detector import perplexity_scores
+                ppl = perplexity_scores([p for _, _, p in jobs])
+            except Exception as e:
+                print(f"Perplexity-Modell nicht verfügbar: {e}")
+            else:
+                w_heur = sum(DETECTION_WEIGHTS[m] for m in PARAGRAPH_METHODS)
+                w_ppl = DETECTION_WEIGHTS["perplexity"]
+                scores = [round((h * w_heur + p * w_ppl) / (w_heur + w_ppl), 2) for h, p in zip(scores, ppl)]
+
+    paragraph_rows = [
+        {"Dokument": name, "Absatz": i, "Wörter": len(p.split()), "KI-Score": score, "Textanfang": p[:120]}
+        for (name, i, p), score in zip(jobs, scores)
+    ]
+    detector = AIContentDetector(use_perplexity=False)
+    document_rows = []
+    for name, text in documents.items():
+        rows = [r for r in paragraph_rows if r["Dokument"] == name]
+        words = np.array([r["Wörter"] for r in rows], dtype=float)
+        para_scores = np.array([r["KI-Score"] for r in rows], dtype=float)
+        weighted = float((para_scores * words).sum() / words.sum()) if rows else 0.0
+        document_score = detector.analyze_text(text, methods=HEURISTIC_METHODS)["gesamtbewertung"]
+        document_rows.append({
+            "Dokument": name,
+            "Absätze": len(rows),
+            "KI-Score (Absätze, gewichtet)": round(weighted, 2),
+            "KI-Score (max. Absatz)": round(float(para_scores.max()), 2) if rows else 0.0,
+            "KI-Score (Dokument)": document_score,
+            "Interpretation": detector.interpret_score(weighted),
+        })
+    return document_rows, paragraph_rows
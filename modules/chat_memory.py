@@ -0,0 +1,179 @@
+import re
+from typing import Any, Callable, Dict, List, Optional
+
+import openai
+
+try:
+    import tiktoken
+    tiktoken_installed = True
+except ImportError:
+    tiktoken_installed = False
+
+# ------------------------------------------------------------------
+# Gesprächsgedächtnis mit Token-Budget
+# ------------------------------------------------------------------
+# The last KEEP_TURNS exchanges go to the model verbatim; everything older
+# is folded into a running summary (LLM or extractive fallback) that never
+# exceeds SUMMARY_TOKEN_BUDGET. Folding happens in batches: only once the
+# unsummarized older messages exceed FOLD_TOKEN_THRESHOLD, so the summary
+# call is an occasional extra request, not one per question. Messages that are part of the summary
+# are dropped from the session after MAX_STORED_MESSAGES, and the UI only
+# renders a window of the newest messages. Prompt size, session memory and
+# render time therefore stay bounded however long the chat gets.
+
+KEEP_TURNS = 3
+TOKEN_BUDGET = 1500            # Verlauf im Prompt (Zusammenfassung + letzte Nachrichten)
+SUMMARY_TOKEN_BUDGET = 400
+FOLD_TOKEN_THRESHOLD = 600     # ältere, noch nicht zusammengefasste Nachrichten
+MAX_STORED_MESSAGES = 200
+DISPLAY_WINDOW = 20
+SUMMARY_MODEL = "gpt-3.5-turbo"
+
+SUMMARY_PROMPT = (
+    "Update the running summary of a research conversation. Keep facts, papers, genes, "
+    "variants and open questions; drop small talk. At most {words} words.\n\n"
+    "Current summary:\n{summary}\n\nNew messages:\n{messages}\n\nUpdated summary:"
+)
+
+_encoding = None
+
+def _get_encoding():
+    global _encoding
+    if _encoding is None:
+        _encoding = tiktoken.get_encoding("cl100k_base")
+    return _encoding
+
+
+def count_tokens(text: str) -> int:
+    if tiktoken_installed:
+        return len(_get_encoding().encode(text))
+    return max(1, len(text) // 4)
+
+
+def truncate_tokens(text: str, max_tokens: int, keep_end: bool = False) -> str:
+    """Text cut to max_tokens (from the start, or keeping the end)."""
+    if max_tokens <= 0:
+        return ""
+    if count_tokens(text) <= max_tokens:
+        return text
+    if tiktoken_installed:
+        tokens = _get_encoding().encode(text)
+        tokens = tokens[-max_tokens:] if keep_end else tokens[:max_tokens]
+        cut = _get_encoding().decode(tokens)
+    else:
+        cut = text[-4 * max_tokens:] if keep_end else text[:4 * max_tokens]
+    return "... " + cut if keep_end else cut + " ..."
+
+
+def format_messages(messages: List[Dict[str, Any]]) -> str:
+    return "\n".join(f"{'User' if m['role'] == 'user' else 'Assistant'}: {m['content']}" for m in messages)
+
+
+def extractive_summary(summary: str, messages: List[Dict[str, Any]], max_tokens: int) -> str:
+    """Fallback without LLM: first sentence of every message, newest content kept."""
+    lines = [summary] if summary else []
+    for m in messages:
+        first = re.split(r"(?<=[.!?])\s", m["content"].strip(), maxsplit=1)[0]
+        lines.append(f"{'User' if m['role'] == 'user' else 'Assistant'}: {first}")
+    return truncate_tokens("\n".join(lines), max_tokens, keep_end=True)
+
+
+def openai_summarizer(api_key: Optional[str] = None, model: str = SUMMARY_MODEL) -> Callable[[str, str, int], str]:
+    """summarize_fn(summary, new messages as text, max_tokens) -> updated summary, via ChatCompletion."""
+    def summarize(summary: str, messages: str, max_tokens: int) -> str:
+        kwargs = {"api_key": api_key} if api_key else {}
+        response = openai.ChatCompletion.create(
+            model=model,
+            messages=[{"role": "user", "content": SUMMARY_PROMPT.format(
+                words=int(max_tokens * 0.7), summary=summary or "(empty)", messages=messages)}],
+            temperature=0.0,
+            max_tokens=max_tokens,
+            **kwargs
+        )
+        return response.choices[0].message.content.strip()
+    return summarize
+
+
+class ConversationMemory:
+    def __init__(self, keep_turns: int = KEEP_TURNS, token_budget: int = TOKEN_BUDGET,
+                 summary_budget: int = SUMMARY_TOKEN_BUDGET, max_messages: int = MAX_STORED_MESSAGES,
+                 fold_threshold: int = FOLD_TOKEN_THRESHOLD):
+        self.keep_turns = keep_turns
+        self.fold_threshold = fold_threshold
+        self.token_budget = token_budget
+        self.summary_budget = summary_budget
+        self.max_messages = max_messages
+        self.messages: List[Dict[str, Any]] = []  # {"id", "role", "content", ...}
+        self.next_id = 0
+        self.summary = ""
+        self.summarized_id = 0  # messages with id < summarized_id are in the summary
+
+    def __len__(self) -> int:
+        return self.next_id
+
+    def add(self, role: str, content: str, **extra) -> Dict[str, Any]:
+        message = {"id": self.next_id, "role": role, "content": content, **extra}
+        self.messages.append(message)
+        self.next_id += 1
+        # Nur bereits zusammengefasste Nachrichten verwerfen
+        while len(self.messages) > self.max_messages and self.messages[0]["id"] < self.summarized_id:
+            self.messages.pop(0)
+        return message
+
+    def get(self, message_id: int) -> Optional[Dict[str, Any]]:
+        if not self.messages:
+            return None
+        pos = message_id - self.messages[0]["id"]
+        return self.messages[pos] if 0 <= pos < len(self.messages) else None
+
+    def window(self, size: int = DISPLAY_WINDOW) -> List[Dict[str, Any]]:
+        """Newest `size` messages (for rendering)."""
+        return self.messages[-size:] if size > 0 else []
+
+    def _fold(self, summarize_fn):
+        recent = self.messages[-2 * self.keep_turns:] if self.keep_turns else []
+        cutoff = recent[0]["id"] if recent else self.next_id
+        older = [m for m in self.messages if self.summarized_id <= m["id"] < cutoff]
+        # Bis zur Schwelle gehen ältere Nachrichten unverändert (im Token-Budget) in den Prompt
+        if not older or sum(count_tokens(m["content"]) for m in older) < self.fold_threshold:
+            return
+        summary = None
+        if summarize_fn is not None:
+            try:
+                summary = summarize_fn(self.summary, format_messages(older), self.summary_budget)
+            except Exception:
+                summary = None
+        if summary:
+            summary = truncate_tokens(summary, self.summary_budget, keep_end=True)
+        else:
+            summary = extractive_summary(self.summary, older, self.summary_budget)
+        self.summary = summary
+        self.summarized_id = cutoff
+
+    def prompt_messages(self, summarize_fn=None, exclude_last: int = 0) -> List[Dict[str, str]]:
+        """
+        Chat messages for the model: running summary (system) + newest messages
+        verbatim, within token_budget. exclude_last skips e.g. the question just added.
+        """
+        self._fold(summarize_fn)
+        last_id = self.next_id - exclude_last
+        budget = self.token_budget
+        result = []
+        if self.summary:
+            result.append({"role": "system", "content": f"Summary of the earlier conversation:\n{self.summary}"})
+            budget -= count_tokens(self.summary)
+        recent = []
+        for m in reversed([m for m in self.messages if self.summarized_id <= m["id"] < last_id]):
+            tokens = count_tokens(m["content"])
+            content = m["content"] if tokens <= budget else truncate_tokens(m["content"], budget)
+            if not content:
+                break
+            recent.append({"role": "user" if m["role"] == "user" else "assistant", "content": content})
+            budget -= min(tokens, budget)
+        return result + recent[::-1]
+
+
+def get_session_memory(session_state, key: str) -> ConversationMemory:
+    if key not in session_state:
+        session_state[key] = ConversationMemory()
+    return session_state[key]
@@ -0,0 +1,125 @@
+import hashlib
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import openai
+
+from modules.embedding_cache import get_embedding_cache
+
+# ------------------------------------------------------------------
+# Retrieval-Index für den Sidebar-Chatbot
+# ------------------------------------------------------------------
+# One index per Streamlit session over all papers the session has seen.
+# Each paper is chunked once and only chunks that are not yet in the
+# index are embedded; removed papers are dropped. A question is answered
+# from the top-k chunks picked by maximal marginal relevance (cosine
+# similarity to the question minus similarity to already picked chunks),
+# so the prompt stays small and several papers get a say.
+
+CHAT_EMBEDDING_MODEL = "text-embedding-ada-002"
+CHUNK_CHARS = 1500
+CHUNK_OVERLAP = 200
+TOP_K = 6
+MMR_LAMBDA = 0.7
+
+
+def chunk_text(text: str, chunk_chars: int = CHUNK_CHARS, overlap: int = CHUNK_OVERLAP) -> List[Tuple[int, str]]:
+    """(offset, chunk) pairs of fixed size with overlap, cut at whitespace where possible."""
+    chunks = []
+    start = 0
+    n = len(text)
+    while start < n:
+        end = min(start + chunk_chars, n)
+        if end < n:
+            space = text.rfind(" ", start + chunk_chars // 2, end)
+            if space > 0:
+                end = space
+        chunk = text[start:end].strip()
+        if chunk:
+            chunks.append((start, chunk))
+        if end >= n:
+            break
+        start = max(end - overlap, start + 1)
+    return chunks
+
+
+def mmr_select(query_vec: np.ndarray, vectors: np.ndarray, k: int, mmr_lambda: float = MMR_LAMBDA,
+               fetch_k: Optional[int] = None) -> List[int]:
+    """Indices of k rows of `vectors` (normalized) by maximal marginal relevance."""
+    if not len(vectors):
+        return []
+    sims = vectors @ query_vec
+    candidates = list(np.argsort(-sims)[:fetch_k or 4 * k])
+    selected: List[int] = []
+    while candidates and len(selected) < k:
+        if selected:
+            redundancy = (vectors[candidates] @ vectors[selected].T).max(axis=1)
+        else:
+            redundancy = np.zeros(len(candidates))
+        scores = mmr_lambda * sims[candidates] - (1 - mmr_lambda) * redundancy
+        best = candidates.pop(int(np.argmax(scores)))
+        selected.append(int(best))
+    return selected
+
+
+class ChatIndex:
+    def __init__(self, embed_fn=None):
+        # embed_fn(list of texts, api_key) -> array (n, dim)
+        self.embed_fn = embed_fn or embed_openai
+        self.doc_hashes: Dict[str, str] = {}   # name -> text hash
+        self.chunks: List[Dict[str, object]] = []  # {"doc", "offset", "text"}
+        self.vectors = np.zeros((0, 0), dtype=np.float32)
+
+    def sync(self, documents: Dict[str, str], api_key: str) -> int:
+        """Brings the index in line with `documents`; returns the number of newly embedded chunks."""
+        current = {name: hashlib.sha256(text.encode("utf-8")).hexdigest() for name, text in documents.items() if text.strip()}
+        stale = {name for name, h in self.doc_hashes.items() if current.get(name) != h}
+        if stale:
+            keep = [i for i, c in enumerate(self.chunks) if c["doc"] not in stale]
+            self.chunks = [self.chunks[i] for i in keep]
+            self.vectors = self.vectors[keep] if len(keep) else np.zeros((0, 0), dtype=np.float32)
+            for name in stale:
+                del self.doc_hashes[name]
+
+        new_docs = {name: h for name, h in current.items() if name not in self.doc_hashes}
+        new_chunks = []
+        for name in new_docs:
+            new_chunks.extend({"doc": name, "offset": off, "text": txt} for off, txt in chunk_text(documents[name]))
+        if new_chunks:
+            # May raise (API error): the documents then stay unindexed and are retried on the next sync
+            vecs = np.asarray(self.embed_fn([c["text"] for c in new_chunks], api_key), dtype=np.float32)
+            vecs /= np.linalg.norm(vecs, axis=1, keepdims=True) + 1e-12
+            self.vectors = vecs if not self.vectors.size else np.vstack([self.vectors, vecs])
+            self.chunks.extend(new_chunks)
+        self.doc_hashes.update(new_docs)
+        return len(new_chunks)
+
+    def search(self, question: str, api_key: str, k: int = TOP_K, mmr_lambda: float = MMR_LAMBDA) -> List[Dict[str, object]]:
+        if not self.chunks:
+            return []
+        q = np.asarray(self.embed_fn([question], api_key), dtype=np.float32)[0]
+        q /= np.linalg.norm(q) + 1e-12
+        return [self.chunks[i] for i in mmr_select(q, self.vectors, k, mmr_lambda)]
+
+
+def embed_openai(texts: List[str], api_key: str) -> np.ndarray:
+    """OpenAI embeddings through the shared embedding cache (only unseen chunks hit the API)."""
+    def fetch(missing):
+        vectors = []
+        for i in range(0, len(missing), 500):
+            resp = openai.Embedding.create(input=missing[i:i + 500], model=CHAT_EMBEDDING_MODEL, api_key=api_key)
+            vectors.extend(d["embedding"] for d in sorted(resp["data"], key=lambda d: d["index"]))
+        return vectors
+
+    return get_embedding_cache().embed(texts, CHAT_EMBEDDING_MODEL, fetch)
+
+
+def format_context(chunks: List[Dict[str, object]]) -> str:
+    """Chunks as prompt context, each labelled with its paper."""
+    return "\n\n".join(f"[{c['doc']}]\n{c['text']}" for c in chunks)
+
+
+def get_session_chat_index(session_state, key: str = "chat_index") -> ChatIndex:
+    if key not in session_state:
+        session_state[key] = ChatIndex()
+    return session_state[key]
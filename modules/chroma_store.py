@@ -0,0 +1,200 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+import weakref
+from collections import Counter
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Iterable
+
+from langchain.embeddings.openai import OpenAIEmbeddings
+from langchain.vectorstores import Chroma
+
+from modules.chat_retrieval import chunk_text
+from modules.embedding_cache import CachedEmbeddings
+from modules.local_embeddings import LocalEmbeddings, is_local_embedding
+
+# ------------------------------------------------------------------
+# Persistente Chroma-Collection der PDF-Q&A-Module
+# ------------------------------------------------------------------
+# paper_qa_chroma.py and paperqa2_module.py share one Chroma client and
+# collection per process. Chunks are keyed by "<document hash>:<offset>",
+# so a document is embedded at most once. The collection is shared by all
+# sessions (the same PDF may be in use elsewhere); each session retrieves
+# only from its own documents via the doc_hash filter and holds a
+# DocumentLease on them. A document's chunks are deleted once no lease in
+# this process refers to it any more, or - for documents left over from
+# earlier server runs - once its last use (doc_usage.sqlite) is older than
+# CHROMA_DOC_TTL. Re-uploading a deleted PDF is cheap: its vectors are
+# still in the embedding cache.
+
+CHROMA_PERSIST_DIR = os.getenv("CHROMA_PERSIST_DIR", os.path.join(".cache", "chroma"))
+# "openai" oder ein lokales Modell, z.B. "local-sentence-transformers/all-MiniLM-L6-v2"
+CHROMA_EMBEDDING = os.getenv("CHROMA_EMBEDDING", "openai")
+# "1" = lokales Modell dynamisch int8-quantisiert bzw. über ONNX Runtime ausführen
+CHROMA_EMBEDDING_QUANTIZE = os.getenv("CHROMA_EMBEDDING_QUANTIZE", "0") == "1"
+CHROMA_EMBEDDING_ONNX = os.getenv("CHROMA_EMBEDDING_ONNX", "0") == "1"
+CHROMA_DOC_TTL = float(os.getenv("CHROMA_DOC_TTL_DAYS", "30")) * 24 * 3600
+CHROMA_USAGE_DB = os.path.join(CHROMA_PERSIST_DIR, "doc_usage.sqlite")
+# Eigene Collection je Embedding-Backend (unterschiedliche Vektordimensionen)
+CHROMA_COLLECTION = "paper_qa" if not is_local_embedding(CHROMA_EMBEDDING) else \
+    "paper_qa_local_" + hashlib.sha256(CHROMA_EMBEDDING.encode("utf-8")).hexdigest()[:12]
+_write_lock = threading.Lock()
+# Live leases per doc_hash in this process; released hashes wait in _pending_release
+_usage_lock = threading.Lock()
+_lease_counts: Counter = Counter()
+_pending_release: list = []
+
+
+@lru_cache(maxsize=1)
+def get_embeddings():
+    """Embedding-Backend (OpenAI oder lokal auf der CPU), immer über den Embedding-Cache."""
+    if is_local_embedding(CHROMA_EMBEDDING):
+        return CachedEmbeddings(LocalEmbeddings(CHROMA_EMBEDDING, quantize=CHROMA_EMBEDDING_QUANTIZE,
+                                                onnx=CHROMA_EMBEDDING_ONNX))
+    return CachedEmbeddings(OpenAIEmbeddings())
+
+
+@lru_cache(maxsize=1)
+def get_persistent_vectorstore() -> Chroma:
+    """
+    Persistente Chroma-Collection (persist_directory), ein Client pro Prozess.
+    Chunk-IDs = "<Dokument-Hash>:<Offset>", Metadaten enthalten den Dokument-Hash.
+    """
+    os.makedirs(CHROMA_PERSIST_DIR, exist_ok=True)
+    return Chroma(
+        collection_name=CHROMA_COLLECTION,
+        embedding_function=get_embeddings(),
+        persist_directory=CHROMA_PERSIST_DIR
+    )
+
+
+def is_indexed(doc_hash: str) -> bool:
+    found = get_persistent_vectorstore()._collection.get(where={"doc_hash": doc_hash}, limit=1, include=[])
+    return bool(found["ids"])
+
+
+def index_document(text: str) -> str:
+    """
+    Fügt ein Dokument inkrementell hinzu: nur wenn sein Hash noch nicht in der
+    Collection ist, wird gesplittet und embedded (außerhalb des Schreib-Locks,
+    damit mehrere Dokumente parallel embedded werden). Gibt den Dokument-Hash zurück.
+    """
+    doc_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    if is_indexed(doc_hash):
+        logging.info(f"Dokument {doc_hash[:12]} ist bereits indexiert.")
+        return doc_hash
+    chunks = chunk_text(text, chunk_chars=1000, overlap=100)
+    vectors = get_embeddings().embed_documents([c for _, c in chunks])
+    _touch([doc_hash])
+    vectorstore = get_persistent_vectorstore()
+    with _write_lock:
+        # Ein paralleler Worker kann dasselbe Dokument inzwischen geschrieben haben
+        if not is_indexed(doc_hash):
+            vectorstore._collection.add(
+                ids=[f"{doc_hash}:{offset}" for offset, _ in chunks],
+                embeddings=vectors,
+                documents=[c for _, c in chunks],
+                metadatas=[{"doc_hash": doc_hash, "offset": offset} for offset, _ in chunks]
+            )
+            vectorstore.persist()
+    logging.info(f"Dokument {doc_hash[:12]}: {len(chunks)} Chunks indexiert.")
+    return doc_hash
+
+
+def corpus_filter(doc_hashes):
+    """Chroma-where-Filter auf die Dokumente der aktuellen Sitzung."""
+    doc_hashes = sorted(doc_hashes)
+    if len(doc_hashes) == 1:
+        return {"doc_hash": doc_hashes[0]}
+    return {"$or": [{"doc_hash": h} for h in doc_hashes]}
+
+
+# ------------------------------------------------------------------
+# Nutzung der Dokumente und Löschen nicht mehr verwendeter Chunks
+# ------------------------------------------------------------------
+
+@contextmanager
+def _connect_usage():
+    os.makedirs(CHROMA_PERSIST_DIR, exist_ok=True)
+    conn = sqlite3.connect(CHROMA_USAGE_DB, timeout=30)
+    try:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("CREATE TABLE IF NOT EXISTS doc_usage (doc_hash TEXT PRIMARY KEY, last_used REAL NOT NULL)")
+        yield conn
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def _touch(doc_hashes: Iterable[str]):
+    now = time.time()
+    with _connect_usage() as conn:
+        conn.executemany("INSERT OR REPLACE INTO doc_usage VALUES (?, ?)", [(h, now) for h in doc_hashes])
+
+
+def _queue_release(doc_hashes: frozenset):
+    # Runs as weakref finalizer (possibly inside garbage collection): no locks, no I/O
+    _pending_release.append(doc_hashes)
+
+
+class DocumentLease:
+    """
+    The documents one session retrieves from. While a lease is alive its chunks
+    are never deleted; it is released explicitly (corpus changed / cleared) or
+    when the session - and with it this object - is gone.
+    """
+
+    def __init__(self, doc_hashes: Iterable[str]):
+        self.doc_hashes = frozenset(doc_hashes)
+        with _usage_lock:
+            _lease_counts.update(self.doc_hashes)
+        _touch(self.doc_hashes)
+        self._finalizer = weakref.finalize(self, _queue_release, self.doc_hashes)
+
+    def touch(self):
+        """Marks the documents as used now (e.g. on every question)."""
+        _touch(self.doc_hashes)
+
+    def release(self):
+        self._finalizer()
+        purge_unused_documents()
+
+
+def _delete_documents(vectorstore, doc_hashes):
+    for doc_hash in doc_hashes:
+        vectorstore._collection.delete(where={"doc_hash": doc_hash})
+    with _connect_usage() as conn:
+        conn.executemany("DELETE FROM doc_usage WHERE doc_hash = ?", [(h,) for h in doc_hashes])
+
+
+def purge_unused_documents(ttl: float = CHROMA_DOC_TTL) -> int:
+    """
+    Deletes the chunks of documents no live lease refers to: released ones at
+    once, others once their last use is older than ttl. Returns the number of
+    deleted documents.
+    """
+    vectorstore = get_persistent_vectorstore()
+    with _write_lock:
+        with _usage_lock:
+            released = set()
+            while _pending_release:
+                doc_hashes = _pending_release.pop()
+                _lease_counts.subtract(doc_hashes)
+                released |= doc_hashes
+            in_use = {h for h, n in _lease_counts.items() if n > 0}
+            for h in [h for h, n in _lease_counts.items() if n <= 0]:
+                del _lease_counts[h]
+            with _connect_usage() as conn:
+                expired = {h for (h,) in conn.execute("SELECT doc_hash FROM doc_usage WHERE last_used < ?",
+                                                      (time.time() - ttl,))}
+            to_delete = (released | expired) - in_use
+            if to_delete:
+                _delete_documents(vectorstore, to_delete)
+                vectorstore.persist()
+    if to_delete:
+        logging.info(f"{len(to_delete)} nicht mehr verwendete Dokumente aus der Chroma-Collection gelöscht.")
+    return len(to_delete)
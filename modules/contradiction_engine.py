@@ -0,0 +1,276 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import openai
+
+from modules.embedding_cache import get_embedding_cache
+
+# ------------------------------------------------------------------
+# Widerspruchsanalyse über Claim-Cluster
+# ------------------------------------------------------------------
+# Instead of sending every claim of every paper in one prompt, claims are
+# extracted per paper (concurrently, cached by text hash), embedded and
+# grouped by cosine similarity. Only groups of similar claims from
+# different papers go to the LLM - one small request per group, in
+# parallel - so the cost grows with the number of related claims, not
+# with the square of the corpus.
+
+CLAIM_CACHE_PATH = os.getenv("CLAIM_CACHE_PATH", os.path.join(".cache", "claims.sqlite"))
+CLAIM_EMBEDDING_MODEL = "text-embedding-ada-002"
+SIMILARITY_THRESHOLD = 0.82
+MAX_GROUP_SIZE = 8
+MAX_COMPARISONS = 200
+
+CLAIMS_PROMPT = """
+Lies den folgenden Ausschnitt eines wissenschaftlichen Papers (maximal 2000 Tokens).
+Extrahiere bitte die wichtigsten 3-5 "Aussagen" (Claims), die das Paper aufstellt.
+Nutze als Ausgabe ein kompaktes JSON-Format, z.B:
+[
+  {{"claim": "Aussage 1"}},
+  {{"claim": "Aussage 2"}}
+]
+Text: {text}
+"""
+
+GROUP_PROMPT = """
+Hier sind thematisch ähnliche Claims (Aussagen) aus verschiedenen wissenschaftlichen Papers im JSON-Format.
+{method_hint}Bitte identifiziere:
+1) Gemeinsamkeiten zwischen den Papers (Wo überschneiden oder ergänzen sich die Aussagen?)
+2) Klare Widersprüche zwischen Aussagen verschiedener Papers.
+
+Antworte NUR in folgendem JSON-Format (ohne weitere Erklärungen, leere Listen falls nichts zutrifft):
+{{
+  "commonalities": ["Gemeinsamkeit 1"],
+  "contradictions": [
+    {{"paperA": "...", "claimA": "...", "paperB": "...", "claimB": "...", "reason": "..."}}
+  ]
+}}
+
+Hier die Claims:
+{claims}
+"""
+
+CONTRACROW_HINT = ("Nutze die ContraCrow-Methodik, die sich darauf fokussiert, systematisch "
+                   "Gemeinsamkeiten und klare Widersprüche zu identifizieren.\n")
+
+
+def _parse_json(raw: str) -> Any:
+    """JSON from an LLM answer (tolerates ```json fences)."""
+    raw = raw.strip()
+    fenced = re.search(r"```(?:json)?\s*(.*?)```", raw, re.DOTALL)
+    if fenced:
+        raw = fenced.group(1).strip()
+    return json.loads(raw)
+
+
+class ClaimCache:
+    """Extracted claims per (text hash, model) in SQLite."""
+
+    def __init__(self, db_path: str = CLAIM_CACHE_PATH):
+        self.db_path = db_path
+        dirname = os.path.dirname(db_path)
+        if dirname:
+            os.makedirs(dirname, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS claims (text_hash TEXT NOT NULL, model TEXT NOT NULL, "
+                "claims TEXT NOT NULL, created_at REAL NOT NULL, PRIMARY KEY (text_hash, model))"
+            )
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            yield conn
+            conn.commit()
+        finally:
+            conn.close()
+
+    def get(self, text_hash: str, model: str) -> Optional[List[str]]:
+        with self._connect() as conn:
+            row = conn.execute("SELECT claims FROM claims WHERE text_hash = ? AND model = ?",
+                               (text_hash, model)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, text_hash: str, model: str, claims: List[str]):
+        with self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO claims VALUES (?, ?, ?, ?)",
+                         (text_hash, model, json.dumps(claims, ensure_ascii=False), time.time()))
+
+
+class ContradictionEngine:
+    def __init__(self, api_key: str, model: str, max_workers: int = 8,
+                 threshold: float = SIMILARITY_THRESHOLD, max_group_size: int = MAX_GROUP_SIZE,
+                 max_comparisons: int = MAX_COMPARISONS, cache: Optional[ClaimCache] = None,
+                 embed_fn=None):
+        self.api_key = api_key
+        self.model = model
+        self.max_workers = max_workers
+        self.threshold = threshold
+        self.max_group_size = max_group_size
+        self.max_comparisons = max_comparisons
+        self.cache = cache or ClaimCache()
+        # embed_fn(list of texts) -> array (n, dim); default: OpenAI embeddings
+        self.embed_fn = embed_fn or self._embed_openai
+        self.errors: List[str] = []
+
+    # --- 1) Claims ------------------------------------------------------
+    def _extract_claims(self, text: str) -> List[str]:
+        text_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        cached = self.cache.get(text_hash, self.model)
+        if cached is not None:
+            return cached
+        resp = openai.ChatCompletion.create(
+            model=self.model,
+            messages=[{"role": "user", "content": CLAIMS_PROMPT.format(text=text[:6000])}],
+            temperature=0.3,
+            max_tokens=700,
+            api_key=self.api_key
+        )
+        raw = resp.choices[0].message.content.strip()
+        try:
+            claims_list = _parse_json(raw)
+        except Exception:
+            claims_list = [{"claim": raw}]
+        if not isinstance(claims_list, list):
+            claims_list = [claims_list]
+        claims = [str(c.get("claim", "")).strip() if isinstance(c, dict) else str(c).strip() for c in claims_list]
+        claims = [c for c in claims if c]
+        self.cache.put(text_hash, self.model, claims)
+        return claims
+
+    def extract_all_claims(self, pdf_texts: Dict[str, str]) -> List[Dict[str, str]]:
+        """[{"paper": name, "claim": text}, ...] for all papers (extracted concurrently)."""
+        names = list(pdf_texts)
+
+        def run(name):
+            try:
+                return self._extract_claims(pdf_texts[name])
+            except Exception as e:
+                self.errors.append(f"Error extracting claims in {name}: {e}")
+                return []
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            per_paper = list(pool.map(run, names))
+        return [{"paper": name, "claim": c} for name, claims in zip(names, per_paper) for c in claims]
+
+    # --- 2) Embeddings & clusters -----------------------------------------
+    def _embed_openai(self, texts: List[str]) -> np.ndarray:
+        def fetch(missing):
+            vectors = []
+            for i in range(0, len(missing), 500):
+                resp = openai.Embedding.create(input=missing[i:i + 500], model=CLAIM_EMBEDDING_MODEL, api_key=self.api_key)
+                vectors.extend(d["embedding"] for d in sorted(resp["data"], key=lambda d: d["index"]))
+            return vectors
+
+        return get_embedding_cache().embed(texts, CLAIM_EMBEDDING_MODEL, fetch)
+
+    def cluster_claims(self, claims: List[Dict[str, str]]) -> List[List[int]]:
+        """
+        Groups of claim indices whose claims are similar (cosine >= threshold) and
+        stem from at least two papers. Oversized groups are split into their most
+        similar cross-paper pairs.
+        """
+        if len(claims) < 2:
+            return []
+        emb = np.asarray(self.embed_fn([c["claim"] for c in claims]), dtype=np.float32)
+        emb /= np.linalg.norm(emb, axis=1, keepdims=True) + 1e-12
+        papers = np.array([c["paper"] for c in claims])
+        sim = emb @ emb.T
+        # Only pairs of claims from different papers, each pair once
+        mask = np.triu(sim >= self.threshold, k=1) & (papers[:, None] != papers[None, :])
+        rows, cols = np.nonzero(mask)
+        if not len(rows):
+            return []
+
+        # Connected components (union-find over the candidate pairs)
+        parent = list(range(len(claims)))
+
+        def find(x):
+            while parent[x] != x:
+                parent[x] = parent[parent[x]]
+                x = parent[x]
+            return x
+
+        for a, b in zip(rows, cols):
+            ra, rb = find(a), find(b)
+            if ra != rb:
+                parent[rb] = ra
+        components: Dict[int, List[int]] = {}
+        for idx in set(rows) | set(cols):
+            components.setdefault(find(idx), []).append(int(idx))
+
+        groups = []
+        for members in components.values():
+            if len(members) <= self.max_group_size:
+                groups.append(sorted(members))
+                continue
+            member_set = set(members)
+            pair_idx = [k for k in range(len(rows)) if rows[k] in member_set]
+            pair_idx.sort(key=lambda k: -sim[rows[k], cols[k]])
+            groups.extend([int(rows[k]), int(cols[k])] for k in pair_idx)
+        # Most similar groups first; cap the number of LLM calls
+        groups.sort(key=lambda g: -max(sim[a, b] for a in g for b in g if a != b))
+        return groups[:self.max_comparisons]
+
+    # --- 3) Per-group comparison ------------------------------------------
+    def _compare_group(self, group_claims: List[Dict[str, str]], method_choice: str) -> Dict[str, list]:
+        prompt = GROUP_PROMPT.format(
+            method_hint=CONTRACROW_HINT if method_choice == "ContraCrow" else "",
+            claims=json.dumps(group_claims, ensure_ascii=False, indent=2)
+        )
+        resp = openai.ChatCompletion.create(
+            model=self.model,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=0.0,
+            max_tokens=600,
+            api_key=self.api_key
+        )
+        data = _parse_json(resp.choices[0].message.content)
+        return {"commonalities": data.get("commonalities", []), "contradictions": data.get("contradictions", [])}
+
+    def analyze(self, pdf_texts: Dict[str, str], method_choice: str = "Standard") -> Dict[str, Any]:
+        """Returns {"commonalities": [...], "contradictions": [...], "stats": {...}}."""
+        self.errors = []
+        claims = self.extract_all_claims(pdf_texts)
+        groups = self.cluster_claims(claims)
+
+        def run(group):
+            try:
+                return self._compare_group([claims[i] for i in group], method_choice)
+            except Exception as e:
+                self.errors.append(f"Error comparing claim group: {e}")
+                return {"commonalities": [], "contradictions": []}
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            partials = list(pool.map(run, groups))
+
+        commonalities, contradictions = [], []
+        seen_common, seen_contra = set(), set()
+        for part in partials:
+            for c in part["commonalities"]:
+                key = str(c).strip().lower()
+                if key and key not in seen_common:
+                    seen_common.add(key)
+                    commonalities.append(c)
+            for c in part["contradictions"]:
+                if not isinstance(c, dict):
+                    continue
+                key = tuple(sorted([(c.get("paperA"), c.get("claimA")), (c.get("paperB"), c.get("claimB"))], key=str))
+                if key not in seen_contra:
+                    seen_contra.add(key)
+                    contradictions.append(c)
+        return {
+            "commonalities": commonalities,
+            "contradictions": contradictions,
+            "stats": {"papers": len(pdf_texts), "claims": len(claims), "groups_compared": len(groups)},
+        }
@@ -0,0 +1,288 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+try:
+    from langchain.embeddings.base import Embeddings as _LangchainEmbeddings
+    langchain_installed = True
+except ImportError:
+    _LangchainEmbeddings = object
+    langchain_installed = False
+
+try:
+    from lmi import EmbeddingModel, EmbeddingModes
+    lmi_installed = True
+except ImportError:
+    lmi_installed = False
+
+# ------------------------------------------------------------------
+# Content-addressed embedding cache (memmap float32 + SQLite index)
+# ------------------------------------------------------------------
+# A vector is stored once per (model, dims, sha256 of the text). Each
+# (model, dims) pair owns one memory-mapped float32 slab on disk; the
+# SQLite index maps the text hash to its row and tracks the last use.
+# When a slab reaches max_vectors the least recently used rows are
+# overwritten. Hot vectors additionally live in a small in-process LRU.
+# Every embedding path of the app (Chroma modules, chat retrieval,
+# contradiction engine, paperqa Docs) goes through embed(), so embedding
+# the same corpus twice costs no API call.
+
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", os.path.join(".cache", "embeddings"))
+EMBEDDING_CACHE_MAX_VECTORS = int(os.getenv("EMBEDDING_CACHE_MAX_VECTORS", "500000"))
+EMBEDDING_CACHE_LRU_SIZE = 8192
+INITIAL_SLAB_ROWS = 1024
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS slabs (
+    id INTEGER PRIMARY KEY,
+    model TEXT NOT NULL,
+    dims INTEGER NOT NULL,
+    width INTEGER NOT NULL,
+    capacity INTEGER NOT NULL,
+    used INTEGER NOT NULL,
+    UNIQUE (model, dims)
+);
+CREATE TABLE IF NOT EXISTS vectors (
+    slab INTEGER NOT NULL,
+    text_hash TEXT NOT NULL,
+    row INTEGER NOT NULL,
+    last_used REAL NOT NULL,
+    PRIMARY KEY (slab, text_hash)
+);
+CREATE INDEX IF NOT EXISTS vectors_lru ON vectors (slab, last_used);
+"""
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    def __init__(self, root: str = EMBEDDING_CACHE_DIR, max_vectors: int = EMBEDDING_CACHE_MAX_VECTORS,
+                 lru_size: int = EMBEDDING_CACHE_LRU_SIZE):
+        self.root = root
+        self.max_vectors = max_vectors
+        self.lru_size = lru_size
+        self.lru: "OrderedDict[Tuple[int, str], np.ndarray]" = OrderedDict()
+        self.maps: Dict[int, np.memmap] = {}
+        self.lock = threading.RLock()
+        os.makedirs(root, exist_ok=True)
+        self.db_path = os.path.join(root, "index.sqlite")
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            yield conn
+            conn.commit()
+        finally:
+            conn.close()
+
+    # --- Slabs -------------------------------------------------------
+    def _slab_path(self, slab_id: int, model: str, dims: int) -> str:
+        safe = re.sub(r"[^A-Za-z0-9_.-]+", "_", model)
+        return os.path.join(self.root, f"{slab_id}_{safe}_{dims}.f32")
+
+    def _slab(self, conn, model: str, dims: int, width: Optional[int] = None):
+        """(id, width, capacity, used) of the slab, created on first put (width known)."""
+        row = conn.execute("SELECT id, width, capacity, used FROM slabs WHERE model = ? AND dims = ?",
+                           (model, dims)).fetchone()
+        if row is None and width:
+            cur = conn.execute("INSERT INTO slabs (model, dims, width, capacity, used) VALUES (?, ?, ?, 0, 0)",
+                               (model, dims, width))
+            row = (cur.lastrowid, width, 0, 0)
+        return row
+
+    def _map(self, slab_id: int, model: str, dims: int, width: int, capacity: int) -> np.memmap:
+        mm = self.maps.get(slab_id)
+        if mm is None or mm.shape[0] != capacity:
+            path = self._slab_path(slab_id, model, dims)
+            size = capacity * width * 4
+            if mm is not None:
+                mm.flush()
+                del self.maps[slab_id]
+            with open(path, "ab") as f:
+                if f.tell() < size:
+                    f.truncate(size)
+            mm = np.memmap(path, dtype=np.float32, mode="r+", shape=(capacity, width))
+            self.maps[slab_id] = mm
+        return mm
+
+    # --- LRU ---------------------------------------------------------
+    def _lru_get(self, key):
+        vec = self.lru.get(key)
+        if vec is not None:
+            self.lru.move_to_end(key)
+        return vec
+
+    def _lru_put(self, key, vec: np.ndarray):
+        self.lru[key] = vec
+        self.lru.move_to_end(key)
+        while len(self.lru) > self.lru_size:
+            self.lru.popitem(last=False)
+
+    # --- Public API ----------------------------------------------------
+    def get_many(self, model: str, texts: Sequence[str], dims: int = 0) -> List[Optional[np.ndarray]]:
+        """Cached vectors for `texts` (None where missing). dims = requested dimensions, 0 = model default."""
+        hashes = [text_hash(t) for t in texts]
+        results: List[Optional[np.ndarray]] = [None] * len(texts)
+        with self.lock, self._connect() as conn:
+            slab = self._slab(conn, model, dims)
+            if slab is None:
+                return results
+            slab_id, width, capacity, _ = slab
+            missing = []
+            for i, h in enumerate(hashes):
+                vec = self._lru_get((slab_id, h))
+                if vec is not None:
+                    results[i] = vec
+                else:
+                    missing.append(i)
+            if not missing:
+                return results
+            mm = self._map(slab_id, model, dims, width, capacity)
+            rows = {}
+            unique = list(dict.fromkeys(hashes[i] for i in missing))
+            for j in range(0, len(unique), 500):
+                chunk = unique[j:j + 500]
+                rows.update(conn.execute(
+                    f"SELECT text_hash, row FROM vectors WHERE slab = ? AND text_hash IN ({','.join('?' * len(chunk))})",
+                    (slab_id, *chunk)
+                ).fetchall())
+            for i in missing:
+                row = rows.get(hashes[i])
+                if row is not None:
+                    results[i] = np.array(mm[row])
+                    self._lru_put((slab_id, hashes[i]), results[i])
+            if rows:
+                now = time.time()
+                conn.executemany("UPDATE vectors SET last_used = ? WHERE slab = ? AND text_hash = ?",
+                                 [(now, slab_id, h) for h in rows])
+        return results
+
+    def put_many(self, model: str, texts: Sequence[str], vectors, dims: int = 0):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if not len(texts):
+            return
+        new = dict(zip((text_hash(t) for t in texts), vectors))
+        with self.lock, self._connect() as conn:
+            slab_id, width, capacity, used = self._slab(conn, model, dims, width=vectors.shape[1])
+            if vectors.shape[1] != width:
+                raise ValueError(f"Embedding width {vectors.shape[1]} != cached width {width} for {model}")
+            existing = set()
+            hashes = list(new)
+            for j in range(0, len(hashes), 500):
+                chunk = hashes[j:j + 500]
+                existing.update(h for (h,) in conn.execute(
+                    f"SELECT text_hash FROM vectors WHERE slab = ? AND text_hash IN ({','.join('?' * len(chunk))})",
+                    (slab_id, *chunk)
+                ))
+            hashes = [h for h in hashes if h not in existing][:self.max_vectors]
+            if not hashes:
+                return
+
+            # Free rows first, then the least recently used ones
+            fresh = min(len(hashes), self.max_vectors - used)
+            rows = list(range(used, used + fresh))
+            if len(hashes) > fresh:
+                evicted = conn.execute(
+                    "SELECT text_hash, row FROM vectors WHERE slab = ? ORDER BY last_used LIMIT ?",
+                    (slab_id, len(hashes) - fresh)
+                ).fetchall()
+                conn.executemany("DELETE FROM vectors WHERE slab = ? AND text_hash = ?",
+                                 [(slab_id, h) for h, _ in evicted])
+                for h, row in evicted:
+                    self.lru.pop((slab_id, h), None)
+                    rows.append(row)
+            used += fresh
+            if used > capacity:
+                capacity = min(self.max_vectors, max(INITIAL_SLAB_ROWS, capacity * 2, used))
+            mm = self._map(slab_id, model, dims, width, capacity)
+            now = time.time()
+            for h, row in zip(hashes, rows):
+                mm[row] = new[h]
+                self._lru_put((slab_id, h), new[h])
+            mm.flush()
+            conn.executemany("INSERT INTO vectors (slab, text_hash, row, last_used) VALUES (?, ?, ?, ?)",
+                             [(slab_id, h, row, now) for h, row in zip(hashes, rows)])
+            conn.execute("UPDATE slabs SET capacity = ?, used = ? WHERE id = ?", (capacity, used, slab_id))
+
+    def embed(self, texts: Sequence[str], model: str, embed_fn: Callable[[List[str]], Sequence], dims: int = 0) -> np.ndarray:
+        """
+        Vectors for `texts` as array (n, width). Only texts missing from the
+        cache are passed to embed_fn (deduplicated, in one call).
+        """
+        texts = list(texts)
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        cached = self.get_many(model, texts, dims)
+        misses = list(dict.fromkeys(t for t, v in zip(texts, cached) if v is None))
+        if misses:
+            fresh = np.asarray(embed_fn(misses), dtype=np.float32)
+            self.put_many(model, misses, fresh, dims)
+            by_text = dict(zip(misses, fresh))
+            cached = [v if v is not None else by_text[t] for t, v in zip(texts, cached)]
+        return np.vstack(cached)
+
+
+@lru_cache(maxsize=4)
+def get_embedding_cache(root: str = EMBEDDING_CACHE_DIR) -> EmbeddingCache:
+    """Process-wide cache (one memmap per model, shared by all sessions)."""
+    return EmbeddingCache(root)
+
+
+class CachedEmbeddings(_LangchainEmbeddings):
+    """LangChain Embeddings wrapper (e.g. around OpenAIEmbeddings) that reads through the cache."""
+
+    def __init__(self, inner, model: Optional[str] = None, dims: int = 0, cache: Optional[EmbeddingCache] = None):
+        self.inner = inner
+        self.model = model or getattr(inner, "model", type(inner).__name__)
+        self.dims = dims
+        self.cache = cache or get_embedding_cache()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.cache.embed(texts, self.model, self.inner.embed_documents, self.dims).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.cache.embed([text], f"{self.model}#query",
+                                lambda t: [self.inner.embed_query(t[0])], self.dims)[0].tolist()
+
+
+if lmi_installed:
+    class CachedEmbeddingModel(EmbeddingModel):
+        """paperqa/lmi EmbeddingModel wrapper: Docs.aadd_texts and _build_texts_index hit the cache first."""
+
+        inner: EmbeddingModel
+        mode: EmbeddingModes = EmbeddingModes.DOCUMENT
+
+        def set_mode(self, mode: EmbeddingModes) -> None:
+            self.mode = mode
+            self.inner.set_mode(mode)
+
+        async def embed_documents(self, texts: List[str]) -> List[List[float]]:
+            cache = get_embedding_cache()
+            key = self.name if self.mode == EmbeddingModes.DOCUMENT else f"{self.name}#{self.mode.value}"
+            dims = getattr(self.inner, "ndim", None) or 0
+            cached = cache.get_many(key, texts, dims)
+            misses = list(dict.fromkeys(t for t, v in zip(texts, cached) if v is None))
+            if misses:
+                fresh = np.asarray(await self.inner.embed_documents(misses), dtype=np.float32)
+                cache.put_many(key, misses, fresh, dims)
+                by_text = dict(zip(misses, fresh))
+                cached = [v if v is not None else by_text[t] for t, v in zip(texts, cached)]
+            return [v.tolist() for v in cached]
+
+    def cached_embedding_model(inner: EmbeddingModel) -> "CachedEmbeddingModel":
+        return CachedEmbeddingModel(name=inner.name, inner=inner)
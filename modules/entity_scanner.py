@@ -0,0 +1,234 @@
+import os
+import re
+from bisect import bisect_right
+from collections import deque
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+
+# ------------------------------------------------------------------
+# Single-pass scanner for genes, rsIDs and genotypes
+# ------------------------------------------------------------------
+# Gene symbols from genes.xlsx are matched with an Aho-Corasick automaton
+# (one walk over the text, independent of the catalog size). rsIDs,
+# genotypes and the explicit "in the XYZ gene" phrase share one compiled
+# regex, so the text is scanned exactly twice no matter how many entities
+# it contains.
+
+GENES_XLSX_PATH = os.path.join("modules", "genes.xlsx")
+
+ENTITY_PATTERN = re.compile(
+    r"(?P<rs>\b[rR][sS]\d+\b)"
+    r"|(?P<genotype>\b[ACGT]{2,3}\b)"
+    r"|(?P<genotype_slash>\b[ACGT]/[ACGT]\b)"
+    r"|(?i:in\s+the)\s+(?P<gene_phrase>[A-Za-z0-9_-]+)\s+(?i:gene)\b"
+)
+SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?])\s+|\n\s*\n")
+
+
+class AhoCorasick:
+    """Minimal Aho-Corasick automaton: pattern -> canonical name."""
+
+    def __init__(self, patterns: Dict[str, str]):
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        self.out: List[List[Tuple[int, str]]] = [[]]
+        for pattern, canonical in patterns.items():
+            if pattern:
+                self._add(pattern, canonical)
+        self._build_failure_links()
+
+    def _add(self, pattern: str, canonical: str):
+        node = 0
+        for ch in pattern:
+            nxt = self.goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self.goto)
+                self.goto[node][ch] = nxt
+                self.goto.append({})
+                self.fail.append(0)
+                self.out.append([])
+            node = nxt
+        self.out[node].append((len(pattern), canonical))
+
+    def _build_failure_links(self):
+        # Kinder der Wurzel behalten fail = 0
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in self.goto[node].items():
+                queue.append(child)
+                f = self.fail[node]
+                while f and ch not in self.goto[f]:
+                    f = self.fail[f]
+                self.fail[child] = self.goto[f].get(ch, 0)
+                self.out[child] = self.out[child] + self.out[self.fail[child]]
+
+    def iter_matches(self, text: str):
+        """Yields (start, end, canonical) for every pattern occurrence."""
+        goto, fail, out = self.goto, self.fail, self.out
+        node = 0
+        for i, ch in enumerate(text):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if out[node]:
+                for length, canonical in out[node]:
+                    yield i + 1 - length, i + 1, canonical
+
+
+def _is_word_char(ch: str) -> bool:
+    return ch.isalnum() or ch in "_-"
+
+
+class EntityScanner:
+    """Finds every gene, rsID and genotype mention in a paper in one pass."""
+
+    def __init__(self, genes: List[str], synonyms: Optional[Dict[str, str]] = None):
+        patterns = {g: g for g in genes}
+        if synonyms:
+            for syn, canonical in synonyms.items():
+                patterns[syn] = canonical
+        self.automaton = AhoCorasick(patterns)
+
+    def scan(self, text: str) -> Dict[str, list]:
+        """Scans a single text (treated as one page)."""
+        return self.scan_pages([text])
+
+    def scan_pages(self, pages: List[str]) -> Dict[str, list]:
+        """
+        Scans a list of page texts.
+        Returns {"mentions": [...], "genes": [...], "rsids": [...], "genotypes": [...]}.
+        Each mention is a dict with type, value, source, start, end, page (1-based),
+        sentence_index and sentence; the value lists are unique and keep
+        the order of first appearance.
+        """
+        text = "\n".join(pages)
+        page_starts = []
+        offset = 0
+        for p in pages:
+            page_starts.append(offset)
+            offset += len(p) + 1
+        sentence_starts = [0] + [m.end() for m in SENTENCE_BOUNDARY.finditer(text)]
+
+        mentions = []
+        seen_mentions = set()
+
+        def add(kind, value, start, end, source="regex"):
+            s_idx = bisect_right(sentence_starts, start) - 1
+            key = (kind, value, s_idx)
+            if key in seen_mentions:
+                return
+            seen_mentions.add(key)
+            s_end = sentence_starts[s_idx + 1] if s_idx + 1 < len(sentence_starts) else len(text)
+            mentions.append({
+                "type": kind,
+                "value": value,
+                "source": source,
+                "start": start,
+                "end": end,
+                "page": bisect_right(page_starts, start),
+                "sentence_index": s_idx,
+                "sentence": " ".join(text[sentence_starts[s_idx]:s_end].split()),
+            })
+
+        # Regex zuerst, damit explizite "in the XYZ gene"-Treffer Vorrang haben
+        for m in ENTITY_PATTERN.finditer(text):
+            kind = m.lastgroup
+            if kind == "rs":
+                add("rsid", m.group("rs").lower(), m.start(), m.end())
+            elif kind == "genotype":
+                add("genotype", m.group("genotype"), m.start(), m.end())
+            elif kind == "genotype_slash":
+                add("genotype", m.group("genotype_slash").replace("/", ""), m.start(), m.end())
+            elif kind == "gene_phrase":
+                add("gene", m.group("gene_phrase"), m.start("gene_phrase"), m.end("gene_phrase"), source="phrase")
+
+        text_len = len(text)
+        for start, end, canonical in self.automaton.iter_matches(text):
+            if start > 0 and _is_word_char(text[start - 1]):
+                continue
+            if end < text_len and _is_word_char(text[end]):
+                continue
+            add("gene", canonical, start, end, source="catalog")
+
+        mentions.sort(key=lambda x: x["start"])
+        unique = {"gene": [], "rsid": [], "genotype": []}
+        seen_values = set()
+        for m in mentions:
+            key = (m["type"], m["value"])
+            if key not in seen_values:
+                seen_values.add(key)
+                unique[m["type"]].append(m["value"])
+        return {
+            "mentions": mentions,
+            "genes": unique["gene"],
+            "rsids": unique["rsid"],
+            "genotypes": unique["genotype"],
+        }
+
+
+def primary_gene(result: Dict[str, list]) -> Optional[str]:
+    """Gene named explicitly ("in the XYZ gene") or else the most mentioned catalog gene."""
+    counts = {}
+    for m in result["mentions"]:
+        if m["type"] != "gene":
+            continue
+        if m["source"] == "phrase":
+            return m["value"]
+        counts[m["value"]] = counts.get(m["value"], 0) + 1
+    if not counts:
+        return None
+    return max(counts, key=counts.get)
+
+
+def pair_genotypes_with_rsids(result: Dict[str, list], limit: int = 3) -> List[Tuple[str, Optional[str]]]:
+    """
+    Returns up to `limit` unique genotypes, each with the rsID mentioned in the
+    same sentence (or the first rsID of the paper as fallback).
+    """
+    rs_by_sentence = {}
+    for m in result["mentions"]:
+        if m["type"] == "rsid":
+            rs_by_sentence.setdefault(m["sentence_index"], m["value"])
+    fallback = result["rsids"][0] if result["rsids"] else None
+    pairs = []
+    seen = set()
+    for m in result["mentions"]:
+        if m["type"] != "genotype" or m["value"] in seen:
+            continue
+        seen.add(m["value"])
+        pairs.append((m["value"], rs_by_sentence.get(m["sentence_index"], fallback)))
+        if len(pairs) >= limit:
+            break
+    return pairs
+
+
+@lru_cache(maxsize=4)
+def load_gene_catalog(excel_path: str = GENES_XLSX_PATH) -> Tuple[str, ...]:
+    """Reads all gene symbols (column C from row 3) of every sheet in genes.xlsx."""
+    if not os.path.exists(excel_path):
+        return tuple()
+    sheets = pd.read_excel(excel_path, sheet_name=None, header=None)
+    genes = []
+    seen = set()
+    for df in sheets.values():
+        if df.shape[1] < 3:
+            continue
+        for g in df.iloc[2:, 2].dropna().astype(str):
+            g = g.strip()
+            if g and g != "Names" and g not in seen:
+                seen.add(g)
+                genes.append(g)
+    return tuple(genes)
+
+
+@lru_cache(maxsize=4)
+def _cached_scanner(excel_path: str, synonyms: Tuple[Tuple[str, str], ...]) -> EntityScanner:
+    return EntityScanner(list(load_gene_catalog(excel_path)), dict(synonyms))
+
+
+def get_entity_scanner(synonyms: Optional[Dict[str, str]] = None, excel_path: str = GENES_XLSX_PATH) -> EntityScanner:
+    """Process-wide scanner; the automaton is only built once per catalog."""
+    return _cached_scanner(excel_path, tuple(sorted((synonyms or {}).items())))
@@ -0,0 +1,124 @@
+import queue
+import threading
+import time
+import traceback
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+# ------------------------------------------------------------------
+# Gestufte, nebenläufige Pipeline (z.B. Multi-PDF-Excel-Export)
+# ------------------------------------------------------------------
+# Every stage has its own worker threads and is connected to the next one
+# by a bounded queue, so a slow stage (LLM) applies back-pressure instead
+# of piling up parsed papers in memory, and fast stages (variant lookup,
+# rendering) overlap with it. A failing item is marked with its error and
+# passed through the remaining stages untouched; it never stops the batch.
+# Stage functions run in worker threads without a Streamlit context, so
+# they must not call st.*: warnings go through pipeline_warning() into the
+# item and are shown by the caller in on_result (main thread).
+
+_DONE = object()
+_current = threading.local()
+
+
+@dataclass
+class PipelineItem:
+    index: int
+    name: str
+    value: Any
+    error: Optional[str] = None
+    failed_stage: Optional[str] = None
+    seconds: Dict[str, float] = field(default_factory=dict)
+    warnings: List[str] = field(default_factory=list)
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+def pipeline_warning(message: str) -> bool:
+    """Records a warning for the item this worker thread is processing; False outside of a pipeline stage."""
+    item = getattr(_current, "item", None)
+    if item is None:
+        return False
+    item.warnings.append(message)
+    return True
+
+
+@dataclass
+class Stage:
+    name: str
+    fn: Callable[[Any], Any]
+    workers: int = 1
+
+
+class StagedPipeline:
+    def __init__(self, stages: List[Stage], queue_size: int = 4):
+        self.stages = stages
+        self.queue_size = queue_size
+
+    def _run_stage(self, stage: Stage, inbox: "queue.Queue", outbox: "queue.Queue",
+                   remaining: List[int], lock: threading.Lock):
+        while True:
+            item = inbox.get()
+            if item is _DONE:
+                # Last worker of this stage closes the next queue
+                with lock:
+                    remaining[0] -= 1
+                    last = remaining[0] == 0
+                if last:
+                    outbox.put(_DONE)
+                else:
+                    inbox.put(_DONE)
+                return
+            if item.ok:
+                start = time.time()
+                _current.item = item
+                try:
+                    item.value = stage.fn(item.value)
+                except Exception as e:
+                    item.error = f"{type(e).__name__}: {e}"
+                    item.failed_stage = stage.name
+                    traceback.print_exc()
+                finally:
+                    _current.item = None
+                item.seconds[stage.name] = time.time() - start
+            outbox.put(item)
+
+    def run(self, items: Iterable[Tuple[str, Any]],
+            on_result: Optional[Callable[[PipelineItem], None]] = None) -> List[PipelineItem]:
+        """
+        Runs all (name, value) items through the stages. `on_result` is called in
+        the calling thread for every finished item (e.g. for a Streamlit progress bar).
+        Returns the items in input order.
+        """
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in range(len(self.stages) + 1)]
+        threads = []
+        for i, stage in enumerate(self.stages):
+            remaining, lock = [max(1, stage.workers)], threading.Lock()
+            for _ in range(remaining[0]):
+                t = threading.Thread(target=self._run_stage, daemon=True,
+                                     args=(stage, queues[i], queues[i + 1], remaining, lock))
+                t.start()
+                threads.append(t)
+
+        def feed():
+            for index, (name, value) in enumerate(items):
+                queues[0].put(PipelineItem(index=index, name=name, value=value))
+            queues[0].put(_DONE)
+
+        feeder = threading.Thread(target=feed, daemon=True)
+        feeder.start()
+
+        results = []
+        while True:
+            item = queues[-1].get()
+            if item is _DONE:
+                break
+            results.append(item)
+            if on_result is not None:
+                on_result(item)
+        feeder.join()
+        for t in threads:
+            t.join()
+        return sorted(results, key=lambda r: r.index)
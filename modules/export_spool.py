@@ -0,0 +1,86 @@
+import os
+import shutil
+import tempfile
+import time
+import weakref
+import zipfile
+from typing import Iterable, Optional
+
+# ------------------------------------------------------------------
+# Export-Spool: Exportdateien auf der Platte statt im Session-State
+# ------------------------------------------------------------------
+# Every Streamlit session gets its own spool directory below SPOOL_ROOT.
+# Workbooks are written there and streamed into a ZIP chunk by chunk;
+# st.session_state only keeps the ExportSpool object (a path). The
+# directory is removed when the session object is garbage collected,
+# and spools left behind by crashed processes are swept after
+# SPOOL_MAX_AGE seconds.
+
+SPOOL_ROOT = os.getenv("EXPORT_SPOOL_ROOT", os.path.join(tempfile.gettempdir(), "paper_exports"))
+SPOOL_MAX_AGE = 6 * 3600  # seconds
+ZIP_CHUNK_SIZE = 1 << 20
+
+
+class ExportSpool:
+    def __init__(self, root: str = SPOOL_ROOT):
+        os.makedirs(root, exist_ok=True)
+        self.path = tempfile.mkdtemp(prefix="session_", dir=root)
+        # Cleanup at session end (object collected) or interpreter exit
+        self._finalizer = weakref.finalize(self, shutil.rmtree, self.path, True)
+
+    def file_path(self, name: str) -> str:
+        """Path for a file inside the spool (only the base name of `name` is used)."""
+        return os.path.join(self.path, os.path.basename(name))
+
+    def bundle_zip(self, files: Iterable[str], zip_name: str, remove_sources: bool = True) -> str:
+        """
+        Streams the given spool files into one ZIP (constant memory, chunkwise copy).
+        The source files are deleted after they have been added, unless remove_sources=False.
+        """
+        zip_path = self.file_path(zip_name)
+        with zipfile.ZipFile(zip_path, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+            for src in files:
+                with open(src, "rb") as fsrc, zf.open(os.path.basename(src), "w", force_zip64=True) as fdst:
+                    shutil.copyfileobj(fsrc, fdst, ZIP_CHUNK_SIZE)
+                if remove_sources:
+                    os.remove(src)
+        return zip_path
+
+    def clear(self):
+        """Deletes all files of previous exports (the directory itself stays)."""
+        for name in os.listdir(self.path):
+            full = os.path.join(self.path, name)
+            if os.path.isdir(full):
+                shutil.rmtree(full, ignore_errors=True)
+            else:
+                os.remove(full)
+
+    def cleanup(self):
+        self._finalizer()
+
+
+def sweep_stale_spools(root: str = SPOOL_ROOT, max_age: float = SPOOL_MAX_AGE) -> int:
+    """Removes spool directories untouched for longer than max_age; returns the number removed."""
+    if not os.path.isdir(root):
+        return 0
+    removed = 0
+    cutoff = time.time() - max_age
+    for name in os.listdir(root):
+        full = os.path.join(root, name)
+        try:
+            if name.startswith("session_") and os.path.getmtime(full) < cutoff:
+                shutil.rmtree(full, ignore_errors=True)
+                removed += 1
+        except OSError:
+            continue
+    return removed
+
+
+def get_session_spool(session_state, key: str = "export_spool") -> ExportSpool:
+    """The spool of the current Streamlit session (created on first use)."""
+    spool: Optional[ExportSpool] = session_state.get(key)
+    if spool is None or not os.path.isdir(spool.path):
+        sweep_stale_spools()
+        spool = ExportSpool()
+        session_state[key] = spool
+    return spool
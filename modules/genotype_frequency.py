@@ -0,0 +1,187 @@
+import math
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+# ------------------------------------------------------------------
+# Vectorized Hardy-Weinberg genotype frequencies
+# ------------------------------------------------------------------
+# The Ensembl population payload is converted once into a
+# population x allele matrix. All genotype frequencies (p_i^2 for
+# homozygotes, 2 p_i p_j for heterozygotes) for all populations are then
+# one outer product instead of nested loops over data['populations'].
+
+DEFAULT_POPULATION_PREFIX = "1000GENOMES"
+
+
+class AlleleFrequencyMatrix:
+    """Population x allele frequency matrix of one variant (NaN = not reported)."""
+
+    def __init__(self, data: Optional[Dict[str, Any]], population_prefix: Optional[str] = DEFAULT_POPULATION_PREFIX):
+        pop_index: Dict[str, int] = {}
+        allele_index: Dict[str, int] = {}
+        rows, cols, values = [], [], []
+        for entry in (data or {}).get("populations", []):
+            pop = entry.get("population", "")
+            allele = entry.get("allele")
+            freq = entry.get("frequency")
+            if allele is None or freq is None:
+                continue
+            if population_prefix and population_prefix not in pop:
+                continue
+            rows.append(pop_index.setdefault(pop, len(pop_index)))
+            cols.append(allele_index.setdefault(allele, len(allele_index)))
+            values.append(freq)
+        self.populations: List[str] = list(pop_index)
+        self.alleles: List[str] = list(allele_index)
+        self.allele_index = allele_index
+        self.matrix = np.full((len(pop_index), len(allele_index)), np.nan)
+        if values:
+            self.matrix[rows, cols] = values
+
+    def genotype_table(self) -> Tuple[List[str], np.ndarray]:
+        """
+        All genotypes (every homozygote and heterozygote) for all populations.
+        Returns (genotype labels, population x genotype matrix).
+        """
+        n = len(self.alleles)
+        if not n:
+            return [], np.empty((len(self.populations), 0))
+        i, j = np.triu_indices(n)
+        outer = self.matrix[:, i] * self.matrix[:, j]
+        table = np.where(i == j, outer, 2 * outer)
+        labels = [self.alleles[a] + self.alleles[b] for a, b in zip(i, j)]
+        return labels, table
+
+    def genotype_frequency(self, genotype: str) -> Dict[str, float]:
+        """HWE frequency of one genotype (e.g. 'AG') per population; populations missing an allele are skipped."""
+        if len(genotype) < 2:
+            return {}
+        a = self.allele_index.get(genotype[0])
+        b = self.allele_index.get(genotype[1])
+        if a is None or b is None:
+            return {}
+        freqs = self.matrix[:, a] * self.matrix[:, b]
+        if a != b:
+            freqs = 2 * freqs
+        return {pop: float(f) for pop, f in zip(self.populations, freqs) if not np.isnan(f)}
+
+
+def genotype_frequencies(data: Optional[Dict[str, Any]], genotype: str,
+                         population_prefix: Optional[str] = DEFAULT_POPULATION_PREFIX) -> Dict[str, float]:
+    """Drop-in for GenotypeFinder.calculate_genotype_frequency: {population: frequency}."""
+    if not data or "populations" not in data:
+        return {}
+    return AlleleFrequencyMatrix(data, population_prefix).genotype_frequency(genotype)
+
+
+def batch_genotype_frequencies(records: Dict[str, Dict[str, Any]], pairs: Iterable[Tuple[str, str]],
+                               population_prefix: Optional[str] = DEFAULT_POPULATION_PREFIX) -> List[Dict[str, float]]:
+    """
+    Genotype frequencies for many (rsID, genotype) pairs. The matrix of each
+    variant is built only once, however many genotypes refer to it.
+    """
+    matrices: Dict[str, AlleleFrequencyMatrix] = {}
+    results = []
+    for rs_id, genotype in pairs:
+        data = records.get(rs_id)
+        if not data:
+            results.append({})
+            continue
+        if rs_id not in matrices:
+            matrices[rs_id] = AlleleFrequencyMatrix(data, population_prefix)
+        results.append(matrices[rs_id].genotype_frequency(genotype))
+    return results
+
+
+def hwe_statistics(data: Optional[Dict[str, Any]],
+                   population_prefix: Optional[str] = DEFAULT_POPULATION_PREFIX) -> Dict[str, Dict[str, float]]:
+    """
+    Observed vs. expected genotype counts per population (needs the Ensembl
+    'population_genotypes' block, i.e. a request with population_genotypes=1).
+    Returns {population: {"n", "df", "chi2", "p_value"}}; the chi-square test
+    has k(k-1)/2 degrees of freedom for k alleles (1 for biallelic sites).
+    """
+    if not data or not data.get("population_genotypes"):
+        return {}
+    afm = AlleleFrequencyMatrix(data, population_prefix)
+    labels, expected = afm.genotype_table()
+    label_index = {lab: k for k, lab in enumerate(labels)}
+    for k, lab in enumerate(labels):
+        label_index.setdefault(lab[::-1], k)
+    pop_index = {p: r for r, p in enumerate(afm.populations)}
+
+    observed = np.zeros_like(expected)
+    for g in data["population_genotypes"]:
+        pop = g.get("population", "")
+        gt = str(g.get("genotype", "")).replace("|", "").replace("/", "")
+        r, k = pop_index.get(pop), label_index.get(gt)
+        if r is None or k is None or g.get("count") is None:
+            continue
+        observed[r, k] += g["count"]
+
+    n = observed.sum(axis=1, keepdims=True)
+    expected_counts = np.nan_to_num(expected) * n
+    with np.errstate(divide="ignore", invalid="ignore"):
+        terms = np.where(expected_counts > 0, (observed - expected_counts) ** 2 / expected_counts, 0.0)
+    chi2 = terms.sum(axis=1)
+    # Alleles with a reported frequency > 0 in the population
+    k = (np.nan_to_num(afm.matrix) > 0).sum(axis=1)
+    stats = {}
+    for r, pop in enumerate(afm.populations):
+        df = int(k[r] * (k[r] - 1) // 2)
+        if n[r, 0] <= 0 or df < 1:
+            continue
+        stats[pop] = {
+            "n": float(n[r, 0]),
+            "df": df,
+            "chi2": float(chi2[r]),
+            "p_value": chi2_sf(float(chi2[r]), df),
+        }
+    return stats
+
+
+def chi2_sf(x: float, df: int) -> float:
+    """Upper tail P(X >= x) of the chi-square distribution with integer df (closed form, no scipy)."""
+    if x <= 0:
+        return 1.0
+    if df % 2 == 0:
+        # exp(-x/2) * sum_{i < df/2} (x/2)^i / i!
+        term = total = math.exp(-x / 2)
+        for i in range(1, df // 2):
+            term *= (x / 2) / i
+            total += term
+        return min(1.0, total)
+    # erfc(sqrt(x/2)) + sqrt(2x/pi) exp(-x/2) * sum_{i=1}^{(df-1)/2} x^(i-1) / (1*3*...*(2i-1))
+    total = math.erfc(math.sqrt(x / 2))
+    term = math.sqrt(2 * x / math.pi) * math.exp(-x / 2)
+    for i in range(1, (df + 1) // 2):
+        total += term
+        term *= x / (2 * i + 1)
+    return min(1.0, total)
+
+
+def normalize_genotype(genotype: Any) -> str:
+    """'a/g', 'A|G', ' ag ' -> 'AG'."""
+    return str(genotype or "").strip().upper().replace("/", "").replace("|", "").replace(" ", "")
+
+
+def genotype_report_rows(records: Dict[str, Dict[str, Any]], pairs: List[Tuple[str, str]],
+                         population_prefix: Optional[str] = DEFAULT_POPULATION_PREFIX) -> List[Dict[str, Any]]:
+    """
+    One result row per (rsID, genotype) pair: frequency per population as
+    columns plus a status ('ok', 'rsID not found', 'genotype not observed').
+    """
+    freqs = batch_genotype_frequencies(records, pairs, population_prefix)
+    rows = []
+    for (rs_id, genotype), freq in zip(pairs, freqs):
+        if rs_id not in records:
+            status = "rsID not found"
+        elif not freq:
+            status = "genotype not observed"
+        else:
+            status = "ok"
+        row = {"rsID": rs_id, "Genotype": genotype, "Status": status}
+        row.update(freq)
+        rows.append(row)
+    return rows
@@ -0,0 +1,153 @@
+import io
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional
+
+import PyPDF2
+
+from utilities import file_sha256, read_file_bytes
+from modules.entity_scanner import get_entity_scanner
+from modules.pdf_metadata import sniff_pdf_metadata
+
+# ------------------------------------------------------------------
+# Background ingestion of uploaded PDFs
+# ------------------------------------------------------------------
+# As soon as a file shows up in st.file_uploader it is handed to a
+# process-wide worker pool (keyed by file hash): text extraction,
+# identifier scan, metadata sniffing and - optionally - embedding run
+# outside the Streamlit script thread. Pages then only wait for jobs
+# that are not finished yet.
+
+STATUS_QUEUED = "queued"
+STATUS_EXTRACTING = "extracting"
+STATUS_SCANNING = "scanning"
+STATUS_EMBEDDING = "embedding"
+STATUS_DONE = "done"
+STATUS_ERROR = "error"
+
+
+class IngestionJob:
+    def __init__(self, file_hash: str, name: str):
+        self.file_hash = file_hash
+        self.name = name
+        self.status = STATUS_QUEUED
+        self.pages: List[str] = []
+        self.text = ""
+        self.entities: Optional[Dict[str, list]] = None
+        self.metadata: Optional[Dict[str, Any]] = None
+        self.embeddings: Any = None
+        self.error: Optional[str] = None
+        self.seconds = 0.0
+        self.future = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (STATUS_DONE, STATUS_ERROR)
+
+
+class IngestionWorker:
+    """Thread pool that pre-processes uploads; one job per distinct file hash."""
+
+    def __init__(self, max_workers: int = 4, embed_fn: Optional[Callable[[str], Any]] = None, max_jobs: int = 256):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ingest")
+        self.embed_fn = embed_fn
+        self.max_jobs = max_jobs
+        self.jobs: "OrderedDict[str, IngestionJob]" = OrderedDict()
+        self.lock = threading.Lock()
+
+    def submit(self, uploaded_file) -> str:
+        """Queues a file (no-op if the same content is already known). Returns its hash."""
+        data = read_file_bytes(uploaded_file)
+        file_hash = file_sha256(data)
+        with self.lock:
+            job = self.jobs.get(file_hash)
+            if job is not None and job.status != STATUS_ERROR:
+                self.jobs.move_to_end(file_hash)
+                return file_hash
+            job = IngestionJob(file_hash, getattr(uploaded_file, "name", file_hash[:12]))
+            self.jobs[file_hash] = job
+            self._evict_finished()
+        job.future = self.executor.submit(self._run, job, data)
+        return file_hash
+
+    def submit_all(self, uploaded_files) -> Dict[str, str]:
+        """
+        Queues all uploads, returns {content hash: file name}. Keyed by content:
+        two uploads with the same name but different bytes stay separate.
+        """
+        return {self.submit(f): f.name for f in uploaded_files or []}
+
+    def get(self, file_hash: str) -> Optional[IngestionJob]:
+        with self.lock:
+            return self.jobs.get(file_hash)
+
+    def wait(self, file_hash: str, timeout: Optional[float] = None) -> Optional[IngestionJob]:
+        """Blocks until the job is finished (or the timeout expires)."""
+        job = self.get(file_hash)
+        if job is not None and job.future is not None:
+            try:
+                job.future.result(timeout=timeout)
+            except Exception:
+                pass
+        return job
+
+    def status_rows(self, file_hashes: Dict[str, str]) -> List[Dict[str, Any]]:
+        """Rows for a per-file status table ({content hash: file name} as from submit_all)."""
+        rows = []
+        for h, name in file_hashes.items():
+            job = self.get(h)
+            rows.append({
+                "File": name,
+                "Status": job.status if job else "unknown",
+                "Pages": len(job.pages) if job else 0,
+                "rsIDs": len(job.entities["rsids"]) if job and job.entities else 0,
+                "DOI": (job.metadata or {}).get("doi") or "" if job else "",
+                "Seconds": round(job.seconds, 2) if job else 0.0,
+                "Error": (job.error or "") if job else "",
+            })
+        return rows
+
+    def _evict_finished(self):
+        while len(self.jobs) > self.max_jobs:
+            for h, job in self.jobs.items():
+                if job.finished:
+                    del self.jobs[h]
+                    break
+            else:
+                return
+
+    def _run(self, job: IngestionJob, data: bytes):
+        start = time.time()
+        try:
+            job.status = STATUS_EXTRACTING
+            reader = PyPDF2.PdfReader(io.BytesIO(data))
+            job.pages = [page.extract_text() or "" for page in reader.pages]
+            job.text = "".join(p + "\n" for p in job.pages if p)
+
+            job.status = STATUS_SCANNING
+            job.entities = get_entity_scanner().scan_pages(job.pages)
+            job.metadata = sniff_pdf_metadata(data)
+
+            if self.embed_fn is not None and job.text.strip():
+                job.status = STATUS_EMBEDDING
+                job.embeddings = self.embed_fn(job.text)
+            job.status = STATUS_DONE
+        except Exception as e:
+            job.error = str(e)
+            job.status = STATUS_ERROR
+        finally:
+            job.seconds = time.time() - start
+        return job
+
+
+@lru_cache(maxsize=8)
+def _cached_worker(name: str, embed_fn: Optional[Callable[[str], Any]]) -> IngestionWorker:
+    return IngestionWorker(embed_fn=embed_fn)
+
+
+def get_ingestion_worker(name: str = "default", embed_fn: Optional[Callable[[str], Any]] = None) -> IngestionWorker:
+    """Process-wide worker (shared by all sessions); `embed_fn` must be a module-level function."""
+    return _cached_worker(name, embed_fn)
@@ -0,0 +1,62 @@
+import os
+import sys
+from functools import lru_cache
+from typing import List
+
+# Vendored paper-qa (modules/paper-qa/paperqa)
+PAPERQA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "paper-qa")
+if PAPERQA_DIR not in sys.path:
+    sys.path.insert(0, PAPERQA_DIR)
+
+try:
+    from paperqa.llms import embedding_model_factory
+    paperqa_installed = True
+except ImportError:
+    paperqa_installed = False
+
+try:
+    from langchain.embeddings.base import Embeddings as _LangchainEmbeddings
+except ImportError:
+    _LangchainEmbeddings = object
+
+# ------------------------------------------------------------------
+# Lokale CPU-Embeddings (transformers) für die Streamlit-Module
+# ------------------------------------------------------------------
+# The model is selected by name through paperqa's embedding_model_factory
+# ("local-<Hugging Face model>", see paperqa.llms.LocalEmbeddingModel), so
+# the Chroma modules and paperqa Docs (Settings.embedding) share the same
+# backend and the same process-wide encoder. Texts are batched by length,
+# inference runs on the CPU; quantize/onnx are passed through as config.
+
+LOCAL_EMBEDDING = os.getenv("LOCAL_EMBEDDING", "local-sentence-transformers/all-MiniLM-L6-v2")
+LOCAL_EMBEDDING_THREADS = int(os.getenv("LOCAL_EMBEDDING_THREADS", "0")) or None
+
+
+def is_local_embedding(name: str) -> bool:
+    return name.strip().startswith("local-")
+
+
+@lru_cache(maxsize=4)
+def get_local_embedding_model(embedding: str = LOCAL_EMBEDDING, quantize: bool = False, onnx: bool = False):
+    """paperqa LocalEmbeddingModel (the encoder itself is loaded once per process)."""
+    if not paperqa_installed:
+        raise ImportError("paper-qa (modules/paper-qa) and transformers are required for local embeddings")
+    config = {"quantize": quantize, "onnx": onnx}
+    if LOCAL_EMBEDDING_THREADS:
+        config["num_threads"] = LOCAL_EMBEDDING_THREADS
+    return embedding_model_factory(embedding, **config)
+
+
+class LocalEmbeddings(_LangchainEmbeddings):
+    """LangChain Embeddings on the local CPU model (drop-in for OpenAIEmbeddings)."""
+
+    def __init__(self, embedding: str = LOCAL_EMBEDDING, quantize: bool = False, onnx: bool = False):
+        # Cache key of the embedding cache: quantized/ONNX vectors differ slightly from the torch ones
+        self.model = embedding + ("+int8" if quantize else "") + ("+onnx" if onnx else "")
+        self.inner = get_local_embedding_model(embedding, quantize, onnx)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.inner.encode(list(texts))
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.inner.encode([text])[0]
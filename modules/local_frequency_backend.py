@@ -0,0 +1,240 @@
+import gzip
+import logging
+import os
+import re
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+from ensembl_api import normalize_rsid
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+    pyarrow_installed = True
+except ImportError:
+    pyarrow_installed = False
+
+# Unusable snapshot -> remote API: bad Parquet schema / missing column / corrupt file, VCF without
+# .tbi index or not bgzip-compressed (pysam: OSError/ValueError), .rsidx.npy not writable (PermissionError)
+_SNAPSHOT_ERRORS = (OSError, ValueError, KeyError) + ((pa.ArrowInvalid,) if pyarrow_installed else ())
+
+try:
+    import pysam
+    pysam_installed = True
+except ImportError:
+    pysam_installed = False
+
+# ------------------------------------------------------------------
+# Offline allele frequencies from local 1000 Genomes / gnomAD snapshots
+# ------------------------------------------------------------------
+# Two backends with the same get_variants() interface as the Ensembl
+# client, returning Ensembl-shaped records
+# ({"name", "MAF", "minor_allele", "populations": [{population, allele, frequency}]}):
+#
+# - ParquetFrequencyBackend: long table (rsid, population, allele, frequency
+#   [, maf]) sorted by rsID; memory-mapped, lookups via binary search.
+# - VcfFrequencyBackend: bgzipped VCF + tabix index. A sidecar rsID index
+#   (rs number -> chrom, pos; .npy, memory-mapped) is built once so that
+#   rsIDs can be resolved to tabix regions.
+#
+# Select a source with LOCAL_FREQUENCY_SOURCE=/path/to/file.parquet|.vcf.gz
+
+LOCAL_FREQUENCY_SOURCE = os.getenv("LOCAL_FREQUENCY_SOURCE", "")
+
+# INFO field -> Ensembl population name (1000 Genomes phase 3 VCFs)
+DEFAULT_VCF_POPULATIONS = {
+    "AF": "1000GENOMES:phase_3:ALL",
+    "AFR_AF": "1000GENOMES:phase_3:AFR",
+    "AMR_AF": "1000GENOMES:phase_3:AMR",
+    "EAS_AF": "1000GENOMES:phase_3:EAS",
+    "EUR_AF": "1000GENOMES:phase_3:EUR",
+    "SAS_AF": "1000GENOMES:phase_3:SAS",
+}
+GLOBAL_POPULATION = "1000GENOMES:phase_3:ALL"
+RSID_PATTERN = re.compile(r"^rs(\d+)$")
+RSID_INDEX_CHUNK = 1_000_000  # VCF records per numpy chunk while building the rsID index
+
+
+def _rs_number(rs_id: str) -> Optional[int]:
+    m = RSID_PATTERN.match(normalize_rsid(rs_id))
+    return int(m.group(1)) if m else None
+
+
+def _with_maf(record: Dict[str, Any]) -> Dict[str, Any]:
+    """Fills MAF / minor_allele from the global population if not given."""
+    if record.get("MAF") is None:
+        global_freqs = [(p["frequency"], p["allele"]) for p in record["populations"]
+                        if p["population"] == GLOBAL_POPULATION]
+        if len(global_freqs) >= 2:
+            freq, allele = sorted(global_freqs)[0]
+            record["MAF"] = freq
+            record["minor_allele"] = allele
+    return record
+
+
+class ParquetFrequencyBackend:
+    def __init__(self, path: str):
+        if not pyarrow_installed:
+            raise ImportError("pyarrow is required for Parquet frequency snapshots (pip install pyarrow).")
+        self.table = pq.read_table(path, memory_map=True)
+        rsid_col = self.table.column("rsid")
+        if pa.types.is_integer(rsid_col.type):
+            numbers = rsid_col.to_numpy()
+        else:
+            numbers = pc.cast(pc.utf8_slice_codeunits(pc.utf8_lower(rsid_col), 2), pa.int64()).to_numpy()
+        # Sorted by rsID -> direct binary search; otherwise sort the keys once
+        if len(numbers) and np.any(numbers[1:] < numbers[:-1]):
+            self.order = np.argsort(numbers, kind="stable")
+            self.keys = numbers[self.order]
+        else:
+            self.order = None
+            self.keys = numbers
+        self.has_maf = "maf" in self.table.column_names
+
+    def get_variants(self, rs_ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        results = {}
+        for rs in dict.fromkeys(normalize_rsid(r) for r in rs_ids):
+            number = _rs_number(rs)
+            if number is None:
+                continue
+            lo = np.searchsorted(self.keys, number, side="left")
+            hi = np.searchsorted(self.keys, number, side="right")
+            if lo == hi:
+                continue
+            rows = np.arange(lo, hi) if self.order is None else self.order[lo:hi]
+            part = self.table.take(pa.array(rows)).to_pydict()
+            record = {
+                "name": rs,
+                "MAF": part["maf"][0] if self.has_maf else None,
+                "populations": [
+                    {"population": p, "allele": a, "frequency": f}
+                    for p, a, f in zip(part["population"], part["allele"], part["frequency"])
+                    if f is not None
+                ],
+            }
+            results[rs] = _with_maf(record)
+        return results
+
+    def get_variant(self, rs_id: str) -> Optional[Dict[str, Any]]:
+        return self.get_variants([rs_id]).get(normalize_rsid(rs_id))
+
+
+class VcfFrequencyBackend:
+    def __init__(self, path: str, populations: Optional[Dict[str, str]] = None):
+        if not pysam_installed:
+            raise ImportError("pysam is required for tabix-indexed VCF snapshots (pip install pysam).")
+        self.path = path
+        self.populations = populations or DEFAULT_VCF_POPULATIONS
+        self.tabix = pysam.TabixFile(path)
+        self.chroms: List[str] = list(self.tabix.contigs)
+        index_path = path + ".rsidx.npy"
+        if not os.path.exists(index_path):
+            self._build_rsid_index(index_path)
+        # columns: rs number, chrom index, position (sorted by rs number)
+        self.index = np.load(index_path, mmap_mode="r")
+
+    def _build_rsid_index(self, index_path: str):
+        """
+        One streaming pass over the VCF: rs number -> (chrom, pos). Entries are
+        written into fixed-size numpy chunks (no Python object per record),
+        every full chunk is sorted, and the sorted runs are merged at the end.
+        """
+        chrom_ids = {c: i for i, c in enumerate(self.chroms)}
+        chunks = []
+        buffer = np.empty((RSID_INDEX_CHUNK, 3), dtype=np.int64)
+        filled = 0
+
+        def flush():
+            chunk = buffer[:filled]
+            chunks.append(chunk[np.argsort(chunk[:, 0], kind="stable")])
+
+        with gzip.open(self.path, "rt") as fh:
+            for line in fh:
+                if line.startswith("#"):
+                    continue
+                chrom, pos, vid = line.split("\t", 3)[:3]
+                chrom_idx = chrom_ids.get(chrom)
+                if chrom_idx is None:
+                    continue
+                for single_id in vid.split(";"):
+                    m = RSID_PATTERN.match(single_id)
+                    if not m:
+                        continue
+                    buffer[filled] = (int(m.group(1)), chrom_idx, int(pos))
+                    filled += 1
+                    if filled == RSID_INDEX_CHUNK:
+                        flush()
+                        filled = 0
+        if filled or not chunks:
+            flush()
+        index = np.concatenate(chunks)
+        if len(chunks) > 1:
+            # Stable sort over concatenated sorted runs = merge of the runs
+            index = index[np.argsort(index[:, 0], kind="stable")]
+        np.save(index_path, index)
+
+    def _parse_record(self, rs: str, fields: List[str]) -> Optional[Dict[str, Any]]:
+        ref, alts = fields[3], fields[4].split(",")
+        info = {}
+        for item in fields[7].split(";"):
+            key, _, value = item.partition("=")
+            info[key] = value
+        populations = []
+        for key, pop_name in self.populations.items():
+            if key not in info:
+                continue
+            try:
+                alt_freqs = [float(x) for x in info[key].split(",")]
+            except ValueError:
+                continue
+            populations.append({"population": pop_name, "allele": ref,
+                                "frequency": round(max(0.0, 1.0 - sum(alt_freqs)), 6)})
+            for alt, freq in zip(alts, alt_freqs):
+                populations.append({"population": pop_name, "allele": alt, "frequency": freq})
+        if not populations:
+            return None
+        return _with_maf({"name": rs, "MAF": None, "populations": populations})
+
+    def get_variants(self, rs_ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        results = {}
+        keys = self.index[:, 0]
+        for rs in dict.fromkeys(normalize_rsid(r) for r in rs_ids):
+            number = _rs_number(rs)
+            if number is None:
+                continue
+            lo = np.searchsorted(keys, number, side="left")
+            if lo >= len(keys) or keys[lo] != number:
+                continue
+            _, chrom_idx, pos = self.index[lo]
+            for line in self.tabix.fetch(self.chroms[int(chrom_idx)], int(pos) - 1, int(pos)):
+                fields = line.split("\t")
+                if rs in fields[2].split(";"):
+                    record = self._parse_record(rs, fields)
+                    if record:
+                        results[rs] = record
+                    break
+        return results
+
+    def get_variant(self, rs_id: str) -> Optional[Dict[str, Any]]:
+        return self.get_variants([rs_id]).get(normalize_rsid(rs_id))
+
+
+@lru_cache(maxsize=2)
+def get_local_frequency_backend(source: str = LOCAL_FREQUENCY_SOURCE):
+    """Backend for the configured snapshot file, or None if none is configured/usable."""
+    if not source or not os.path.exists(source):
+        return None
+    try:
+        if source.endswith(".parquet"):
+            return ParquetFrequencyBackend(source)
+        if source.endswith((".vcf.gz", ".vcf.bgz")):
+            return VcfFrequencyBackend(source)
+    except ImportError:
+        return None
+    except _SNAPSHOT_ERRORS as e:
+        logging.warning(f"Local frequency snapshot {source} is not usable ({e}); using the Ensembl API.")
+        return None
+    return None
@@ -1,68 +1,194 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from pathlib import Path
+from typing import List
+
 import streamlit as st
 from haystack.document_stores import InMemoryDocumentStore
-from haystack.nodes import BM25Retriever, FARMReader
-from haystack.pipelines import ExtractiveQAPipeline
+from haystack.nodes import BM25Retriever, FARMReader, PreProcessor
 from haystack import Document
 
-def module_haystack_qa():
+# ------------------------------------------------------------------
+# Geteilte Haystack-Ressourcen (einmal pro Prozess)
+# ------------------------------------------------------------------
+# The reader model is loaded and warmed up once per process and shared by
+# all sessions (optionally converted to a quantized ONNX model). Texts are
+# split into passages and written incrementally into one BM25 store; ids
+# are "<text hash>:<passage>", so the same text is indexed only once and
+# each session retrieves only from its own texts. The reader then reads
+# the top-k passages in batches.
+
+HAYSTACK_READER_MODEL = os.getenv("HAYSTACK_READER_MODEL", "deepset/roberta-base-squad2")
+# "1" = Reader als quantisiertes ONNX-Modell (CPU) ausführen
+HAYSTACK_READER_ONNX = os.getenv("HAYSTACK_READER_ONNX", "0") == "1"
+HAYSTACK_ONNX_DIR = os.path.join(".cache", "haystack_onnx")
+HAYSTACK_MAX_TEXTS = 2000        # älteste Texte werden danach aus dem Store entfernt
+PASSAGE_WORDS = 200
+PASSAGE_OVERLAP = 30
+RETRIEVER_TOP_K = 10
+READER_TOP_K = 3
+READER_BATCH_SIZE = 16
+
+
+def _convert_reader_to_onnx(model_name: str, model_path: str):
     """
-    Dieses Modul demonstriert eine einfache QA-Logik nur mit Haystack.
-    - InMemoryDocumentStore + BM25Retriever
-    - FARMReader (lokales Modell von Hugging Face)
+    Konvertiert in ein temporäres Verzeichnis und benennt es erst nach Erfolg um:
+    ein abgebrochener Lauf hinterlässt kein halbes Modell, das spätere Läufe für fertig halten.
     """
+    os.makedirs(HAYSTACK_ONNX_DIR, exist_ok=True)
+    tmp_path = tempfile.mkdtemp(prefix=".converting-", dir=HAYSTACK_ONNX_DIR)
+    try:
+        # Haystack erwartet einen Path (output_path / "model.onnx")
+        FARMReader.convert_to_onnx(model_name=model_name, output_path=Path(tmp_path),
+                                   task_type="question_answering", quantize=True)
+        os.rename(tmp_path, model_path)
+    except OSError:
+        # Ein paralleler Prozess war schneller: dessen Modell verwenden
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        if not os.path.exists(model_path):
+            raise
+    except Exception:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        raise
 
-    st.title("Minimal Haystack QA (Nur Haystack)")
 
-    # DocumentStore initialisieren (InMemory mit BM25-Index)
-    if "doc_store" not in st.session_state:
-        st.session_state.doc_store = InMemoryDocumentStore(use_bm25=True)
+@lru_cache(maxsize=2)
+def get_shared_reader(model_name: str = HAYSTACK_READER_MODEL, onnx: bool = HAYSTACK_READER_ONNX) -> FARMReader:
+    """FARMReader, einmal pro Prozess geladen und mit einer Dummy-Frage aufgewärmt."""
+    model_path = model_name
+    if onnx:
+        model_path = os.path.join(HAYSTACK_ONNX_DIR, model_name.replace("/", "_"))
+        if not os.path.exists(model_path):
+            _convert_reader_to_onnx(model_name, model_path)
+    reader = FARMReader(
+        model_name_or_path=model_path,
+        use_gpu=False,  # Auf Streamlit Cloud meist kein GPU-Support
+        batch_size=READER_BATCH_SIZE,
+        progress_bar=False
+    )
+    reader.predict(query="What is warmed up?", documents=[Document(content="The reader is warmed up.")], top_k=1)
+    return reader
 
-    # Retriever
-    if "retriever" not in st.session_state:
-        st.session_state.retriever = BM25Retriever(document_store=st.session_state.doc_store)
 
-    # Reader
-    if "reader" not in st.session_state:
-        # Lokales Modell (du kannst auch ein anderes HF-Modell angeben)
-        st.session_state.reader = FARMReader(
-            model_name_or_path="deepset/roberta-base-squad2",
-            use_gpu=False  # Auf Streamlit Cloud meist kein GPU-Support
+class PassageStore:
+    """Prozessweiter BM25-Store mit inkrementell hinzugefügten, in Passagen geteilten Texten."""
+
+    def __init__(self, max_texts: int = HAYSTACK_MAX_TEXTS):
+        self.doc_store = InMemoryDocumentStore(use_bm25=True)
+        self.retriever = BM25Retriever(document_store=self.doc_store)
+        self.preprocessor = PreProcessor(
+            split_by="word",
+            split_length=PASSAGE_WORDS,
+            split_overlap=PASSAGE_OVERLAP,
+            split_respect_sentence_boundary=False,
+            progress_bar=False
         )
+        self.max_texts = max_texts
+        self.texts: "OrderedDict[str, int]" = OrderedDict()  # text hash -> number of passages
+        self.lock = threading.Lock()
+
+    def add_text(self, text: str) -> str:
+        """Teilt den Text in Passagen und indexiert ihn (nur einmal pro Inhalt). Gibt den Text-Hash zurück."""
+        text_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        with self.lock:
+            if text_hash in self.texts:
+                self.texts.move_to_end(text_hash)
+                return text_hash
+        # Keine Namen in den Metadaten: dieselben Passagen gehören allen Sitzungen mit diesem Text
+        passages = self.preprocessor.process([Document(content=text, meta={"text_hash": text_hash})])
+        for i, passage in enumerate(passages):
+            passage.id = f"{text_hash}:{i}"
+        with self.lock:
+            self.doc_store.write_documents(passages, duplicate_documents="skip")
+            self.texts[text_hash] = len(passages)
+            while len(self.texts) > self.max_texts:
+                old_hash, _ = self.texts.popitem(last=False)
+                self.doc_store.delete_documents(filters={"text_hash": [old_hash]})
+        return text_hash
+
+    def has_text(self, text_hash: str) -> bool:
+        with self.lock:
+            return text_hash in self.texts
+
+    def retrieve(self, question: str, text_hashes: List[str], top_k: int = RETRIEVER_TOP_K) -> List[Document]:
+        return self.retriever.retrieve(query=question, top_k=top_k, filters={"text_hash": list(text_hashes)})
+
+
+@lru_cache(maxsize=1)
+def get_passage_store() -> PassageStore:
+    return PassageStore()
 
-    # Pipeline aus Retriever + Reader
-    pipeline = ExtractiveQAPipeline(reader=st.session_state.reader, retriever=st.session_state.retriever)
+
+# Ein Reader-Aufruf zur Zeit: der geteilte FARMReader ist nicht thread-sicher. Damit ist der
+# Reader ein Single-Worker-Engpass - gleichzeitige Fragen aller Sitzungen warten hier
+# aufeinander; mehr Durchsatz gibt es nur mit mehreren Prozessen (je ein Reader).
+_reader_lock = threading.Lock()
+
+def answer_question(question: str, text_hashes: List[str], top_k: int = READER_TOP_K):
+    """BM25 holt die top-k Passagen der eigenen Texte, der geteilte Reader liest sie gebündelt."""
+    passages = get_passage_store().retrieve(question, text_hashes)
+    if not passages:
+        return []
+    reader = get_shared_reader()
+    with _reader_lock:
+        result = reader.predict(query=question, documents=passages, top_k=top_k)
+    return result.get("answers", [])
+
+
+def module_haystack_qa():
+    """
+    Dieses Modul demonstriert eine einfache QA-Logik nur mit Haystack.
+    - Geteilter InMemoryDocumentStore (Passagen) + BM25Retriever
+    - Geteilter FARMReader (lokales Modell von Hugging Face, optional ONNX)
+    """
+
+    st.title("Minimal Haystack QA (Nur Haystack)")
+
+    store = get_passage_store()
+    with st.spinner("Lade Reader-Modell (einmal pro Server-Prozess)..."):
+        get_shared_reader()
+
+    # Texte dieser Sitzung: Text-Hash -> Anzeigename (Namen sind pro Sitzung, nicht im Store)
+    if "haystack_texts" not in st.session_state:
+        st.session_state.haystack_texts = {}
+    session_texts = st.session_state.haystack_texts
 
     st.markdown("### 1) Text eingeben und indexieren")
+    text_name = st.text_input("Name des Textes:", value=f"Text {len(session_texts) + 1}")
     text_input = st.text_area("Füge deinen Text hier ein:")
     if st.button("📥 Indexieren"):
-        # Vorher alte Dokumente löschen
-        st.session_state.doc_store.delete_documents()
         if text_input.strip():
-            docs = [Document(content=text_input)]
-            st.session_state.doc_store.write_documents(docs)
+            session_texts[store.add_text(text_input)] = text_name.strip() or f"Text {len(session_texts) + 1}"
             st.success("Text wurde indexiert!")
         else:
             st.warning("Kein Text vorhanden.")
 
+    # Aus dem Store verdrängte Texte nicht mehr anbieten
+    for text_hash in [h for h in session_texts if not store.has_text(h)]:
+        del session_texts[text_hash]
+    if session_texts:
+        st.caption("Indexierte Texte: " + ", ".join(session_texts.values()))
+        if st.button("🗑️ Alle Texte dieser Sitzung entfernen"):
+            session_texts.clear()
+            st.rerun()
+
     st.markdown("### 2) Frage eingeben und Antwort erhalten")
     question = st.text_input("Tippe deine Frage ein:")
     if st.button("❓ Frage beantworten"):
         if not question.strip():
             st.warning("Bitte erst eine Frage eingeben.")
+        elif not session_texts:
+            st.warning("Bitte erst einen Text indexieren.")
         else:
-            # Pipeline ausführen
-            result = pipeline.run(
-                query=question,
-                params={
-                    "Retriever": {"top_k": 1},  # wie viele Passagen BM25 zurückgibt
-                    "Reader": {"top_k": 1}      # wie viele mögliche Antworten der Reader ausgibt
-                }
-            )
-            answers = result.get("answers", [])
+            answers = answer_question(question, list(session_texts))
             if answers:
-                best_answer = answers[0].answer
-                score = answers[0].score
-                st.write(f"**Antwort**: {best_answer}")
-                st.write(f"**Score**: {score:.4f}")
+                for a in answers:
+                    source = session_texts.get((a.meta or {}).get("text_hash"), "")
+                    st.write(f"**Antwort**: {a.answer}  \n**Score**: {a.score:.4f}" + (f"  \n**Quelle**: {source}" if source else ""))
             else:
                 st.info("Keine Antwort gefunden.")
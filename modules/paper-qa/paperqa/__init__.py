@@ -16,6 +16,7 @@ from paperqa.agents import ask
 from paperqa.agents.main import agent_query
 from paperqa.docs import Docs, PQASession, print_callback
 from paperqa.llms import (
+    LocalEmbeddingModel,
     NumpyVectorStore,
     QdrantVectorStore,
     VectorStore,
@@ -42,6 +43,7 @@ __all__ = [
     "LLMResult",
     "LiteLLMEmbeddingModel",
     "LiteLLMModel",
+    "LocalEmbeddingModel",
     "NumpyVectorStore",
     "PQASession",
     "QdrantVectorStore",
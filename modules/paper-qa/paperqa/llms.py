@@ -1,4 +1,5 @@
 import asyncio
+import importlib.util
 import itertools
 import logging
 import threading
@@ -10,6 +11,7 @@ from collections.abc import (
     Sequence,
     Sized,
 )
+from functools import cache
 from typing import TYPE_CHECKING, Any, cast
 
 import numpy as np
@@ -44,6 +46,12 @@ try:
 except ImportError:
     qdrant_installed = False
 
+# torch/transformers are imported lazily by the local encoder
+transformers_installed = all(
+    importlib.util.find_spec(module) is not None
+    for module in ("torch", "transformers")
+)
+
 logger = logging.getLogger(__name__)
 
 
@@ -522,12 +530,116 @@ class QdrantVectorStore(VectorStore):
         return docs
 
 
+@cache
+def _load_local_encoder(
+    name: str, quantize: bool, onnx: bool, num_threads: int | None
+) -> tuple[Any, Any, threading.Lock]:
+    """Load a tokenizer and encoder once per process and configuration.
+
+    The returned lock guards the tokenizer and the encoder for every model
+    sharing this configuration: a fast tokenizer with truncation/padding raises
+    "Already borrowed" when called concurrently, and the encoder is not
+    re-entrant under torch's intra-op thread pool.
+    """
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+
+    if num_threads:
+        # process-wide setting, applied once when the encoder is loaded
+        torch.set_num_threads(num_threads)
+    tokenizer = AutoTokenizer.from_pretrained(name)
+    if onnx:
+        try:
+            from optimum.onnxruntime import ORTModelForFeatureExtraction
+        except ImportError as exc:
+            raise ImportError(
+                "ONNX inference requires the `optimum[onnxruntime]` package."
+            ) from exc
+        model = ORTModelForFeatureExtraction.from_pretrained(name, export=True)
+        return tokenizer, model, threading.Lock()
+    model = AutoModel.from_pretrained(name)
+    model.eval()
+    if quantize:
+        model = torch.quantization.quantize_dynamic(
+            model, {torch.nn.Linear}, dtype=torch.qint8
+        )
+    return tokenizer, model, threading.Lock()
+
+
+class LocalEmbeddingModel(EmbeddingModel):
+    """Sentence embeddings computed on the local CPU with `transformers`.
+
+    The encoder (and the lock serializing its forward passes) is loaded once per
+    process and shared by all instances with the same configuration. Texts are
+    sorted by token length before batching so each batch carries as little
+    padding as possible, and embeddings are the attention-masked mean of the
+    last hidden state.
+
+    Supported `config` keys: `batch_size` (default 32), `max_length` (512),
+    `num_threads` (torch default), `quantize` (dynamic int8, default False),
+    `onnx` (ONNX Runtime via `optimum`, default False) and `normalize` (True).
+    """
+
+    name: str = Field(default="sentence-transformers/all-MiniLM-L6-v2")
+    config: dict[str, Any] = Field(default_factory=dict)
+
+    @model_validator(mode="after")
+    def validate_transformers(self):
+        if not transformers_installed:
+            msg = (
+                "`LocalEmbeddingModel` requires the `transformers` and `torch`"
+                " packages. Install them with `pip install transformers torch`"
+            )
+            raise ImportError(msg)
+        return self
+
+    def encode(self, texts: list[str]) -> list[list[float]]:
+        """Synchronously embed texts (usable outside of an event loop)."""
+        if not texts:
+            return []
+        import torch
+
+        tokenizer, model, lock = _load_local_encoder(
+            self.name,
+            bool(self.config.get("quantize", False)),
+            bool(self.config.get("onnx", False)),
+            self.config.get("num_threads") or None,
+        )
+        batch_size = self.config.get("batch_size", 32)
+        with lock:
+            encoded = tokenizer(
+                texts, truncation=True, max_length=self.config.get("max_length", 512)
+            )
+        order = sorted(range(len(texts)), key=lambda i: len(encoded["input_ids"][i]))
+        embeddings: list[list[float]] = [[] for _ in texts]
+        for start in range(0, len(order), batch_size):
+            batch = order[start : start + batch_size]
+            with lock, torch.inference_mode():
+                padded = tokenizer.pad(
+                    [{key: encoded[key][i] for key in encoded} for i in batch],
+                    return_tensors="pt",
+                )
+                hidden = model(**padded).last_hidden_state
+            mask = padded["attention_mask"].unsqueeze(-1).to(hidden.dtype)
+            pooled = (hidden * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1e-9)
+            if self.config.get("normalize", True):
+                pooled = torch.nn.functional.normalize(pooled, dim=-1)
+            for i, vector in zip(batch, pooled.tolist(), strict=True):
+                embeddings[i] = vector
+        return embeddings
+
+    async def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return await asyncio.to_thread(self.encode, texts)
+
+
 def embedding_model_factory(embedding: str, **kwargs) -> EmbeddingModel:
     """
     Factory function to create an appropriate EmbeddingModel based on the embedding string.
 
     Supports:
     - SentenceTransformer models prefixed with "st-" (e.g., "st-multi-qa-MiniLM-L6-cos-v1")
+    - Local CPU `transformers` models prefixed with "local-"
+      (e.g., "local-sentence-transformers/all-MiniLM-L6-v2")
     - LiteLLM models (default if no prefix is provided)
     - Hybrid embeddings prefixed with "hybrid-", contains a sparse and a dense model
 
@@ -566,6 +678,14 @@ def embedding_model_factory(embedding: str, **kwargs) -> EmbeddingModel:
             config=kwargs,
         )
 
+    if embedding.startswith("local-"):
+        # Extract the Hugging Face model name after "local-"
+        model_name = embedding[len("local-") :].strip()
+        if not model_name:
+            raise ValueError("model name must be specified after 'local-'.")
+
+        return LocalEmbeddingModel(name=model_name, config=kwargs)
+
     if embedding.startswith("litellm-"):
         # Extract the LiteLLM model name after "litellm-"
         model_name = embedding[len("litellm-") :].strip()
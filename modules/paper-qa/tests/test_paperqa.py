@@ -3,11 +3,14 @@ import os
 import pathlib
 import pickle
 import re
+import threading
 from collections.abc import AsyncIterable, Sequence
+from concurrent.futures import ThreadPoolExecutor
 from copy import deepcopy
 from datetime import datetime, timedelta
 from io import BytesIO
 from pathlib import Path
+from types import SimpleNamespace
 from typing import cast
 
 import httpx
@@ -28,11 +31,13 @@ from lmi.llms import rate_limited
 from lmi.utils import VCR_DEFAULT_MATCH_ON
 from pytest_subtests import SubTests
 
+import paperqa.llms
 from paperqa import (
     Answer,
     Doc,
     DocDetails,
     Docs,
+    LocalEmbeddingModel,
     NumpyVectorStore,
     PQASession,
     QdrantVectorStore,
@@ -44,6 +49,7 @@ from paperqa import (
 from paperqa.clients import CrossrefProvider
 from paperqa.clients.journal_quality import JournalQualityPostProcessor
 from paperqa.core import llm_parse_json
+from paperqa.llms import embedding_model_factory
 from paperqa.prompts import CANNOT_ANSWER_PHRASE
 from paperqa.prompts import qa_prompt as default_qa_prompt
 from paperqa.readers import read_doc
@@ -747,6 +753,63 @@ def test_hybrid_embedding(stub_data_dir: Path, vector_store: type[VectorStore])
     assert any(docs.texts[0].embedding)
 
 
+def test_local_embedding_factory() -> None:
+    with pytest.raises(ValueError, match="after 'local-'"):
+        embedding_model_factory("local-")
+    pytest.importorskip("transformers")
+    model = embedding_model_factory(
+        "local-sentence-transformers/all-MiniLM-L6-v2", batch_size=8, quantize=True
+    )
+    assert isinstance(model, LocalEmbeddingModel)
+    assert model.name == "sentence-transformers/all-MiniLM-L6-v2"
+    assert model.config == {"batch_size": 8, "quantize": True}
+    via_settings = Settings(
+        embedding="local-sentence-transformers/all-MiniLM-L6-v2"
+    ).get_embedding_model()
+    assert isinstance(via_settings, LocalEmbeddingModel)
+    assert via_settings.name == LocalEmbeddingModel().name
+
+
+def test_local_embedding_encode(monkeypatch) -> None:
+    torch = pytest.importorskip("torch")
+    pytest.importorskip("transformers")
+
+    class StubTokenizer:
+        # token id = word length
+        def __call__(self, texts, truncation, max_length):  # noqa: ARG002
+            ids = [[len(w) for w in t.split()][:max_length] for t in texts]
+            return {"input_ids": ids, "attention_mask": [[1] * len(i) for i in ids]}
+
+        def pad(self, features, return_tensors):  # noqa: ARG002
+            width = max(len(f["input_ids"]) for f in features)
+            return {
+                key: torch.tensor(
+                    [f[key] + [0] * (width - len(f[key])) for f in features]
+                )
+                for key in ("input_ids", "attention_mask")
+            }
+
+    class StubEncoder:
+        # hidden state per token: (token id, 1)
+        def __call__(self, input_ids, attention_mask):  # noqa: ARG002
+            ones = torch.ones_like(input_ids, dtype=torch.float)
+            hidden = torch.stack([input_ids.float(), ones], dim=-1)
+            return SimpleNamespace(last_hidden_state=hidden)
+
+    encoder = (StubTokenizer(), StubEncoder(), threading.Lock())
+    monkeypatch.setattr(paperqa.llms, "_load_local_encoder", lambda *_: encoder)
+    model = LocalEmbeddingModel(config={"batch_size": 2, "normalize": False})
+    texts = ["aaa bbbbb c", "dd", "eeee ff"]
+    expected = [[3.0, 1.0], [2.0, 1.0], [3.0, 1.0]]
+    # Padding is masked out and the input order is kept across length-sorted batches
+    assert model.encode(texts) == expected
+    assert model.encode([]) == []
+    # Concurrent callers share the tokenizer and encoder under one lock
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        results = list(pool.map(model.encode, [texts] * 8))
+    assert all(r == expected for r in results)
+
+
 def test_custom_llm(stub_data_dir: Path) -> None:
     class StubLLMModel(LLMModel):
         name: str = "custom/myllm"
@@ -1,3 +1,5 @@
+import os
+import sys
 import openai
 
 # Sicherstellen, dass openai.error existiert. Falls nicht, erstellen wir ein Dummy-Objekt.
@@ -14,11 +16,15 @@ import pytesseract
 import logging
 
 from PIL import Image
-from langchain.text_splitter import CharacterTextSplitter
-from langchain.embeddings.openai import OpenAIEmbeddings  # Expliziter Importpfad
-from langchain.vectorstores import Chroma  # Offizielle Chroma-Implementierung
 from streamlit_feedback import streamlit_feedback
 
+# Projekt-Wurzel für gemeinsame Module (auch bei "streamlit run modules/...")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from modules.ingestion import get_ingestion_worker, STATUS_DONE
+from modules.chroma_store import (DocumentLease, corpus_filter, get_persistent_vectorstore, index_document,
+                                  is_indexed, purge_unused_documents)
+from modules.chat_memory import DISPLAY_WINDOW, get_session_memory, openai_summarizer
+
 logging.basicConfig(level=logging.INFO)
 
 ##############################################
@@ -45,25 +51,14 @@ def extract_text_from_pdf(pdf_file) -> str:
 # 2) Chroma + OpenAI Q&A
 ##############################################
 
-def create_vectorstore_from_text(text: str):
-    """
-    Teilt den Text in Chunks und erstellt eine Chroma-Datenbank
-    mit OpenAI-Embeddings. Gibt das VectorStore-Objekt zurück.
-    """
-    text_splitter = CharacterTextSplitter(separator="\n", chunk_size=1000, chunk_overlap=100)
-    chunks = text_splitter.split_text(text)
-    logging.info(f"Text in {len(chunks)} Chunks aufgeteilt.")
-
-    embeddings = OpenAIEmbeddings()
-    vectorstore = Chroma.from_texts(chunks, embedding=embeddings)
-    return vectorstore
-
-def answer_question(query: str, vectorstore):
+def answer_question(query: str, vectorstore, doc_hashes=None, history=None):
     """
-    Sucht in der Vektordatenbank nach relevantem Kontext und
-    erzeugt eine Antwort mit openai.ChatCompletion.
+    Sucht in der Vektordatenbank nach relevantem Kontext (nur in den Dokumenten
+    der Sitzung, falls doc_hashes angegeben) und erzeugt eine Antwort mit openai.ChatCompletion.
+    history: bisheriger Verlauf (Zusammenfassung + letzte Nachrichten) aus ConversationMemory.
     """
-    docs = vectorstore.similarity_search(query, k=4)
+    where = corpus_filter(doc_hashes) if doc_hashes else None
+    docs = vectorstore.similarity_search(query, k=4, filter=where)
     logging.info(f"{len(docs)} relevante Textstellen für die Anfrage gefunden.")
 
     context = "\n".join([d.page_content for d in docs])
@@ -82,7 +77,7 @@ def answer_question(query: str, vectorstore):
     try:
         response = openai.ChatCompletion.create(
             model="gpt-3.5-turbo",
-            messages=[system_message, user_message],
+            messages=[system_message] + (history or []) + [user_message],
             temperature=0.2,
         )
         answer = response.choices[0].message.content.strip()
@@ -100,7 +95,9 @@ def save_feedback(index):
     Callback-Funktion für Feedback (Daumen hoch/runter).
     """
     feedback_value = st.session_state.get(f"feedback_{index}")
-    st.session_state.history[index]["feedback"] = feedback_value
+    message = get_session_memory(st.session_state, "chat_memory").get(index)
+    if message is not None:
+        message["feedback"] = feedback_value
     logging.info(f"Feedback für Nachricht {index}: {feedback_value}")
 
 ##############################################
@@ -120,17 +117,40 @@ def main():
     )
 
     if uploaded_files:
-        all_text = ""
-        for file in uploaded_files:
-            file_text = extract_text_from_pdf(file)
-            if file_text.strip():
-                all_text += file_text + "\n"
-
-        if all_text.strip():
-            vectorstore = create_vectorstore_from_text(all_text)
-            st.session_state.vectorstore = vectorstore
-            st.success("Wissensdatenbank aus den hochgeladenen PDFs wurde erfolgreich erstellt!")
-        else:
+        # Extraktion + Indexierung starten sofort im Hintergrund (pro Datei-Hash);
+        # bereits indexierte Dokumente werden nicht erneut embedded
+        worker = get_ingestion_worker("chroma", embed_fn=index_document)
+        upload_hashes = worker.submit_all(uploaded_files)
+        with st.expander("Verarbeitungsstatus der PDFs", expanded=False):
+            st.dataframe(worker.status_rows(upload_hashes))
+
+        corpus_key = tuple(sorted(upload_hashes))
+        if st.session_state.get("vectorstore_key") != corpus_key:
+            with st.spinner("Warte auf die Verarbeitung der PDFs..."):
+                jobs = [worker.wait(h) for h in upload_hashes]
+            done = [j for j in jobs if j and j.status == STATUS_DONE and j.embeddings]
+            # Erst die Dokumente belegen (ab jetzt werden sie nicht gelöscht), dann prüfen:
+            # fehlt ein Dokument in der Collection (gelöscht, Verzeichnis entfernt), nachindexieren
+            lease = DocumentLease(j.embeddings for j in done)
+            doc_hashes = {j.embeddings if is_indexed(j.embeddings) else index_document(j.text) for j in done}
+            old_lease = st.session_state.pop("doc_lease", None)
+            if doc_hashes:
+                st.session_state.vectorstore = get_persistent_vectorstore()
+                st.session_state.doc_hashes = doc_hashes
+                st.session_state.doc_lease = lease
+                st.session_state.vectorstore_key = corpus_key
+                st.success("Wissensdatenbank aus den hochgeladenen PDFs ist bereit!")
+            else:
+                lease.release()
+                st.session_state.pop("vectorstore", None)
+                st.session_state.pop("doc_hashes", None)
+                st.session_state.pop("vectorstore_key", None)
+            # Nicht mehr hochgeladene Dokumente freigeben (gelöscht, wenn keine andere Sitzung sie nutzt)
+            if old_lease is not None:
+                old_lease.release()
+            else:
+                purge_unused_documents()
+        if "vectorstore" not in st.session_state:
             st.error(
                 "Es konnte kein Text aus den PDFs extrahiert werden.\n\n"
                 "Mögliche Ursachen:\n"
@@ -138,13 +158,24 @@ def main():
                 "- Das PDF ist verschlüsselt oder geschützt.\n\n"
                 "Bitte laden Sie nur digitale PDFs hoch."
             )
-
-    # Chat-Verlauf initialisieren
-    if "history" not in st.session_state:
-        st.session_state.history = []
-
-    # Bisherigen Chat-Verlauf anzeigen
-    for i, msg in enumerate(st.session_state.history):
+    elif st.session_state.get("doc_hashes"):
+        # Alle PDFs entfernt: Dokumente freigeben; gelöscht wird nur, was keine andere Sitzung nutzt
+        st.session_state.pop("doc_hashes")
+        st.session_state.pop("vectorstore", None)
+        st.session_state.pop("vectorstore_key", None)
+        lease = st.session_state.pop("doc_lease", None)
+        if lease is not None:
+            lease.release()
+
+    # Chat-Verlauf (letzte Nachrichten + laufende Zusammenfassung)
+    memory = get_session_memory(st.session_state, "chat_memory")
+
+    # Nur die neuesten Nachrichten anzeigen, ältere auf Wunsch
+    window = st.session_state.setdefault("chat_window", DISPLAY_WINDOW)
+    if len(memory.messages) > window and st.button("Ältere Nachrichten anzeigen"):
+        window = st.session_state["chat_window"] = window + DISPLAY_WINDOW
+    for msg in memory.window(window):
+        i = msg["id"]
         with st.chat_message(msg["role"]):
             st.write(msg["content"])
             if msg["role"] == "assistant":
@@ -162,21 +193,24 @@ def main():
     if prompt := st.chat_input("Frage zu den hochgeladenen Papern stellen..."):
         with st.chat_message("user"):
             st.write(prompt)
-        st.session_state.history.append({"role": "user", "content": prompt})
+        memory.add("user", prompt)
 
         if "vectorstore" not in st.session_state:
             st.error("Bitte lade mindestens ein PDF hoch, bevor du Fragen stellst.")
         else:
-            answer = answer_question(prompt, st.session_state.vectorstore)
+            if "doc_lease" in st.session_state:
+                st.session_state.doc_lease.touch()
+            history = memory.prompt_messages(openai_summarizer(), exclude_last=1)
+            answer = answer_question(prompt, st.session_state.vectorstore, st.session_state.get("doc_hashes"), history)
             with st.chat_message("assistant"):
                 st.write(answer)
                 streamlit_feedback(
                     feedback_type="thumbs",
-                    key=f"feedback_{len(st.session_state.history)}",
+                    key=f"feedback_{len(memory)}",
                     on_change=save_feedback,
-                    args=(len(st.session_state.history),),
+                    args=(len(memory),),
                 )
-            st.session_state.history.append({"role": "assistant", "content": answer})
+            memory.add("assistant", answer)
 
 if __name__ == "__main__":
     main()
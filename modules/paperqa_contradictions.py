@@ -0,0 +1,207 @@
+import asyncio
+import copy
+import hashlib
+import io
+import os
+import pickle
+import re
+import sys
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+# Vendored paper-qa (modules/paper-qa/paperqa)
+PAPERQA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "paper-qa")
+if PAPERQA_DIR not in sys.path:
+    sys.path.insert(0, PAPERQA_DIR)
+
+try:
+    from paperqa import Docs, HybridEmbeddingModel, Settings, SparseEmbeddingModel
+    from paperqa.llms import embedding_model_factory
+    from paperqa.settings import make_default_litellm_model_list_settings
+    from modules.embedding_cache import cached_embedding_model
+    paperqa_installed = True
+except ImportError:
+    paperqa_installed = False
+
+# ------------------------------------------------------------------
+# Widerspruchsanalyse mit paper-qa (ContraCrow-Konfiguration)
+# ------------------------------------------------------------------
+# The uploaded papers are added to one paperqa.Docs per corpus (keyed by
+# the sorted file hashes). The Docs object - chunks and embeddings - is
+# kept in memory and pickled to PAPERQA_DOCS_CACHE, so re-running the
+# analysis on the same uploads embeds nothing again. Every claim is then
+# checked with the "contracrow" settings: MMR retrieval picks the relevant
+# chunks of the other papers (never the claim's own paper),
+# map_fxn_summary condenses them concurrently and the contradiction prompt
+# labels the claim. The LLM only sees retrieved evidence, never truncated
+# text prefixes.
+
+PAPERQA_DOCS_CACHE = os.getenv("PAPERQA_DOCS_CACHE", os.path.join(".cache", "paperqa_docs"))
+CONTRACROW_CONFIG = "contracrow"
+
+CONTRADICTION_LABELS = ("explicit contradiction", "strong contradiction", "contradiction",
+                        "nuanced contradiction", "possibly a contradiction")
+AGREEMENT_LABELS = ("possibly an agreement", "nuanced agreement", "agreement",
+                    "strong agreement", "explicit agreement")
+
+_docs_cache: Dict[str, Any] = {}
+_docs_lock = threading.Lock()
+
+
+def corpus_key(papers: Dict[str, bytes]) -> str:
+    """Stable key of a set of papers (independent of order and file names)."""
+    hashes = sorted(hashlib.sha256(data).hexdigest() for data in papers.values())
+    return hashlib.sha256("|".join(hashes).encode("utf-8")).hexdigest()[:32]
+
+
+def _with_api_key(llm_config: dict, api_key: str) -> dict:
+    config = copy.deepcopy(llm_config)
+    for entry in config.get("model_list", []):
+        entry.setdefault("litellm_params", {})["api_key"] = api_key
+    return config
+
+
+def apply_api_key(settings: "Settings", api_key: str) -> "Settings":
+    """
+    Puts the user's key into the LiteLLM configs of the settings. Never via
+    os.environ: that is process-wide and would leak between sessions.
+    """
+    if not api_key:
+        return settings
+    settings.llm_config = _with_api_key(
+        settings.llm_config or make_default_litellm_model_list_settings(settings.llm, settings.temperature), api_key)
+    settings.summary_llm_config = _with_api_key(
+        settings.summary_llm_config or make_default_litellm_model_list_settings(settings.summary_llm, settings.temperature),
+        api_key)
+    if not settings.embedding.startswith(("hybrid-", "local-", "st-")) and settings.embedding != "sparse":
+        # LiteLLMEmbeddingModel passes config["kwargs"] on to litellm.aembedding
+        settings.embedding_config = {**(settings.embedding_config or {}), "kwargs": {"api_key": api_key}}
+    return settings
+
+
+def embedding_model_for(settings: "Settings", api_key: str):
+    """Embedding model of the settings with the user's key (also for hybrid-*), through the embedding cache."""
+    if api_key and settings.embedding.startswith("hybrid-"):
+        dense = embedding_model_factory(settings.embedding[len("hybrid-"):], kwargs={"api_key": api_key})
+        return cached_embedding_model(HybridEmbeddingModel(models=[dense, SparseEmbeddingModel()]))
+    return cached_embedding_model(settings.get_embedding_model())
+
+
+def contracrow_settings(model: str, api_key: str) -> "Settings":
+    """contracrow.json with the app's OpenAI model; document details come from the upload, not from APIs."""
+    settings = Settings.from_name(CONTRACROW_CONFIG)
+    settings.llm = model
+    settings.summary_llm = model
+    settings.parsing.use_doc_details = False
+    return apply_api_key(settings, api_key)
+
+
+def run_sync(coro):
+    """Runs a coroutine from synchronous (Streamlit) code, also if the thread already has a loop."""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+    result = {}
+
+    def target():
+        result["value"] = asyncio.run(coro)
+
+    worker = threading.Thread(target=target)
+    worker.start()
+    worker.join()
+    return result["value"]
+
+
+async def _build_docs(papers: Dict[str, bytes], settings: "Settings", embedding_model,
+                      docs: Optional["Docs"] = None) -> "Docs":
+    docs = docs or Docs()
+    for name, data in papers.items():
+        dockey = hashlib.sha256(data).hexdigest()
+        if dockey in docs.docs:
+            continue
+        await docs.aadd_file(io.BytesIO(data), citation=name, docname=re.sub(r"\W+", "_", os.path.splitext(name)[0]),
+                             dockey=dockey, settings=settings, embedding_model=embedding_model)
+    return docs
+
+
+def get_corpus_docs(papers: Dict[str, bytes], settings: "Settings", embedding_model) -> "Docs":
+    """paperqa.Docs for this set of papers: process cache -> pickle on disk -> build (chunk + embed once)."""
+    key = f"{corpus_key(papers)}_{settings.embedding}"
+    with _docs_lock:
+        if key in _docs_cache:
+            return _docs_cache[key]
+    path = os.path.join(PAPERQA_DOCS_CACHE, f"{key}.pkl")
+    docs = None
+    if os.path.exists(path):
+        try:
+            with open(path, "rb") as f:
+                docs = pickle.load(f)
+        except Exception:
+            docs = None
+    if docs is None or len(docs.docs) < len(papers):
+        docs = run_sync(_build_docs(papers, settings, embedding_model, docs))
+        os.makedirs(PAPERQA_DOCS_CACHE, exist_ok=True)
+        with open(path, "wb") as f:
+            pickle.dump(docs, f)
+    with _docs_lock:
+        _docs_cache[key] = docs
+    return docs
+
+
+def parse_contracrow_answer(answer: str) -> Tuple[str, str]:
+    """(label, reasoning) from the XML answer of the contracrow qa prompt."""
+    label = re.search(r"<label>\s*(.*?)\s*</label>", answer, re.DOTALL | re.IGNORECASE)
+    reasoning = re.search(r"<reasoning>\s*(.*?)\s*</reasoning>", answer, re.DOTALL | re.IGNORECASE)
+    return (label.group(1).strip().lower() if label else "lack of evidence",
+            reasoning.group(1).strip() if reasoning else answer.strip())
+
+
+async def _check_claims(docs: "Docs", claims: List[Dict[str, str]], settings: "Settings",
+                        embedding_model, dockeys: Dict[str, str]) -> List[Dict[str, Any]]:
+    """Every claim is answered only from the other papers: the chunks of its own paper are excluded."""
+    semaphore = asyncio.Semaphore(settings.answer.max_concurrent_requests)
+
+    async def check(claim):
+        own_dockey = dockeys.get(claim["paper"])
+        own_texts = {t.text for t in docs.texts if t.doc.dockey == own_dockey}
+        async with semaphore:
+            session = await docs.aget_evidence(claim["claim"], exclude_text_filter=own_texts,
+                                               settings=settings, embedding_model=embedding_model)
+            if not any(c.score > 0 for c in session.contexts):
+                return dict(claim, label="lack of evidence", reasoning="No relevant evidence in the other papers.",
+                            sources=[])
+            session = await docs.aquery(session, settings=settings, embedding_model=embedding_model)
+        label, reasoning = parse_contracrow_answer(session.answer)
+        sources = sorted({c.text.doc.docname for c in session.contexts if c.score > 0})
+        return dict(claim, label=label, reasoning=reasoning, sources=sources)
+
+    return await asyncio.gather(*(check(c) for c in claims))
+
+
+def analyze_with_contracrow(papers: Dict[str, bytes], claims: List[Dict[str, str]],
+                            model: str, api_key: str) -> Dict[str, Any]:
+    """
+    Checks every claim ({"paper", "claim"}) against the paperqa index of the other papers.
+    Returns the JSON shape of the standard analysis (commonalities, contradictions)
+    plus the raw per-claim verdicts.
+    """
+    settings = contracrow_settings(model, api_key)
+    embedding_model = embedding_model_for(settings, api_key)
+    docs = get_corpus_docs(papers, settings, embedding_model)
+    dockeys = {name: hashlib.sha256(data).hexdigest() for name, data in papers.items()}
+    verdicts = run_sync(_check_claims(docs, claims, settings, embedding_model, dockeys))
+
+    commonalities, contradictions = [], []
+    for v in verdicts:
+        if v["label"] in CONTRADICTION_LABELS:
+            contradictions.append({
+                "paperA": v["paper"],
+                "claimA": v["claim"],
+                "paperB": ", ".join(v["sources"]),
+                "claimB": v["reasoning"],
+                "reason": v["label"],
+            })
+        elif v["label"] in AGREEMENT_LABELS:
+            commonalities.append(f"{v['claim']} ({v['paper']}; {v['label']}: {', '.join(v['sources'])})")
+    return {"commonalities": commonalities, "contradictions": contradictions, "verdicts": verdicts}
@@ -0,0 +1,143 @@
+import hashlib
+import os
+import threading
+from contextlib import nullcontext
+from typing import Any, Callable, Dict, List, Optional
+
+from modules.paperqa_contradictions import apply_api_key, embedding_model_for, paperqa_installed, run_sync
+
+if paperqa_installed:
+    from paperqa import Docs, Settings
+    from paperqa.agents.search import get_directory_index
+
+# ------------------------------------------------------------------
+# PaperQA2 über einem Paper-Verzeichnis (persistenter Index)
+# ------------------------------------------------------------------
+# The paper directory is indexed once into paperqa's tantivy SearchIndex
+# (PAPERQA_INDEX_DIR): every paper is parsed, chunked and embedded a single
+# time and stored with the index; re-syncing only processes new or removed
+# files. Per corpus one warmed Docs object lives in a process-wide cache.
+# A question runs a full-text search over the index, merges the top papers
+# (with their stored embeddings) into the warm Docs - like paperqa's own
+# paper_search tool - and then gathers evidence and streams the answer.
+
+# Vom Server vorgegebenes Paper-Verzeichnis; auf der Seite sind nur seine Unterordner wählbar
+PAPERQA_PAPER_DIR = os.getenv("PAPERQA_PAPER_DIR", "papers")
+PAPERQA_INDEX_DIR = os.getenv("PAPERQA_INDEX_DIR", os.path.join(".cache", "paperqa_index"))
+SEARCH_TOP_N = 8
+MAX_WARM_PAPERS = 200  # danach wird das warme Docs-Objekt neu begonnen
+
+_corpora: Dict[str, "PaperCorpus"] = {}
+_corpora_lock = threading.Lock()
+# One lock per tantivy index: corpora with different models / keys share the same index files
+_build_locks: Dict[str, threading.RLock] = {}
+
+
+def corpus_directories(root: str = PAPERQA_PAPER_DIR) -> List[str]:
+    """The configured paper directory and its direct subdirectories (the only selectable corpora)."""
+    if not os.path.isdir(root):
+        return []
+    subdirs = sorted(e.name for e in os.scandir(root) if e.is_dir() and not e.name.startswith("."))
+    return [root] + [os.path.join(root, d) for d in subdirs]
+
+
+def corpus_settings(paper_directory: str, model: str, api_key: str) -> "Settings":
+    """Settings for the directory index; document details come from the files, not from APIs."""
+    settings = Settings()
+    settings.llm = model
+    settings.summary_llm = model
+    settings.parsing.use_doc_details = False
+    settings.agent.index.paper_directory = os.path.abspath(paper_directory)
+    settings.agent.index.index_directory = os.path.abspath(PAPERQA_INDEX_DIR)
+    # Key only in this session's settings, never in os.environ
+    return apply_api_key(settings, api_key)
+
+
+def _build_lock(index_name: str) -> threading.RLock:
+    with _corpora_lock:
+        return _build_locks.setdefault(index_name, threading.RLock())
+
+
+class PaperCorpus:
+    def __init__(self, settings: "Settings", api_key: str):
+        self.settings = settings
+        self.embedding_model = embedding_model_for(settings, api_key)
+        self.docs = Docs()
+        self.index = None
+        # The warm Docs object is shared by all sessions; queries on it run one at a time
+        self.lock = threading.Lock()
+
+    @property
+    def paper_count(self) -> int:
+        return len(self.docs.docs)
+
+    def sync(self, build: bool = True) -> int:
+        """Opens the persisted index (build=True: adds new / removes deleted files). Returns the number of files."""
+        # Not while another session's question runs on the current index
+        with self.lock:
+            return self._open_index(build)
+
+    def _open_index(self, build: bool) -> int:
+        # Never two builds of the same index at once (also across corpora sharing it)
+        with _build_lock(self.settings.get_index_name()) if build else nullcontext():
+            self.index = run_sync(get_directory_index(settings=self.settings, build=build))
+        return len(run_sync(self._index_files()))
+
+    async def _index_files(self):
+        return await self.index.index_files
+
+    async def _merge_search_results(self, question: str) -> int:
+        results = await self.index.query(
+            question,
+            top_n=SEARCH_TOP_N,
+            field_subset=[f for f in self.index.fields if f != "year"],
+        )
+        if self.paper_count + len(results) > MAX_WARM_PAPERS:
+            self.docs = Docs()
+        for result in results:
+            # One paper per saved Docs object; its texts already carry their embeddings
+            doc = next(iter(result.docs.values()))
+            await self.docs.aadd_texts(texts=result.texts, doc=doc, settings=self.settings,
+                                       embedding_model=self.embedding_model)
+        return len(results)
+
+    async def _answer(self, question: str, on_progress: Callable[[str], None], on_token: Callable[[str], None]):
+        on_progress("Searching the paper index...")
+        found = await self._merge_search_results(question)
+        on_progress(f"Gathering evidence from {found} matching papers...")
+        session = await self.docs.aget_evidence(question, settings=self.settings,
+                                                embedding_model=self.embedding_model)
+        on_progress(f"Writing the answer from {len(session.contexts)} pieces of evidence...")
+        return await self.docs.aquery(session, settings=self.settings, callbacks=[on_token],
+                                      embedding_model=self.embedding_model)
+
+    def ask(self, question: str, on_progress: Optional[Callable[[str], None]] = None,
+            on_token: Optional[Callable[[str], None]] = None) -> Any:
+        """PQASession for the question; progress messages and answer tokens are reported via callbacks."""
+        with self.lock:
+            if self.index is None:
+                self._open_index(build=False)
+            return run_sync(self._answer(question, on_progress or (lambda _: None), on_token or (lambda _: None)))
+
+
+def get_paper_corpus(paper_directory: str, model: str, api_key: str) -> PaperCorpus:
+    """Process-wide PaperCorpus per (persisted index, model, API key); opens or builds the index on first use."""
+    if os.path.abspath(paper_directory) not in {os.path.abspath(d) for d in corpus_directories()}:
+        raise ValueError(f"{paper_directory} is not a configured paper directory")
+    settings = corpus_settings(paper_directory, model, api_key)
+    key_hash = hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+    key = f"{settings.get_index_name()}|{model}|{key_hash}"
+    with _corpora_lock:
+        corpus = _corpora.get(key)
+    if corpus is not None:
+        return corpus
+    # Sessions opening the same index wait for the first build instead of building it again
+    with _build_lock(settings.get_index_name()):
+        with _corpora_lock:
+            corpus = _corpora.get(key)
+        if corpus is None:
+            corpus = PaperCorpus(settings, api_key)
+            corpus.sync(build=True)
+            with _corpora_lock:
+                _corpora[key] = corpus
+    return corpus
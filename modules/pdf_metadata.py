@@ -0,0 +1,158 @@
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+try:
+    import fitz  # PyMuPDF
+except ImportError:
+    fitz = None
+
+from utilities import file_sha256, read_file_bytes
+
+# ------------------------------------------------------------------
+# Offline bibliographic metadata from the PDF itself
+# ------------------------------------------------------------------
+# Reads the XMP packet, the Info dictionary and only the first page
+# (header/footer blocks) via PyMuPDF - no full text extraction and no
+# network. PubMed is only needed if nothing usable is found here.
+
+DOI_PATTERN = re.compile(r"\b(10\.\d{4,9}/[^\s\"<>]+)", re.IGNORECASE)
+PMID_PATTERN = re.compile(r"\bPMID:?\s*(\d{5,9})\b", re.IGNORECASE)
+YEAR_CONTEXT_PATTERN = re.compile(
+    r"(?:published(?: online)?|accepted|©|\(c\)|copyright|received)[^\n]{0,40}?\b((?:19|20)\d{2})\b",
+    re.IGNORECASE
+)
+YEAR_PATTERN = re.compile(r"\b((?:19|20)\d{2})\b")
+XMP_FIELDS = {
+    "doi": re.compile(r"<(?:prism:doi|pdfx:doi|dc:identifier)[^>]*>\s*(?:<rdf:\w+>\s*<rdf:li[^>]*>)?\s*(?:doi:)?\s*(10\.[^<\s]+)", re.IGNORECASE),
+    "title": re.compile(r"<dc:title>\s*<rdf:Alt>\s*<rdf:li[^>]*>([^<]+)</rdf:li>", re.IGNORECASE),
+    "year": re.compile(r"<(?:prism:publicationDate|prism:coverDate)[^>]*>\s*((?:19|20)\d{2})", re.IGNORECASE),
+    # File creation date, not a publication year (only used after the full-text year search)
+    "creation_year": re.compile(r"<xmp:CreateDate[^>]*>\s*((?:19|20)\d{2})", re.IGNORECASE),
+    "journal": re.compile(r"<prism:publicationName[^>]*>([^<]+)<", re.IGNORECASE),
+}
+# Titles like "Microsoft Word - draft.docx" or "untitled" are useless
+BAD_TITLE_PATTERN = re.compile(r"(microsoft word|untitled|\.docx?$|\.pdf$|^\s*$)", re.IGNORECASE)
+
+HEADER_FOOTER_FRACTION = 0.15
+_CACHE_MAX_ENTRIES = 512
+
+_cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _clean_doi(doi: str) -> str:
+    return doi.rstrip(".,;)]}").strip()
+
+def _empty_metadata() -> Dict[str, Any]:
+    return {"doi": None, "pmid": None, "year": None, "title": None, "journal": None,
+            "creation_year": None, "source": {}}
+
+def _set(meta: Dict[str, Any], field: str, value: Optional[str], source: str):
+    if value and not meta[field]:
+        meta[field] = value.strip()
+        meta["source"][field] = source
+
+def _largest_font_line(page) -> Optional[str]:
+    """Largest-font text line on the first page (usually the title)."""
+    best_size, best_text = 0.0, []
+    for block in page.get_text("dict").get("blocks", []):
+        for line in block.get("lines", []):
+            spans = line.get("spans", [])
+            text = "".join(s.get("text", "") for s in spans).strip()
+            if len(text) < 10 or not spans:
+                continue
+            size = max(s.get("size", 0) for s in spans)
+            if size > best_size + 0.5:
+                best_size, best_text = size, [text]
+            elif abs(size - best_size) <= 0.5 and best_text:
+                best_text.append(text)
+    return " ".join(best_text) if best_text else None
+
+def _sniff(data: bytes) -> Dict[str, Any]:
+    meta = _empty_metadata()
+    if fitz is None:
+        return meta
+    try:
+        doc = fitz.open(stream=data, filetype="pdf")
+    except Exception:
+        return meta
+    try:
+        # 1) XMP packet
+        xmp = doc.get_xml_metadata() or ""
+        for field, pattern in XMP_FIELDS.items():
+            m = pattern.search(xmp)
+            if m:
+                value = _clean_doi(m.group(1)) if field == "doi" else m.group(1)
+                if field == "title" and BAD_TITLE_PATTERN.search(value):
+                    continue
+                _set(meta, field, value, "xmp")
+
+        # 2) Info dictionary (subject often carries "Journal, 2019, doi:...")
+        info = doc.metadata or {}
+        for key in ("subject", "keywords", "title"):
+            m = DOI_PATTERN.search(info.get(key) or "")
+            if m:
+                _set(meta, "doi", _clean_doi(m.group(1)), "info")
+        title = info.get("title") or ""
+        if not BAD_TITLE_PATTERN.search(title) and len(title) > 10:
+            _set(meta, "title", title, "info")
+
+        # 3) First page: header/footer blocks first, then the remaining page
+        if doc.page_count:
+            page = doc[0]
+            height = page.rect.height or 1
+            edge_text, body_text = [], []
+            for block in page.get_text("blocks"):
+                y0, y1, txt = block[1], block[3], block[4]
+                if y1 < height * HEADER_FOOTER_FRACTION or y0 > height * (1 - HEADER_FOOTER_FRACTION):
+                    edge_text.append(txt)
+                else:
+                    body_text.append(txt)
+            for origin, txt in (("header", "\n".join(edge_text)), ("first_page", "\n".join(body_text))):
+                m = DOI_PATTERN.search(txt)
+                if m:
+                    _set(meta, "doi", _clean_doi(m.group(1)), origin)
+                m = PMID_PATTERN.search(txt)
+                if m:
+                    _set(meta, "pmid", m.group(1), origin)
+                m = YEAR_CONTEXT_PATTERN.search(txt)
+                if m:
+                    _set(meta, "year", m.group(1), origin)
+            if not meta["title"]:
+                _set(meta, "title", _largest_font_line(page), "first_page")
+            if not meta["year"]:
+                m = YEAR_PATTERN.search("\n".join(edge_text))
+                if m:
+                    _set(meta, "year", m.group(1), "header")
+
+        # 4) Creation date of the PDF file (Info dictionary, unless XMP had one): kept apart,
+        #    it is only a last resort after the caller's full-text year search
+        created = info.get("creationDate") or ""
+        m = re.match(r"D:((?:19|20)\d{2})", created)
+        if m:
+            _set(meta, "creation_year", m.group(1), "creation_date")
+    finally:
+        doc.close()
+    return meta
+
+def sniff_pdf_metadata(pdf_file) -> Dict[str, Any]:
+    """
+    Returns {"doi", "pmid", "year", "title", "journal", "creation_year", "source"}
+    for a PDF (st.file_uploader object or bytes). Missing fields are None; "source"
+    tells where each value was found. "creation_year" is the PDF file's creation
+    date, not a publication year. Results are cached per file hash.
+    """
+    data = read_file_bytes(pdf_file)
+    key = file_sha256(data)
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return {**_cache[key], "source": dict(_cache[key]["source"])}
+    meta = _sniff(data)
+    with _cache_lock:
+        _cache[key] = meta
+        while len(_cache) > _CACHE_MAX_ENTRIES:
+            _cache.popitem(last=False)
+    return {**meta, "source": dict(meta["source"])}
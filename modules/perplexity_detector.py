@@ -0,0 +1,180 @@
+import hashlib
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import torch
+    from transformers import AutoModelForCausalLM, AutoTokenizer
+    transformers_installed = True
+except ImportError:
+    transformers_installed = False
+
+try:
+    from optimum.onnxruntime import ORTModelForCausalLM
+    onnx_installed = True
+except ImportError:
+    onnx_installed = False
+
+# ------------------------------------------------------------------
+# Lokale Perplexity-Erkennung (kleines Causal-LM auf der CPU)
+# ------------------------------------------------------------------
+# A small causal LM is loaded once per process. Texts are tokenized,
+# sorted by length and scored in padded batches (length buckets keep
+# padding low). Per text we get the perplexity (exp of the mean token
+# loss) and the burstiness (coefficient of variation of the token
+# losses): machine-written text tends to have low values for both.
+# Results are cached per text hash.
+
+PERPLEXITY_MODEL = os.getenv("PERPLEXITY_MODEL", "distilgpt2")
+# "1" = dynamische int8-Quantisierung bzw. ONNX Runtime (siehe PerplexityModel)
+PERPLEXITY_QUANTIZE = os.getenv("PERPLEXITY_QUANTIZE", "0") == "1"
+PERPLEXITY_ONNX = os.getenv("PERPLEXITY_ONNX", "0") == "1"
+PERPLEXITY_MAX_TOKENS = 256
+PERPLEXITY_BATCH_SIZE = 16
+PERPLEXITY_CACHE_SIZE = 4096
+# Nach einem vorübergehenden Ladefehler (Netzwerk, Speicher) erst nach dieser Zeit erneut versuchen
+PERPLEXITY_RETRY_SECONDS = 300
+# Calibration (heuristic): perplexity / burstiness at which the score is 50
+PERPLEXITY_REFERENCE = 30.0
+BURSTINESS_REFERENCE = 1.0
+
+
+class PerplexityModel:
+    """
+    quantize=True applies dynamic int8 quantization to the torch.nn.Linear
+    layers (effective for OPT/Pythia/Llama-type models; GPT-2 uses Conv1D).
+    onnx=True loads the model through optimum/onnxruntime instead of torch.
+    """
+
+    def __init__(self, model_name: str = PERPLEXITY_MODEL, quantize: bool = False, onnx: bool = False,
+                 max_tokens: int = PERPLEXITY_MAX_TOKENS, batch_size: int = PERPLEXITY_BATCH_SIZE):
+        if not transformers_installed:
+            raise ImportError("transformers/torch are required for the perplexity detector")
+        self.model_name = model_name
+        self.max_tokens = max_tokens
+        self.batch_size = batch_size
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        if self.tokenizer.pad_token is None:
+            self.tokenizer.pad_token = self.tokenizer.eos_token
+        if onnx:
+            if not onnx_installed:
+                raise ImportError("optimum[onnxruntime] is required for onnx=True")
+            self.model = ORTModelForCausalLM.from_pretrained(model_name, export=True)
+        else:
+            self.model = AutoModelForCausalLM.from_pretrained(model_name)
+            self.model.eval()
+            if quantize:
+                self.model = torch.quantization.quantize_dynamic(self.model, {torch.nn.Linear}, dtype=torch.qint8)
+        self.lock = threading.Lock()
+        self.cache: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+
+    def _key(self, text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def _score_batch(self, token_lists: List[List[int]]) -> List[Tuple[float, float]]:
+        width = max(len(t) for t in token_lists)
+        pad_id = self.tokenizer.pad_token_id
+        input_ids = torch.full((len(token_lists), width), pad_id, dtype=torch.long)
+        attention = torch.zeros((len(token_lists), width), dtype=torch.long)
+        for row, tokens in enumerate(token_lists):
+            input_ids[row, :len(tokens)] = torch.tensor(tokens, dtype=torch.long)
+            attention[row, :len(tokens)] = 1
+        with torch.inference_mode():
+            logits = self.model(input_ids=input_ids, attention_mask=attention).logits
+        # Loss of token t+1 given tokens <= t
+        log_probs = torch.log_softmax(logits[:, :-1].float(), dim=-1)
+        nll = -log_probs.gather(-1, input_ids[:, 1:].unsqueeze(-1)).squeeze(-1)
+        mask = attention[:, 1:].bool()
+        results = []
+        for row in range(len(token_lists)):
+            losses = nll[row][mask[row]].numpy()
+            if losses.size == 0:
+                results.append((float("nan"), float("nan")))
+                continue
+            mean = float(losses.mean())
+            results.append((math.exp(mean), float(losses.std() / (mean + 1e-8))))
+        return results
+
+    def score_texts(self, texts: List[str]) -> List[Tuple[float, float]]:
+        """(perplexity, burstiness) per text; batched over length buckets, cached per text."""
+        results: List[Optional[Tuple[float, float]]] = [None] * len(texts)
+        todo = []
+        with self.lock:
+            for i, text in enumerate(texts):
+                cached = self.cache.get(self._key(text))
+                if cached is not None:
+                    results[i] = cached
+                else:
+                    todo.append(i)
+        if todo:
+            # Fast tokenizers are not thread-safe ("Already borrowed"): tokenize under the model lock
+            with self.lock:
+                encoded = self.tokenizer([texts[i] for i in todo], truncation=True, max_length=self.max_tokens,
+                                         add_special_tokens=False)["input_ids"]
+            order = sorted(range(len(todo)), key=lambda k: len(encoded[k]))
+            for start in range(0, len(order), self.batch_size):
+                bucket = order[start:start + self.batch_size]
+                short = [k for k in bucket if len(encoded[k]) < 2]
+                scorable = [k for k in bucket if len(encoded[k]) >= 2]
+                for k in short:
+                    results[todo[k]] = (float("nan"), float("nan"))
+                if scorable:
+                    with self.lock:
+                        scores = self._score_batch([encoded[k] for k in scorable])
+                    for k, score in zip(scorable, scores):
+                        results[todo[k]] = score
+            with self.lock:
+                for k in range(len(todo)):
+                    self.cache[self._key(texts[todo[k]])] = results[todo[k]]
+                while len(self.cache) > PERPLEXITY_CACHE_SIZE:
+                    self.cache.popitem(last=False)
+        return results
+
+
+def perplexity_to_ai_score(perplexity: float, burstiness: float) -> float:
+    """Maps (perplexity, burstiness) to 0-100 (high = likely AI). Heuristic calibration."""
+    if math.isnan(perplexity):
+        return 50.0
+    ppl_score = 100 / (1 + math.exp(2.0 * (math.log(perplexity) - math.log(PERPLEXITY_REFERENCE))))
+    burst_score = 100 / (1 + math.exp(4.0 * (burstiness - BURSTINESS_REFERENCE)))
+    return 0.7 * ppl_score + 0.3 * burst_score
+
+
+# Failed loads per configuration: not retried on every call (lru_cache does not cache exceptions).
+# Missing packages are permanent; any other error is retried after PERPLEXITY_RETRY_SECONDS.
+_failed_loads: Dict[Tuple[str, bool, bool], Tuple[Exception, Optional[float]]] = {}
+
+
+@lru_cache(maxsize=2)
+def _load_perplexity_model(model_name: str, quantize: bool, onnx: bool) -> PerplexityModel:
+    return PerplexityModel(model_name, quantize=quantize, onnx=onnx)
+
+
+def get_perplexity_model(model_name: str = PERPLEXITY_MODEL, quantize: bool = PERPLEXITY_QUANTIZE,
+                         onnx: bool = PERPLEXITY_ONNX) -> PerplexityModel:
+    """Process-wide model (loaded once); a recently failed load raises the cached error again."""
+    key = (model_name, quantize, onnx)
+    if key in _failed_loads:
+        error, retry_at = _failed_loads[key]
+        if retry_at is None or time.monotonic() < retry_at:
+            raise error
+        del _failed_loads[key]
+    try:
+        return _load_perplexity_model(model_name, quantize, onnx)
+    except ImportError as e:
+        _failed_loads[key] = (e, None)
+        raise
+    except Exception as e:
+        _failed_loads[key] = (e, time.monotonic() + PERPLEXITY_RETRY_SECONDS)
+        raise
+
+
+def perplexity_scores(texts: List[str]) -> List[float]:
+    """AI scores (0-100) for many texts in one batched run."""
+    model = get_perplexity_model()
+    return [perplexity_to_ai_score(ppl, burst) for ppl, burst in model.score_texts(texts)]
@@ -0,0 +1,229 @@
+import datetime
+import io
+import os
+import re
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import openpyxl
+import xlsxwriter
+
+# ------------------------------------------------------------------
+# Excel-Report aus vorlage_paperqa2.xlsx
+# ------------------------------------------------------------------
+# The template is read from disk once per process and kept as bytes.
+# An export parses it once and clones the template sheet in memory for
+# every paper (one workbook, one sheet per paper), so 100 papers cost one
+# parse and one workbook instead of 100 of each; the ZIP export refills the
+# one parsed workbook per paper and saves it to its own file. Fields are written via
+# the REPORT_CELLS mapping, no cell lookups by label.
+
+REPORT_TEMPLATE_PATH = "vorlage_paperqa2.xlsx"
+
+# Field name -> cell in the template
+REPORT_CELLS = {
+    "theme": "D2",
+    "date": "J2",
+    "gene": "D5",
+    "rsids": "D6",
+    "genotype_1": "D10",
+    "genotype_freq_1": "E10",
+    "genotype_2": "D11",
+    "genotype_freq_2": "E11",
+    "genotype_3": "D12",
+    "genotype_freq_3": "E12",
+    "year": "C20",
+    "cohort": "D20",
+    "key_findings": "E20",
+    "title": "G20",
+    "results": "G21",
+    "conclusions": "G22",
+    "doi": "I22",
+    "pmid": "J21",
+    "pubmed_link": "J22",
+}
+
+_INVALID_SHEET_CHARS = re.compile(r"[\[\]:*?/\\]")
+
+
+class ReportTemplate:
+    """Excel template held in memory; renders report values into workbooks."""
+
+    def __init__(self, path: str = REPORT_TEMPLATE_PATH):
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Template '{path}' was not found!")
+        with open(path, "rb") as f:
+            self.raw = f.read()
+
+    def _load(self):
+        return openpyxl.load_workbook(io.BytesIO(self.raw))
+
+    @staticmethod
+    def fill(ws, values: Dict[str, Any]):
+        """Writes the given fields into their cells (unknown fields are ignored)."""
+        for field, value in values.items():
+            cell = REPORT_CELLS.get(field)
+            if cell:
+                ws[cell].value = value
+
+    def render(self, values: Dict[str, Any], output=None):
+        """
+        One report as a standalone workbook. Writes to `output` (path or file
+        object) if given, otherwise returns the .xlsx bytes.
+        """
+        wb = self._load()
+        self.fill(wb.active, values)
+        if output is not None:
+            wb.save(output)
+            return None
+        buffer = io.BytesIO()
+        wb.save(buffer)
+        return buffer.getvalue()
+
+    def render_each(self, reports: Iterable[Dict[str, Any]], outputs: Iterable[Any]):
+        """
+        One standalone workbook per report, from a single template parse: the
+        loaded workbook is refilled (missing fields reset to the template) and
+        saved to the matching output (path or file object).
+        """
+        wb = self._load()
+        ws = wb.active
+        defaults = {field: ws[cell].value for field, cell in REPORT_CELLS.items()}
+        for values, output in zip(reports, outputs):
+            self.fill(ws, {**defaults, **values})
+            wb.save(output)
+
+    def render_many(self, reports: Iterable[Tuple[str, Dict[str, Any]]], output=None):
+        """
+        All reports in one workbook, one sheet per (name, values) pair.
+        Writes to `output` (path or file object) if given, otherwise returns the bytes.
+        """
+        wb = self._load()
+        template_ws = wb.active
+        used_titles = set()
+        for name, values in reports:
+            ws = wb.copy_worksheet(template_ws)
+            ws.title = unique_sheet_title(name, used_titles)
+            self.fill(ws, values)
+        if len(wb.worksheets) > 1:
+            wb.remove(template_ws)
+            wb.active = 0
+        if output is not None:
+            wb.save(output)
+            return None
+        buffer = io.BytesIO()
+        wb.save(buffer)
+        return buffer.getvalue()
+
+
+def unique_sheet_title(name: str, used: set) -> str:
+    """Excel-conform sheet title (max. 31 characters, no []:*?/\\), unique within `used`."""
+    base = _INVALID_SHEET_CHARS.sub("_", os.path.splitext(name)[0]).strip("' ") or "Paper"
+    title = base[:31]
+    n = 2
+    while title.lower() in used:
+        suffix = f" ({n})"
+        title = base[:31 - len(suffix)] + suffix
+        n += 1
+    used.add(title.lower())
+    return title
+
+
+def report_values(theme: str, gene: Optional[str], rsids: List[str],
+                  genotypes: List[Tuple[str, str]], year: Any, cohort: str, key_findings: str,
+                  title: Optional[str], results: str, conclusions: str,
+                  pmid: str, pubmed_link: str, doi: str) -> Dict[str, Any]:
+    """Collects the values of one paper under the REPORT_CELLS field names."""
+    values = {
+        "theme": theme,
+        "date": datetime.datetime.now().strftime("%Y-%m-%d"),
+        "gene": gene or "",
+        "rsids": ", ".join(rsids),
+        "year": year,
+        "cohort": cohort,
+        "key_findings": key_findings,
+        "results": results,
+        "conclusions": conclusions,
+        "pmid": pmid if pmid != "n/a" else "",
+        "pubmed_link": pubmed_link or "",
+        "doi": doi if doi != "n/a" else "",
+    }
+    if title:
+        values["title"] = title
+    for i in range(3):
+        genotype, freq_text = genotypes[i] if i < len(genotypes) else ("", "")
+        values[f"genotype_{i + 1}"] = genotype
+        values[f"genotype_freq_{i + 1}"] = freq_text
+    return values
+
+
+# Columns of the consolidated workbook: (header, field of report_values, column width)
+SUMMARY_COLUMNS = [
+    ("Paper", "paper", 30),
+    ("Status", "status", 12),
+    ("Theme", "theme", 25),
+    ("Gene", "gene", 12),
+    ("rsIDs", "rsids", 20),
+    ("Genotype 1", "genotype_1", 10),
+    ("Genotype frequency 1", "genotype_freq_1", 30),
+    ("Genotype 2", "genotype_2", 10),
+    ("Genotype frequency 2", "genotype_freq_2", 30),
+    ("Genotype 3", "genotype_3", 10),
+    ("Genotype frequency 3", "genotype_freq_3", 30),
+    ("Year", "year", 8),
+    ("Cohort", "cohort", 30),
+    ("Key findings", "key_findings", 60),
+    ("Results", "results", 60),
+    ("Conclusions", "conclusions", 60),
+    ("Title", "title", 40),
+    ("DOI", "doi", 25),
+    ("PMID", "pmid", 12),
+    ("PubMed link", "pubmed_link", 35),
+]
+
+
+class SummaryWorkbookWriter:
+    """
+    Cross-paper summary: one row per paper, written with xlsxwriter in
+    constant_memory mode (each row is flushed to disk once the next one starts),
+    so memory stays flat however many papers are exported.
+    """
+
+    def __init__(self, path: str, sheet_name: str = "Summary"):
+        self.path = path
+        self.workbook = xlsxwriter.Workbook(path, {"constant_memory": True, "strings_to_urls": False})
+        self.sheet = self.workbook.add_worksheet(sheet_name)
+        self.wrap = self.workbook.add_format({"text_wrap": True, "valign": "top"})
+        header = self.workbook.add_format({"bold": True, "bg_color": "#D9E1F2", "border": 1})
+        for col, (title, _, width) in enumerate(SUMMARY_COLUMNS):
+            self.sheet.set_column(col, col, width)
+            self.sheet.write(0, col, title, header)
+        self.sheet.freeze_panes(1, 1)
+        self.rows = 0
+
+    def add_row(self, paper: str, values: Optional[Dict[str, Any]] = None, error: Optional[str] = None):
+        """Appends one paper (values from report_values, or only the error of a failed paper)."""
+        self.rows += 1
+        row = dict(values or {}, paper=paper, status="error" if error else "ok")
+        if error:
+            row["key_findings"] = error
+        for col, (_, field, _) in enumerate(SUMMARY_COLUMNS):
+            value = row.get(field, "")
+            self.sheet.write(self.rows, col, "" if value is None else value, self.wrap)
+
+    def close(self) -> str:
+        self.sheet.autofilter(0, 0, self.rows, len(SUMMARY_COLUMNS) - 1)
+        self.workbook.close()
+        return self.path
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+@lru_cache(maxsize=4)
+def get_report_template(path: str = REPORT_TEMPLATE_PATH) -> ReportTemplate:
+    """Process-wide template (read from disk once)."""
+    return ReportTemplate(path)
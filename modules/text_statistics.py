@@ -0,0 +1,93 @@
+import re
+from collections import Counter
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Dict, List
+
+import numpy as np
+
+# ------------------------------------------------------------------
+# Textstatistik für die KI-Inhaltserkennung (ein Durchlauf)
+# ------------------------------------------------------------------
+# All heuristics of AIContentDetector read from one TextStatistics object:
+# the text is tokenized once, repeated word pairs are found with hashed
+# bigrams (instead of a back-referencing regex, which is quadratic),
+# signal words are counted with one combined regex and sentence lengths
+# are evaluated with NumPy. Cost is linear in the length of the text.
+
+WORD_PATTERN = re.compile(r"\w+")
+SENTENCE_SPLIT = re.compile(r"[.!?]+")
+SIGNAL_WORDS = re.compile(
+    r"\b(?P<generische_übergänge>zunächst|anschließend|abschließend|zusammenfassend)\b"
+    r"|(?P<gleichmäßiger_ton>jedoch|allerdings|dennoch|daher|folglich|somit)",
+    re.IGNORECASE
+)
+CITATION_PATTERN = re.compile(r"\(([^)]+\d{4}[^)]*)\)")
+CITATION_LETTERS = re.compile(r"[A-Za-z\s]")
+CITATION_DIGITS = re.compile(r"\d")
+
+
+@dataclass
+class TextStatistics:
+    word_count: int
+    paragraph_count: int
+    repeated_bigrams: int
+    signal_counts: Dict[str, int]
+    sentence_lengths: np.ndarray
+    citation_formats: Counter = field(default_factory=Counter)
+
+    @property
+    def citation_count(self) -> int:
+        return sum(self.citation_formats.values())
+
+
+def count_repeated_bigrams(tokens: List[str]) -> int:
+    """
+    Number of word pairs that occur again later in the text (case-insensitive,
+    also across line breaks), counted like a left-to-right scan that skips the
+    pair after each hit. Bigrams are kept as hashes in a Counter of remaining
+    occurrences, so memory is one entry per distinct pair.
+    """
+    hashes = [hash((a, b)) for a, b in zip(tokens, tokens[1:])]
+    remaining = Counter(hashes)
+    count = 0
+    i = 0
+    n = len(hashes)
+    while i < n:
+        remaining[hashes[i]] -= 1
+        if remaining[hashes[i]] > 0:
+            count += 1
+            # Das überlappende Paar danach gehört zum Treffer
+            if i + 1 < n:
+                remaining[hashes[i + 1]] -= 1
+            i += 2
+        else:
+            i += 1
+    return count
+
+
+@lru_cache(maxsize=8)
+def compute_text_statistics(text: str) -> TextStatistics:
+    """All statistics of a text in one pass per feature (cached for repeated calls on the same text)."""
+    tokens = [t.lower() for t in WORD_PATTERN.findall(text)]
+
+    signal_counts = {"generische_übergänge": 0, "gleichmäßiger_ton": 0}
+    for m in SIGNAL_WORDS.finditer(text):
+        signal_counts[m.lastgroup] += 1
+
+    sentence_lengths = np.fromiter(
+        (len(s.split()) for s in SENTENCE_SPLIT.split(text) if s.strip()), dtype=np.int32
+    )
+
+    citation_formats = Counter(
+        CITATION_DIGITS.sub("9", CITATION_LETTERS.sub("X", c)) for c in CITATION_PATTERN.findall(text)
+    )
+
+    return TextStatistics(
+        word_count=len(text.split()),
+        paragraph_count=text.count("\n\n") + 1,
+        repeated_bigrams=count_repeated_bigrams(tokens),
+        signal_counts=signal_counts,
+        sentence_lengths=sentence_lengths,
+        citation_formats=citation_formats,
+    )
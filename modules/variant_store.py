@@ -0,0 +1,251 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterable, Optional
+
+import requests
+
+from dbsnp_api import DbSnpVariantClient
+from ensembl_api import ENSEMBL_SERVER, EnsemblVariantClient, normalize_rsid
+from modules.local_frequency_backend import get_local_frequency_backend
+
+# ------------------------------------------------------------------
+# Persistent variant store (SQLite + in-process LRU)
+# ------------------------------------------------------------------
+# Ensembl variant records are stored per (rsID, Ensembl release). The
+# population frequencies are kept columnar: population ids (uint16),
+# allele ids (uint8) and frequencies (float32) as packed arrays, with
+# population names interned in their own table. A variant therefore
+# costs a few hundred bytes and is fetched from Ensembl at most once
+# per TTL - across papers, pages and sessions.
+
+VARIANT_STORE_PATH = os.getenv("VARIANT_STORE_PATH", os.path.join(".cache", "variants.sqlite"))
+DBSNP_STORE_PATH = os.getenv("DBSNP_STORE_PATH", os.path.join(".cache", "dbsnp.sqlite"))
+VARIANT_STORE_TTL = 30 * 24 * 3600  # seconds
+VARIANT_STORE_LRU_SIZE = 4096
+
+# Scalar fields of the Ensembl record kept next to the frequency columns
+META_FIELDS = ("name", "MAF", "minor_allele", "ancestral_allele", "var_class",
+               "most_severe_consequence", "source", "synonyms", "mappings")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS populations (
+    id INTEGER PRIMARY KEY,
+    name TEXT UNIQUE NOT NULL
+);
+CREATE TABLE IF NOT EXISTS variants (
+    rsid TEXT NOT NULL,
+    release INTEGER NOT NULL,
+    fetched_at REAL NOT NULL,
+    meta TEXT NOT NULL,
+    alleles TEXT NOT NULL,
+    pop_ids BLOB NOT NULL,
+    allele_ids BLOB NOT NULL,
+    freqs BLOB NOT NULL,
+    PRIMARY KEY (rsid, release)
+);
+"""
+
+
+_release_cache = {"release": 0, "checked_at": 0.0}
+
+def current_ensembl_release(server: str = ENSEMBL_SERVER, recheck_after: float = 3600) -> int:
+    """
+    Release number of the Ensembl REST server (0 if it cannot be determined right now).
+    Rechecked every recheck_after seconds, so a new release is picked up while running
+    (while it is unknown, after at most a minute).
+    """
+    if not _release_cache["release"]:
+        recheck_after = min(recheck_after, 60)
+    if time.time() - _release_cache["checked_at"] < recheck_after:
+        return _release_cache["release"]
+    _release_cache["checked_at"] = time.time()
+    try:
+        r = requests.get(f"{server}/info/software", headers={"Content-Type": "application/json"}, timeout=10)
+        r.raise_for_status()
+        _release_cache["release"] = int(r.json().get("release", 0))
+    except Exception:
+        pass
+    return _release_cache["release"]
+
+
+class VariantStore:
+    def __init__(self, db_path: str = VARIANT_STORE_PATH, ttl: float = VARIANT_STORE_TTL,
+                 lru_size: int = VARIANT_STORE_LRU_SIZE, client: Optional[EnsemblVariantClient] = None,
+                 local_backend=None, release_fn: Callable[[], int] = None, versioned: bool = True):
+        self.db_path = db_path
+        self.ttl = ttl
+        self.lru_size = lru_size
+        self.client = client or EnsemblVariantClient()
+        # Release the rows are tagged with (0 = unversioned, newest row within TTL wins)
+        self.release_fn = release_fn or current_ensembl_release
+        # Versioned store: records fetched while the release is unknown (0) are not persisted,
+        # they would otherwise be served for the whole TTL without a release tag
+        self.versioned = versioned
+        # Optional offline snapshot (see modules/local_frequency_backend.py)
+        self.local_backend = local_backend
+        self.lru: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.lock = threading.Lock()
+        self.pop_name_to_id: Dict[str, int] = {}
+        self.pop_id_to_name: Dict[int, str] = {}
+        dirname = os.path.dirname(db_path)
+        if dirname:
+            os.makedirs(dirname, exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+            for pid, name in conn.execute("SELECT id, name FROM populations"):
+                self.pop_name_to_id[name] = pid
+                self.pop_id_to_name[pid] = name
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            yield conn
+            conn.commit()
+        finally:
+            conn.close()
+
+    # --- LRU ---------------------------------------------------------
+    def _lru_get(self, rs_id: str) -> Optional[Dict[str, Any]]:
+        with self.lock:
+            record = self.lru.get(rs_id)
+            if record is not None:
+                self.lru.move_to_end(rs_id)
+            return record
+
+    def _lru_put(self, rs_id: str, record: Dict[str, Any]):
+        with self.lock:
+            self.lru[rs_id] = record
+            self.lru.move_to_end(rs_id)
+            while len(self.lru) > self.lru_size:
+                self.lru.popitem(last=False)
+
+    # --- Columnar encoding -------------------------------------------
+    def _population_id(self, conn, name: str) -> int:
+        pid = self.pop_name_to_id.get(name)
+        if pid is None:
+            conn.execute("INSERT OR IGNORE INTO populations (name) VALUES (?)", (name,))
+            pid = conn.execute("SELECT id FROM populations WHERE name = ?", (name,)).fetchone()[0]
+            self.pop_name_to_id[name] = pid
+            self.pop_id_to_name[pid] = name
+        return pid
+
+    def _encode(self, conn, record: Dict[str, Any]):
+        alleles = []
+        allele_index = {}
+        pop_ids, allele_ids, freqs = array("H"), array("B"), array("f")
+        for pop in record.get("populations", []):
+            allele = pop.get("allele")
+            freq = pop.get("frequency")
+            if allele is None or freq is None:
+                continue
+            if allele not in allele_index:
+                allele_index[allele] = len(alleles)
+                alleles.append(allele)
+            pop_ids.append(self._population_id(conn, pop.get("population", "")))
+            allele_ids.append(allele_index[allele])
+            freqs.append(float(freq))
+        meta = {k: record[k] for k in META_FIELDS if k in record}
+        return json.dumps(meta), json.dumps(alleles), pop_ids.tobytes(), allele_ids.tobytes(), freqs.tobytes()
+
+    def _decode(self, meta: str, alleles: str, pop_blob: bytes, allele_blob: bytes, freq_blob: bytes) -> Dict[str, Any]:
+        record = json.loads(meta)
+        allele_names = json.loads(alleles)
+        pop_ids, allele_ids, freqs = array("H"), array("B"), array("f")
+        pop_ids.frombytes(pop_blob)
+        allele_ids.frombytes(allele_blob)
+        freqs.frombytes(freq_blob)
+        record["populations"] = [
+            {"population": self.pop_id_to_name.get(p, ""), "allele": allele_names[a], "frequency": round(f, 6)}
+            for p, a, f in zip(pop_ids, allele_ids, freqs)
+        ]
+        return record
+
+    # --- Public API ----------------------------------------------------
+    def get_many(self, rs_ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Returns {rsID: Ensembl-shaped record} (same structure as the REST API:
+        MAF, minor_allele, populations=[{population, allele, frequency}], ...).
+        Order of lookup: in-process LRU -> local snapshot (if configured)
+        -> SQLite (within TTL) -> Ensembl bulk POST.
+        """
+        ids = list(dict.fromkeys(normalize_rsid(r) for r in rs_ids if str(r).strip()))
+        results = {}
+        missing = []
+        for rs in ids:
+            record = self._lru_get(rs)
+            if record is not None:
+                results[rs] = record
+            else:
+                missing.append(rs)
+        if missing and self.local_backend is not None:
+            local = self.local_backend.get_variants(missing)
+            for rs, record in local.items():
+                self._lru_put(rs, record)
+                results[rs] = record
+            missing = [rs for rs in missing if rs not in local]
+        if not missing:
+            return results
+
+        release = self.release_fn()
+        min_fetched = time.time() - self.ttl
+        with self._connect() as conn:
+            for i in range(0, len(missing), 500):
+                chunk = missing[i:i + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = conn.execute(
+                    f"SELECT rsid, release, meta, alleles, pop_ids, allele_ids, freqs FROM variants "
+                    f"WHERE rsid IN ({placeholders}) AND fetched_at >= ? ORDER BY release",
+                    (*chunk, min_fetched)
+                ).fetchall()
+                for rsid, row_release, *columns in rows:
+                    # Offline (release 0): newest stored release wins
+                    if release and row_release != release:
+                        continue
+                    results[rsid] = self._decode(*columns)
+                    self._lru_put(rsid, results[rsid])
+
+        to_fetch = [rs for rs in missing if rs not in results]
+        if to_fetch:
+            fetched = self.client.get_variants(to_fetch)
+            if fetched and (release or not self.versioned):
+                now = time.time()
+                with self.lock, self._connect() as conn:
+                    for rs, record in fetched.items():
+                        conn.execute(
+                            "INSERT OR REPLACE INTO variants VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                            (rs, release, now, *self._encode(conn, record))
+                        )
+                for rs, record in fetched.items():
+                    self._lru_put(rs, record)
+                    results[rs] = record
+        return results
+
+    def get(self, rs_id: str) -> Optional[Dict[str, Any]]:
+        return self.get_many([rs_id]).get(normalize_rsid(rs_id))
+
+    def purge_expired(self) -> int:
+        """Deletes rows older than the TTL; returns the number of removed rows."""
+        with self._connect() as conn:
+            cur = conn.execute("DELETE FROM variants WHERE fetched_at < ?", (time.time() - self.ttl,))
+            return cur.rowcount
+
+
+@lru_cache(maxsize=4)
+def get_variant_store(db_path: str = VARIANT_STORE_PATH) -> VariantStore:
+    """Process-wide store (one LRU for all sessions)."""
+    return VariantStore(db_path=db_path, local_backend=get_local_frequency_backend())
+
+
+@lru_cache(maxsize=4)
+def get_dbsnp_variant_store(db_path: str = DBSNP_STORE_PATH) -> VariantStore:
+    """Process-wide store for the dbSNP fallback (same cache layers, records in Ensembl shape)."""
+    return VariantStore(db_path=db_path, client=DbSnpVariantClient(), release_fn=lambda: 0, versioned=False)
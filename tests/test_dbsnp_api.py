@@ -0,0 +1,43 @@
+import pytest
+
+from dbsnp_api import DBSNP_SAMPLE_FIXTURE, DbSnpVariantClient
+
+
+@pytest.fixture
+def client():
+    return DbSnpVariantClient(fixture_path=DBSNP_SAMPLE_FIXTURE)
+
+
+def _frequencies(record, population):
+    return {p["allele"]: p["frequency"] for p in record["populations"] if p["population"] == population}
+
+
+def test_fixture_records_are_normalized(client):
+    records = client.get_variants(["rs1801133", "RS4680", "rs429358", "rs999999999"])
+    assert set(records) == {"rs1801133", "rs4680", "rs429358"}
+
+    mthfr = records["rs1801133"]
+    assert mthfr["name"] == "rs1801133"
+    assert mthfr["source"] == "dbSNP"
+    # 1000 Genomes wins over ALFA for the MAF
+    assert mthfr["MAF"] == pytest.approx(0.245607)
+    assert mthfr["minor_allele"] == "A"
+    assert mthfr["var_class"] == "snv"
+    assert mthfr["most_severe_consequence"] == "missense_variant"
+    # Biallelic: the reference allele is added as the complement
+    assert _frequencies(mthfr, "1000GENOMES:phase_3:ALL") == pytest.approx({"A": 0.245607, "G": 0.754393})
+    assert _frequencies(mthfr, "ALFA:ALL") == pytest.approx({"A": 0.312546, "G": 0.687454})
+    assert mthfr["mappings"] == [{
+        "seq_region_name": "1",
+        "start": 11796321,
+        "allele_string": "G/A",
+        "assembly_name": "GRCh38",
+    }]
+
+
+def test_fixture_single_variant(client):
+    apoe = client.get_variant("rs429358")
+    assert apoe["MAF"] == pytest.approx(0.150559)
+    assert _frequencies(apoe, "1000GENOMES:phase_3:ALL") == pytest.approx({"C": 0.150559, "T": 0.849441})
+    assert client.get_variant("rs999999999") is None
+    assert client.get_variants(["not-an-rsid"]) == {}
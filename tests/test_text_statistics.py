@@ -0,0 +1,15 @@
+from modules.text_statistics import compute_text_statistics, count_repeated_bigrams
+
+
+def test_repeated_bigram_across_newline():
+    # The old regex (?=.*\1) stopped at line breaks; repeats are counted over the whole text
+    stats = compute_text_statistics("Die Studie zeigt Effekte.\nAuch hier zeigt die Studie\nneue Effekte.")
+    assert stats.repeated_bigrams == 1
+
+
+def test_repeated_bigrams_skip_overlapping_pair():
+    tokens = "a b c a b c".split()
+    # "a b" hit, "b c" skipped, "c a" and the later pairs have no repeat
+    assert count_repeated_bigrams(tokens) == 1
+    assert count_repeated_bigrams("x y z".split()) == 0
+    assert count_repeated_bigrams([]) == 0
@@ -0,0 +1,58 @@
+import hashlib
+import threading
+import time
+
+# ------------------------------------------------------------------
+# Gemeinsame Hilfsfunktionen
+# ------------------------------------------------------------------
+def read_file_bytes(file_or_bytes) -> bytes:
+    """Returns the raw bytes of an upload (st.file_uploader object, file-like or bytes)."""
+    if isinstance(file_or_bytes, (bytes, bytearray)):
+        return bytes(file_or_bytes)
+    if hasattr(file_or_bytes, "getvalue"):
+        return file_or_bytes.getvalue()
+    pos = file_or_bytes.tell()
+    file_or_bytes.seek(0)
+    data = file_or_bytes.read()
+    file_or_bytes.seek(pos)
+    return data
+
+def file_sha256(file_or_bytes) -> str:
+    """SHA-256 hex digest of an uploaded file (used as cache key)."""
+    return hashlib.sha256(read_file_bytes(file_or_bytes)).hexdigest()
+
+# ------------------------------------------------------------------
+# Rate-Limiter (prozessweit geteilt, z.B. für Ensembl / NCBI)
+# ------------------------------------------------------------------
+class RateLimiter:
+    """Thread-safe limiter: at most `rate` acquisitions per `per` seconds."""
+
+    def __init__(self, rate: float, per: float = 1.0):
+        self.interval = per / rate
+        self.next_slot = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Blocks until the next request slot is free."""
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot)
+            self.next_slot = slot + self.interval
+        delay = slot - now
+        if delay > 0:
+            time.sleep(delay)
+
+    def penalize(self, seconds: float):
+        """Pushes all further slots back (e.g. after HTTP 429 with Retry-After)."""
+        with self.lock:
+            self.next_slot = max(self.next_slot, time.monotonic() + seconds)
+
+_rate_limiters = {}
+_rate_limiters_lock = threading.Lock()
+
+def get_rate_limiter(name: str, rate: float, per: float = 1.0) -> RateLimiter:
+    """Returns the shared limiter for an API (created on first use)."""
+    with _rate_limiters_lock:
+        if name not in _rate_limiters:
+            _rate_limiters[name] = RateLimiter(rate, per)
+        return _rate_limiters[name]